@@ -0,0 +1,217 @@
+# ---------------------------------------------------------------------------
+# ROMN_Soils_ETL_Benchmark.py
+# Description:  Benchmark harness timing the ETL stages of the 'romn_soils_etl' package against the synthetic EDDs and SQLite stand-in databases
+# written by 'ROMN_Soils_Synthetic_EDD.py'.
+# Code performs the following routines:
+# Generates the synthetic EDD/database set for each sample count when not present.  Resets the package run state, points the run parameters at the synthetic
+# EDD (per EDD layout) and a fresh copy of the stand-in database (a clean workspace per repeat so the history caches are rebuilt), and runs 'pipeline.main'.
+# The run manifest stages are summarized to the benchmark phases (extract, metadata, validate, transform, QC and load) with the median seconds
+# over the repeats.  Results are written to the '_Results.csv' (per repeat) and '_Summary.csv'/'.json' (median per phase) files.
+
+# Dependices:
+# Python version 3.x
+# Pandas, Numpy, openpyxl
+# sqlalchemy - the Access drivers (pyodbc, sqlalchemy-access) are not imported with the SQLite stand-in database
+
+# Usage:  python ROMN_Soils_ETL_Benchmark.py [sampleCount ...]
+
+#######################################
+## Below are paths which are hard coded
+#######################################
+#Import Required Libraries
+import os
+import sys
+import json
+import time
+import shutil
+import traceback
+import pandas as pd
+
+import ROMN_Soils_Synthetic_EDD as syntheticEDD
+
+#The 'romn_soils_etl' package is in the repository folder above the benchmarks folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from romn_soils_etl import config, pipeline
+
+###################################################
+# Start of Parameters requiring set up.
+###################################################
+benchmarkFolder = os.path.dirname(os.path.abspath(__file__))
+#Output folder for the benchmark workspaces and results
+outputFolder = os.path.join(benchmarkFolder, "results")
+
+#Sample counts to benchmark - EDDs are generated by 'ROMN_Soils_Synthetic_EDD.py' when not present
+sampleCounts = [50, 500, 5000]
+#Repeats per sample count - the median is reported
+repeats = 3
+#EDD layouts to benchmark
+eddLayouts = ["pre2022", "gte2022", "2024"]
+#Run parameters applied to every benchmark run
+benchmarkParameters = {"consoleLogLevel": "WARNING", "transformEngine": "pandas", "applyQC": True, "applyOutlierFlags": True, "trackStageMemory": False,
+                       "dryRun": False, "preflightOnly": False}
+
+#Benchmark phases - top level pipeline stages summed per phase
+phaseStages = {"extract": ["read_excel", "extractEDDTables"],
+               "metadata": ["resolveEventMetadata"],
+               "validate": ["runPreflight"],
+               "transform": ["joinMetadataToDataframes"],
+               "qc": ["applyQCRules", "flagHistoricalOutliers"],
+               "load": ["append_DB", "updateHistoryStats"]}
+
+resultsName = os.path.join(outputFolder, "ROMN_Soils_ETL_Benchmark")
+
+#################################################
+##
+
+def main():
+    try:
+        if not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        resultRecords = []
+        for sampleCount in sampleCounts:
+            for layout in eddLayouts:
+                outVal = getParameterFile(layout, sampleCount)
+                if outVal[0].lower() != "success function":
+                    print("WARNING - Function getParameterFile - " + timeFun() + " - Failed - Exiting Script")
+                    exit()
+                parameterRecord = outVal[1]
+
+                for repeat in range(1, repeats + 1):
+                    outVal = runBenchmark(parameterRecord, repeat)
+                    if outVal[0].lower() != "success function":
+                        print("WARNING - Function runBenchmark - " + timeFun() + " - Failed - Exiting Script")
+                        exit()
+                    resultRecords.append(outVal[1])
+                    print("Benchmark - " + layout + " - " + str(sampleCount) + " samples - repeat " + str(repeat) + " - " + str(round(outVal[1]["wallSeconds"], 2)) +
+                          " seconds - " + outVal[1]["runStatus"])
+
+        outVal = writeBenchmarkSummary(resultRecords)
+        if outVal.lower() != "success function":
+            print("WARNING - Function writeBenchmarkSummary - " + timeFun() + " - Failed - Exiting Script")
+            exit()
+
+        print("Successfully Finished Benchmark - " + resultsName + " - " + timeFun())
+
+    except:
+        print("ROMN_Soils_ETL_Benchmark.py - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+
+
+#Get the synthetic EDD parameters record for a layout and sample count - the synthetic set is generated when the parameters file is not present
+def getParameterFile(layout, sampleCount):
+    try:
+        parameterFile = os.path.join(syntheticEDD.outputFolder, "Synthetic_EDD_" + layout + "_" + str(sampleCount) + "_Parameters.json")
+        if not os.path.exists(parameterFile):
+            if not os.path.exists(syntheticEDD.outputFolder):
+                os.makedirs(syntheticEDD.outputFolder)
+            outVal = syntheticEDD.generateSyntheticSet(sampleCount)
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null"
+
+        with open(parameterFile) as inFile:
+            parameterRecord = json.load(inFile)
+
+        return "success function", parameterRecord
+
+    except:
+        print("Error function:  getParameterFile - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function", "Null"
+
+
+#Run the ETL pipeline once against the synthetic EDD and a fresh copy of the stand-in database - returns the run record (wall seconds, phase seconds, rows)
+def runBenchmark(parameterRecord, repeat):
+    try:
+        runName = "Benchmark_" + parameterRecord["layout"] + "_" + str(parameterRecord["sampleCount"]) + "_" + str(repeat)
+        runWorkspace = os.path.join(outputFolder, runName)
+        if os.path.exists(runWorkspace):
+            shutil.rmtree(runWorkspace)
+        os.makedirs(runWorkspace)
+        runDB = os.path.join(runWorkspace, os.path.basename(parameterRecord["soilsDB"]))
+        shutil.copyfile(parameterRecord["soilsDB"], runDB)
+
+        # Run state ('lookupCache', 'stageRecords', run logger) starts empty for each run - parameters not set for the EDD layout are reset to the defaults
+        pipeline.resetRunState()
+        config.resetParameters()
+
+        # Run parameters - EDD layout, synthetic EDD, stand-in database and the run workspace outputs (named with the 'outName' prefix)
+        runParameters = dict(benchmarkParameters, **parameterRecord["scriptParameters"])
+        runParameters.update({"eddLayout": parameterRecord["layout"],
+                              "inputFile": parameterRecord["inputFile"],
+                              "rawDataSheet": parameterRecord["rawDataSheet"],
+                              "soilsDB": runDB,
+                              "workspace": runWorkspace,
+                              "outName": runName})
+        config.setParameters(**runParameters)
+
+        startTime = time.perf_counter()
+        pipeline.main()
+        wallSeconds = time.perf_counter() - startTime
+        pipeline.resetRunState()
+
+        with open(config.runManifestName) as inFile:
+            runManifest = json.load(inFile)
+
+        runRecord = {"layout": parameterRecord["layout"],
+                     "sampleCount": parameterRecord["sampleCount"],
+                     "repeat": repeat,
+                     "runStatus": runManifest["runStatus"],
+                     "wallSeconds": wallSeconds}
+        df_stages = pd.DataFrame(runManifest["stages"])
+        for phase, stageList in phaseStages.items():
+            df_phase = df_stages[df_stages["stage"].isin(stageList)] if not df_stages.empty else df_stages
+            runRecord[phase + "Seconds"] = float(df_phase["seconds"].sum()) if not df_phase.empty else None
+        if not df_stages.empty:
+            runRecord["rowsLoaded"] = pd.to_numeric(df_stages.loc[df_stages["stage"] == "append_DB", "rowsIn"]).sum()
+        else:
+            runRecord["rowsLoaded"] = None
+
+        return "success function", runRecord
+
+    except:
+        print("Error function:  runBenchmark - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        pipeline.resetRunState()
+        return "failed function", "Null"
+
+
+#Write the per repeat results and the median seconds per layout, sample count and phase
+def writeBenchmarkSummary(resultRecords):
+    try:
+        df_results = pd.DataFrame(resultRecords)
+        df_results.to_csv(resultsName + "_Results.csv", index=False)
+
+        secondsFields = ["wallSeconds"] + [phase + "Seconds" for phase in phaseStages]
+        df_summary = df_results.groupby(["layout", "sampleCount"], sort=False).agg(
+            repeats=("repeat", "size"), rowsLoaded=("rowsLoaded", "max"), **{field: (field, "median") for field in secondsFields}).reset_index()
+        df_summary["rowsPerSecond"] = (df_summary["rowsLoaded"] / df_summary["wallSeconds"]).round(1)
+        df_summary.to_csv(resultsName + "_Summary.csv", index=False)
+        with open(resultsName + "_Summary.json", "w") as outFile:
+            json.dump({"repeats": repeats, "phaseStages": phaseStages, "summary": df_summary.to_dict(orient="records")}, outFile, indent=2, default=str)
+
+        print("Benchmark Summary (median seconds) - " + timeFun() + "\n" + df_summary.round(3).to_string(index=False))
+        return "success function"
+
+    except:
+        print("Error function:  writeBenchmarkSummary - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function"
+
+
+# Function to Get the Date/Time
+def timeFun():
+    from datetime import datetime
+    b = datetime.now()
+    messageTime = b.isoformat()
+    return messageTime
+
+
+if __name__ == '__main__':
+
+    # Sample counts from the command line (e.g. 'python ROMN_Soils_ETL_Benchmark.py 100 20000')
+    if len(sys.argv) > 1:
+        sampleCounts = [int(sampleCount) for sampleCount in sys.argv[1:]]
+
+    # Analyses routine ---------------------------------------------------------
+    main()
@@ -0,0 +1,359 @@
+# ---------------------------------------------------------------------------
+# ROMN_Soils_Synthetic_EDD.py
+# Description:  Routine to generate synthetic CSU Soils lab Electronic Data Deliverable (EDD) workbooks and a matching seeded SQLite stand-in for the Soils database.
+# Code performs the following routines:
+# Defines a seeded set of VCSS and WEI samples at the requested scale.  Writes an EDD workbook for each lab layout - 'pre2022' (single sheet with R-number Lab IDs
+# and two stacked tables), 'gte2022' (Bulk Density, Chemistry and Texture/Carbon tables) and '2024' (two tables).  Writes a SQLite database with the events tables
+# (tbl_Events, tbl_Events1, tbl_Soil), the 'tlu_NameUnitCrossWalk' lookup table and an empty 'tbl_SoilChemistry_Dataset' (optional prior year history records).
+# A parameters JSON file is written per EDD with the ETL script parameters (Lab IDs, record counts, field crosswalks) needed to process the workbook.
+
+# Dependices:
+# Python version 3.x
+# Pandas, Numpy
+# openpyxl - used for the pandas '.to_excel' functionality
+
+# Usage:  python ROMN_Soils_Synthetic_EDD.py [sampleCount ...]
+
+#######################################
+## Below are paths which are hard coded
+#######################################
+#Import Required Libraries
+import os
+import sys
+import json
+import sqlite3
+import traceback
+import numpy as np
+import pandas as pd
+
+###################################################
+# Start of Parameters requiring set up.
+###################################################
+#Output folder for the synthetic EDDs and stand-in databases
+outputFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "synthetic")
+
+#Number of samples per generated EDD - one EDD/database set per count and layout
+sampleCounts = [50, 500, 5000]
+#EDD layouts to generate - 'pre2022', 'gte2022' and '2024'
+layouts = ["pre2022", "gte2022", "2024"]
+#Random seed - the same seed and sample count always generates the same EDD and database
+randomSeed = 20240601
+#Field season year of the generated EDDs
+fieldSeasonYear = 2024
+#Proportion of WEI (wetlands) samples - remainder are VCSS (uplands) samples
+weiProportion = 0.3
+#Proportion of cells written as the lab no data value, and as empty cells
+noDataProportion = 0.02
+emptyProportion = 0.01
+#Prior years of history records written to 'tbl_SoilChemistry_Dataset' for the outlier statistics (0 writes an empty table)
+historyYears = 2
+
+#Parks used for the VCSS and WEI site names
+parkCodes = ["ROMO", "GRSA", "GLAC", "FLFO", "LIBI", "BICA", "GRKO", "SAND"]
+
+#EDD layout definitions - field crosswalks as defined in the ETL scripts, the lab no data value and the Lab ID style
+eddLayouts = {
+    "pre2022": {"noDataValue": None,  #No lab no data value - empty cells
+                "tables": [['SampleName_Lab', 'SampleName_ROMN', 'pH', 'EC_mmhos/cm', 'Lime_estimate', 'Organic_Matter_20cm', 'NO3-N_ppm', 'P_ppm', 'K_ppm',
+                            'Zn_ppm', 'Fe_ppm', 'Mn_ppm', 'Cu_ppm', 'S_ppm', 'Texture_Categorical'],
+                           ['SampleName_Lab', 'SampleName_ROMN', 'Ca_meq/L', 'Mg_meq/L', 'K_meq/L', 'Na_meq/L', 'SAR', 'Mg_ppm', 'NH4-N_ppm', 'BulkDensity_g/cm3']]},
+    "gte2022": {"noDataValue": "*",
+                "tables": [['Lab ID', 'Sample ID', 'Bulk Density (g/cm)'],
+                           ['Lab ID', 'Sample ID', 'pH 1:1', 'EC 1:1', 'OM (%)', 'NO3- (ppm)', 'NH4+ (ppm)', 'P (ppm)', 'S (ppm)', 'K (ppm)', 'Ca (ppm)', 'Mg (ppm)',
+                            'Na (ppm)', 'CEC', 'Zn (ppm)', 'Fe (ppm)', 'Mn (ppm)', 'Cu (ppm)', 'B (ppm)'],
+                           ['Lab ID', 'Sample ID', 'TC (%)', 'TN (%)', 'Sand (%)', 'Clay (%)', 'Silt (%)', 'Texture Class', 'H (%)', 'K (%)', 'Ca (%)', 'Mg (%)', 'Na (%)']]},
+    "2024": {"noDataValue": "NA",
+             "tables": [['Lab ID', 'Sample ID', 'pH 1:1', 'Woodruff Buffer pH', 'EC 1:1', 'Lime_Categorical', 'OM (%)', 'NO3- (ppm)', 'NH4+ (ppm)', 'P (ppm)',
+                         'S (ppm)', 'K (ppm)', 'Ca (ppm)', 'Mg (ppm)', 'Na (ppm)', 'CEC', 'Zn (ppm)', 'Fe (ppm)', 'Mn (ppm)', 'Cu (ppm)', 'B (ppm)'],
+                        ['Lab ID', 'Sample ID', 'SAR', 'H (%)', 'K (%)', 'Ca (%)', 'Mg (%)', 'Na (%)', 'Total Base Saturation', 'TC (%)', 'TN (%)', 'C_N_Ratio']]}}
+
+#Fields of the 'tbl_SoilChemistry_Dataset' table
+datasetFields = ["SiteName", "Protocol_ROMN", "EventName", "StartDate", "YearSampled", "ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset", "QC_Status",
+                 "QC_Flag", "QC_Notes", "DataFlag", "Count", "StDev", "STErr", "Value", "Min", "Max"]
+
+#################################################
+##
+
+def main():
+    try:
+        if not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        for sampleCount in sampleCounts:
+            outVal = generateSyntheticSet(sampleCount)
+            if outVal[0].lower() != "success function":
+                print("WARNING - Function generateSyntheticSet - " + timeFun() + " - Failed - Exiting Script")
+                exit()
+
+        print("Successfully Finished Generating Synthetic EDDs - " + outputFolder + " - " + timeFun())
+
+    except:
+        print("ROMN_Soils_Synthetic_EDD.py - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+
+
+#Generate the samples, stand-in database and the EDD workbooks (one per layout) for a sample count.  Returns the list of parameter files written.
+def generateSyntheticSet(sampleCount):
+    try:
+        rng = np.random.default_rng([randomSeed, sampleCount])
+        df_samples = defineSamples(sampleCount, rng)
+
+        dbPath = os.path.join(outputFolder, "Soils_StandIn_" + str(sampleCount) + ".db")
+        outVal = buildStandInDB(df_samples, dbPath, rng)
+        if outVal.lower() != "success function":
+            return "failed function", "Null"
+
+        parameterFiles = []
+        for layout in layouts:
+            outVal = writeEDDWorkbook(df_samples, layout, sampleCount, dbPath, rng)
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null"
+            parameterFiles.append(outVal[1])
+            print("Synthetic EDD - " + layout + " - " + str(sampleCount) + " samples - " + outVal[1] + " - " + timeFun())
+
+        return "success function", parameterFiles
+
+    except:
+        print("Error function:  generateSyntheticSet - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function", "Null"
+
+
+#Define the sample records - Protocol, SiteName, EventName, StartDate, ROMN sample name and the measured values of the sample (shared by all layouts)
+def defineSamples(sampleCount, rng):
+    weiCount = int(round(sampleCount * weiProportion))
+    protocol = np.array(["VCSS"] * (sampleCount - weiCount) + ["WEI"] * weiCount, dtype=object)
+
+    # Sites - 999 sites per park code, additional park codes ('PK01'...) past the defined parks
+    siteNumber = np.arange(sampleCount) % 999 + 1
+    parkIndex = np.arange(sampleCount) // 999
+    parkCode = np.array([parkCodes[index] if index < len(parkCodes) else "PK" + str(index).zfill(2) for index in parkIndex], dtype=object)
+
+    startDate = pd.Timestamp(str(fieldSeasonYear) + "-06-01") + pd.to_timedelta(rng.integers(0, 110, sampleCount), unit="D")
+    dateNum = startDate.strftime("%Y%m%d").to_numpy(dtype=object)
+
+    vcssSite = parkCode + "_" + pd.Series(siteNumber).astype(str).str.zfill(3).to_numpy(dtype=object)
+    weiSite = parkCode + "_W" + pd.Series(siteNumber).astype(str).str.zfill(4).to_numpy(dtype=object)
+    isWEI = protocol == "WEI"
+
+    df_samples = pd.DataFrame({"Protocol_ROMN": protocol,
+                               "SiteName": np.where(isWEI, weiSite, vcssSite),
+                               "DateNum": dateNum,
+                               "StartDate": startDate})
+    df_samples["EventName"] = df_samples["SiteName"] + "_" + df_samples["DateNum"]
+    # VCSS samples are '<SiteName>_<DateNum>_CM' (bulk density table '_BD'), WEI samples are the 'Chem' name in 'tbl_Soil'
+    df_samples["SampleName_ROMN"] = np.where(isWEI, df_samples["SiteName"] + "_Chem", df_samples["EventName"] + "_CM")
+    df_samples["SampleName_BD"] = np.where(isWEI, df_samples["SampleName_ROMN"], df_samples["EventName"] + "_BD")
+
+    # Soil composition shared by the texture and base saturation fields - texture sums to 100, base saturation components sum to the total
+    texture = rng.dirichlet([4, 3, 2], sampleCount) * 100
+    df_samples["Sand"] = texture[:, 0].round(1)
+    df_samples["Silt"] = texture[:, 1].round(1)
+    df_samples["Clay"] = (100 - df_samples["Sand"] - df_samples["Silt"]).round(1)
+    baseSaturation = rng.uniform(60, 100, sampleCount)
+    baseShares = rng.dirichlet([1, 12, 3, 0.5], sampleCount)
+    for position, field in enumerate(["K", "Ca", "Mg", "Na"]):
+        df_samples["Base_" + field] = (baseSaturation * baseShares[:, position]).round(1)
+    df_samples["Base_Total"] = df_samples[["Base_K", "Base_Ca", "Base_Mg", "Base_Na"]].sum(axis=1).round(1)
+    df_samples["TC"] = rng.lognormal(1.0, 0.7, sampleCount).round(2)
+    df_samples["TN"] = (df_samples["TC"] / rng.uniform(8, 25, sampleCount)).round(3)
+
+    return df_samples
+
+
+#Field values for all samples - the value model is chosen from the field name (pH, EC, OM, ppm, meq/L, texture, base saturation, categorical fields)
+def defineFieldValues(field, df_samples, rng):
+    sampleCount = df_samples.shape[0]
+    fieldLower = field.lower()
+
+    if field.startswith(("Lime", "Texture")):
+        if field.startswith("Lime"):
+            return rng.choice(["Low", "Medium", "High", "Very High"], sampleCount, p=[0.5, 0.25, 0.15, 0.1]).astype(object)
+        return rng.choice(["Sandy Loam", "Loam", "Silt Loam", "Clay Loam", "Loamy Sand", "Sandy Clay Loam"], sampleCount).astype(object)
+    if field.startswith(("Sand", "Silt", "Clay")):
+        return df_samples[field.split(" ")[0]].to_numpy()
+    if field.split(" ")[0] in ("K", "Ca", "Mg", "Na") and "(%)" in field:
+        return df_samples["Base_" + field.split(" ")[0]].to_numpy()
+    if field == "Total Base Saturation":
+        return df_samples["Base_Total"].to_numpy()
+    if field == "H (%)":
+        return (100 - df_samples["Base_Total"]).clip(lower=0).round(1).to_numpy()
+    if field.startswith("TC"):
+        return df_samples["TC"].to_numpy()
+    if field.startswith("TN"):
+        return df_samples["TN"].to_numpy()
+    if field == "C_N_Ratio":
+        return (df_samples["TC"] / df_samples["TN"]).round(1).to_numpy()
+    if "ph" in fieldLower.split(" ") or field == "pH":
+        if field.startswith("Woodruff"):
+            return rng.uniform(6.2, 7.6, sampleCount).round(2)
+        return rng.normal(6.6, 0.8, sampleCount).clip(3.5, 9.5).round(1)
+    if fieldLower.startswith("ec"):
+        return rng.lognormal(-1.2, 0.6, sampleCount).round(2)
+    if fieldLower.startswith(("om", "organic")):
+        return rng.lognormal(1.4, 0.7, sampleCount).clip(0.2, 80).round(1)
+    if "bulk" in fieldLower:
+        return rng.uniform(0.5, 1.6, sampleCount).round(2)
+    if field == "CEC":
+        return rng.uniform(4, 45, sampleCount).round(1)
+    if field == "SAR":
+        return rng.lognormal(-1.5, 0.8, sampleCount).round(2)
+    if "meq/l" in fieldLower:
+        return rng.lognormal(0, 0.8, sampleCount).round(2)
+    if "ppm" in fieldLower:
+        return rng.lognormal(2.2, 1.1, sampleCount).round(1)
+    return rng.uniform(0, 10, sampleCount).round(2)
+
+
+#EDD table values - one row per sample (Lab ID, Sample ID, fields) with the lab no data value and empty cells applied at the defined proportions
+def defineTableRows(fieldList, labIDs, sampleNames, df_samples, noDataValue, rng):
+    tableColumns = [labIDs, sampleNames]
+    for field in fieldList[2:]:
+        values = defineFieldValues(field, df_samples, rng).astype(object)
+        draw = rng.random(values.shape[0])
+        values[draw < noDataProportion] = noDataValue
+        values[(draw >= noDataProportion) & (draw < noDataProportion + emptyProportion)] = None
+        tableColumns.append(values)
+    return [list(row) for row in zip(*tableColumns)]
+
+
+#Write the EDD workbook for a layout and the parameters JSON file for the ETL script.  Returns the parameters file path.
+def writeEDDWorkbook(df_samples, layout, sampleCount, dbPath, rng):
+    try:
+        layoutDefinition = eddLayouts[layout]
+        tableFields = layoutDefinition["tables"]
+        noDataValue = layoutDefinition["noDataValue"]
+        sampleNames = df_samples["SampleName_ROMN"].to_numpy(dtype=object)
+        sheetRows = []
+
+        if layout == "pre2022":
+            # Single sheet - column one is the R-number Lab ID, the second table starts where the first Lab ID repeats
+            sheetWidth = len(tableFields[0])
+            firstRecord = 62
+            labIDs = np.array(["R" + str(firstRecord + index) for index in range(sampleCount)], dtype=object)
+            sheetRows.append(["CSU Soil, Water and Plant Testing Laboratory - Synthetic " + str(fieldSeasonYear)] + [None] * (sheetWidth - 1))
+            sheetRows.append(tableFields[0])
+            sheetRows.extend(defineTableRows(tableFields[0], labIDs, sampleNames, df_samples, noDataValue, rng))
+            sheetRows.extend([[None] * sheetWidth for index in range(2)])
+            sheetRows.append(tableFields[1] + [None] * (sheetWidth - len(tableFields[1])))
+            sheetRows.extend([row + [None] * (sheetWidth - len(row)) for row in defineTableRows(tableFields[1], labIDs, sampleNames, df_samples, noDataValue, rng)])
+            scriptParameters = {"firstLabID": labIDs[0], "lastLabID": labIDs[-1], "noDataValue": None}
+
+        else:
+            # Tables start in column three - table one (Bulk Density for 'gte2022') uses the '_BD' sample names
+            if layout == "gte2022":
+                sheetWidth = 2 + max(len(fieldList) for fieldList in tableFields[1:2])
+            else:
+                sheetWidth = 2 + max(len(fieldList) for fieldList in tableFields)
+            labIDs = np.array([str(fieldSeasonYear) + "S" + str(3000 + index) for index in range(sampleCount)], dtype=object)
+            tableSampleNames = [df_samples["SampleName_BD"].to_numpy(dtype=object)] + [sampleNames] * (len(tableFields) - 1)
+            sheetRows.append(["CSU Soil, Water and Plant Testing Laboratory - Synthetic " + str(fieldSeasonYear)] + [None] * (sheetWidth - 1))
+            scriptParameters = {"noDataValue": noDataValue}
+            tableNames = ["One", "Two", "Three"]
+            for tableIndex, fieldList in enumerate(tableFields):
+                sheetRows.extend([[None] * sheetWidth for index in range(2)])
+                sheetRows.append([None, None] + fieldList + [None] * (sheetWidth - 2 - len(fieldList)))
+                for row in defineTableRows(fieldList, labIDs, tableSampleNames[tableIndex], df_samples, noDataValue, rng):
+                    sheetRows.append([None, None] + row + [None] * (sheetWidth - 2 - len(row)))
+                scriptParameters["table" + tableNames[tableIndex] + "FirstLabID"] = labIDs[0]
+                scriptParameters["table" + tableNames[tableIndex] + "NumberRecords"] = sampleCount
+
+        outFileNoExt = os.path.join(outputFolder, "Synthetic_EDD_" + layout + "_" + str(sampleCount))
+        pd.DataFrame(sheetRows).to_excel(outFileNoExt + ".xlsx", sheet_name="Raw Data", header=False, index=False)
+
+        parameterRecord = {"layout": layout,
+                           "sampleCount": sampleCount,
+                           "inputFile": outFileNoExt + ".xlsx",
+                           "rawDataSheet": "Raw Data",
+                           "soilsDB": dbPath,
+                           "scriptParameters": dict(scriptParameters, **{"fieldCrossWalk" + str(index + 1): fieldList for index, fieldList in enumerate(tableFields)})}
+        with open(outFileNoExt + "_Parameters.json", "w") as outFile:
+            json.dump(parameterRecord, outFile, indent=2, default=str)
+
+        return "success function", outFileNoExt + "_Parameters.json"
+
+    except:
+        print("Error function:  writeEDDWorkbook - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function", "Null"
+
+
+#Lookup record for an EDD field - Parameter/Unit Dataset values and the parameter type (Categorical/Numeric)
+def defineCrossWalkRecord(field):
+    if "(" in field:
+        parameter = field.split("(")[0].strip()
+        unit = field.split("(")[1].rstrip(")").strip()
+    elif field.endswith(("_ppm", "_meq/L", "_g/cm3", "_mmhos/cm")):
+        parameter, unit = field.rsplit("_", 1)
+    else:
+        parameter, unit = field, "NA"
+    parameterType = "Categorical" if field.startswith(("Lime", "Texture", "Peat")) else "Numeric"
+    parameterDataset = parameter.replace(" ", "_") + ("_" + unit.replace("%", "pct") if unit != "NA" else "")
+    return [field, unit, parameterDataset, unit, parameterType]
+
+
+#Build the SQLite stand-in for the Soils DB - events tables for all layouts (the layouts query different event tables), the crosswalk lookup and the dataset table
+def buildStandInDB(df_samples, dbPath, rng):
+    try:
+        if os.path.exists(dbPath):
+            os.remove(dbPath)
+        cnxn = sqlite3.connect(dbPath)
+
+        df_events = df_samples[["EventName", "SiteName", "DateNum", "StartDate", "Protocol_ROMN"]].copy()
+        df_events["StartDate"] = df_events["StartDate"].dt.strftime("%Y-%m-%d")
+        # WEI events have no DateNum (not matched on SiteName/DateNum)
+        df_events.loc[df_events["Protocol_ROMN"] == "WEI", "DateNum"] = None
+        # 'tbl_Events' and 'tbl_Events1' both hold all events - the VCSS and WEI event tables differ across the layout scripts
+        df_events.drop(columns="Protocol_ROMN").to_sql("tbl_Events", cnxn, index=False)
+        df_events.drop(columns=["Protocol_ROMN", "DateNum"]).to_sql("tbl_Events1", cnxn, index=False)
+
+        df_wei = df_samples[df_samples["Protocol_ROMN"] == "WEI"]
+        pd.DataFrame({"EventName": df_wei["EventName"], "Chem": df_wei["SampleName_ROMN"], "Comments_Soil": None, "Comments_Sample": None}).to_sql("tbl_Soil", cnxn, index=False)
+
+        crossWalkFields = sorted({field for layoutDefinition in eddLayouts.values() for fieldList in layoutDefinition["tables"] for field in fieldList[2:]})
+        pd.DataFrame([defineCrossWalkRecord(field) for field in crossWalkFields],
+                     columns=["ParameterNative", "UnitNative", "ParameterDataset", "UnitDataset", "ParameterType"]).to_sql("tlu_NameUnitCrossWalk", cnxn, index=False)
+
+        # Dataset table - prior year history records ('2024' layout fields) for the outlier statistics
+        historyList = [pd.DataFrame(columns=datasetFields)]
+        for yearOffset in range(1, historyYears + 1):
+            fieldList = eddLayouts["2024"]["tables"][0][2:] + eddLayouts["2024"]["tables"][1][2:]
+            df_history = df_samples.loc[np.repeat(df_samples.index.to_numpy(), len(fieldList))].reset_index(drop=True)
+            df_history["ParameterRaw"] = np.tile(np.array(fieldList, dtype=object), df_samples.shape[0])
+            df_history["Value"] = np.concatenate([defineFieldValues(field, df_samples, rng).astype(str).reshape(-1, 1) for field in fieldList], axis=1).ravel()
+            df_history["StartDate"] = (df_history["StartDate"] - pd.DateOffset(years=yearOffset)).dt.strftime("%Y-%m-%d")
+            df_history["YearSampled"] = fieldSeasonYear - yearOffset
+            df_history["EventName"] = df_history["SiteName"] + "_" + df_history["StartDate"].str.replace("-", "")
+            df_lookup = pd.DataFrame([defineCrossWalkRecord(field) for field in fieldList], columns=["ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset", "ParameterType"])
+            df_history = df_history.merge(df_lookup.drop(columns="ParameterType"), on="ParameterRaw", how="left")
+            df_history = df_history.assign(QC_Status=1, QC_Flag="", QC_Notes="", DataFlag="Null", Count=1, StDev=-999, STErr=-999)
+            df_history["Min"] = df_history["Value"]
+            df_history["Max"] = df_history["Value"]
+            historyList.append(df_history[datasetFields])
+        pd.concat(historyList, ignore_index=True).to_sql("tbl_SoilChemistry_Dataset", cnxn, index=False)
+
+        cnxn.close()
+        return "success function"
+
+    except:
+        print("Error function:  buildStandInDB - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function"
+
+
+# Function to Get the Date/Time
+def timeFun():
+    from datetime import datetime
+    b = datetime.now()
+    messageTime = b.isoformat()
+    return messageTime
+
+
+if __name__ == '__main__':
+
+    # Sample counts from the command line (e.g. 'python ROMN_Soils_Synthetic_EDD.py 100 20000')
+    if len(sys.argv) > 1:
+        sampleCounts = [int(sampleCount) for sampleCount in sys.argv[1:]]
+
+    # Analyses routine ---------------------------------------------------------
+    main()
@@ -0,0 +1,15 @@
+# ---------------------------------------------------------------------------
+# romn_soils_etl
+# Description:  ROMN Soils ETL package - Extract Transform and Load (ETL) of the CSU Soils lab Electronic Data Deliverables (EDD) to the Soils database
+# 'tbl_SoilChemistry_Dataset' table.  The 'ROMN_Soils_ETL_To_SoilsDB_*.py' scripts set the EDD specific parameters ('config.setParameters') and run 'pipeline.main'.
+
+# Modules:
+# config - run parameters, runlog - logging/stage timing/run report, db - Soils DB connections, lookups - crosswalk lookup and cache,
+# extract - EDD table extraction per layout, metadata - event metadata, validate - preflight, transform - stack/join/clean,
+# qc - QC rules, outliers - historical outlier flags, frameio - Parquet/CSV files, load - append/rejects/dry run, journal - run journal/resume,
+# incremental - incremental loads, export - Parquet export, pipeline - 'main' routine, cli - command line entry point ('python -m romn_soils_etl'),
+# watch - inbox watch mode, backfill - backfill from the archived EDDs, query - read API ('get_values') over the values cache.
+
+# Importing the package (or 'config') has no side effects - no directories or files are created and the Access drivers (pyodbc, sqlalchemy-access)
+# are imported on the first Soils DB connection.
+# ---------------------------------------------------------------------------
@@ -0,0 +1,10 @@
+# ---------------------------------------------------------------------------
+# __main__.py
+# Description:  'python -m romn_soils_etl' - runs the command line entry point (see 'cli.py' for the arguments and run file format).
+# ---------------------------------------------------------------------------
+import sys
+
+from romn_soils_etl import cli
+
+if __name__ == '__main__':
+    sys.exit(cli.main())
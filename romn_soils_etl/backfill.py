@@ -0,0 +1,227 @@
+# ---------------------------------------------------------------------------
+# backfill.py
+# Description:  Historical backfill - rebuilds 'tbl_SoilChemistry_Dataset' from the archived EDDs of all eras (e.g. after a crosswalk correction) in place of
+# running the Pre2022/gte2022/2024 scripts file by file.
+# Code performs the following routines:
+# Creates the 'backfillTarget' database as a copy of the 'soilsDB' with an empty 'tbl_SoilChemistry_Dataset' (a new target - an existing file is not replaced),
+# prepares the EDDs of the manifest run file in parallel worker processes ('cli.runPipelined' - extract, event metadata, preflight, transform, QC) and appends
+# them to the target in the manifest order with a single writer ('staging' load method - one INSERT ... SELECT per EDD table).  The event metadata and lookups
+# are read from the 'soilsDB'.  A reconciliation per EDD (EDD rows, final records, appended, existing key, rejected) is written to 'backfillReconciliationName'.
+
+# Usage:  python -m romn_soils_etl --backfill manifest.toml --target Soil_ROMN_Backfill.accdb --soils-db Soil_ROMN_AllYears_MASTER.accdb --jobs 4
+# Manifest - one '[[runs]]' table per archived EDD ('inputFile', 'eddLayout', 'rawDataSheet' and the table parameters), with the field crosswalks per layout
+# in '[layouts.pre2022]', '[layouts.gte2022]' and '[layouts.2024]' tables.  A record whose key (EventName, ParameterRaw) is already in the target is not
+# appended, so for a re-issued EDD the first EDD in the manifest order is retained.
+# ---------------------------------------------------------------------------
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import getSoilsDBEngine, disposeEngines, isSQLiteDB
+from romn_soils_etl.frameio import readFrameFile
+from romn_soils_etl.load import getExistingRecords
+
+#Index on the target key fields while the backfill runs - the NOT EXISTS clause of each staged insert is an index lookup in place of a table scan
+backfillIndexName = "idx_Backfill_Key"
+
+#Backfill the EDDs of the run list to the 'backfillTarget' - returns the run records with the reconciliation counts
+def runBackfill(runList, jobs, queueSize):
+    from romn_soils_etl.cli import runPipelined
+
+    try:
+        targetNames = set(runParameters.get("backfillTarget") for runParameters in runList)
+        if len(targetNames) != 1 or None in targetNames:
+            print("WARNING - every backfill run must have the same 'backfillTarget' (--target) - " + str(sorted(map(str, targetNames))) + " - Exiting Script")
+            return "failed function", "Null"
+        if [runParameters for runParameters in runList if runParameters.get("replayRejectsFile") is not None or runParameters.get("resumeLoad") or
+                                                          runParameters.get("inputFile") is None]:
+            print("WARNING - backfill runs are EDDs ('inputFile') - replay and resume runs are not backfilled - Exiting Script")
+            return "failed function", "Null"
+
+        outVal = createBackfillTarget(runList[0])
+        if outVal.lower() != "success function":
+            return "failed function", "Null"
+
+        print("Backfill - " + str(len(runList)) + " EDDs - " + str(jobs) + " EDDs prepared concurrently, appended to: " + config.backfillTarget + " - " + timeFun())
+        resultRecords = runPipelined(runList, jobs, queueSize, loadRun=loadBackfillEDD)
+
+        dropBackfillIndex(runList[0])
+        outVal = writeReconciliation(resultRecords)
+        if outVal.lower() != "success function":
+            return "failed function", "Null"
+        return "success function", resultRecords
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  runBackfill - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+    finally:
+        disposeEngines()
+
+#Set the run parameters in 'config' for the backfill target
+def setBackfillParameters(runParameters):
+    from romn_soils_etl import pipeline
+
+    pipeline.resetRunState(clearCaches=False)
+    config.resetParameters()
+    config.setParameters(**runParameters)
+    config.defineOutputNames()
+    if not os.path.exists(config.workspace):
+        os.makedirs(config.workspace)
+
+#Create the backfill target - copy of the 'soilsDB' (lookup and event tables) with the 'tbl_SoilChemistry_Dataset' records deleted and the key index created
+def createBackfillTarget(runParameters):
+    import sqlalchemy as sa
+
+    try:
+        setBackfillParameters(runParameters)
+        if os.path.exists(config.backfillTarget):
+            print("WARNING - backfill target: " + config.backfillTarget + " exists - the backfill is loaded to a new target - Exiting Script")
+            return "failed function"
+        shutil.copyfile(config.soilsDB, config.backfillTarget)
+
+        with getSoilsDBEngine(config.backfillTarget).begin() as conn:
+            deletedCount = conn.execute(sa.text("DELETE FROM " + config.soilsDatasetTable)).rowcount
+            conn.execute(sa.text("CREATE INDEX " + backfillIndexName + " ON " + config.soilsDatasetTable + " (" + ", ".join("[" + field + "]" for field in config.stagingKeyFields) + ")"))
+
+        print("Backfill target created: " + config.backfillTarget + " - copy of: " + config.soilsDB + " - " + str(deletedCount) + " '" + config.soilsDatasetTable +
+              "' records removed - " + timeFun())
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  createBackfillTarget - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#Drop the key index from the backfill target - the target has the 'soilsDB' table definitions
+def dropBackfillIndex(runParameters):
+    import sqlalchemy as sa
+
+    setBackfillParameters(runParameters)
+    with getSoilsDBEngine(config.backfillTarget).begin() as conn:
+        if isSQLiteDB(config.backfillTarget):
+            conn.execute(sa.text("DROP INDEX " + backfillIndexName))  # SQLite stand-in - no table name
+        else:
+            conn.execute(sa.text("DROP INDEX " + backfillIndexName + " ON " + config.soilsDatasetTable))
+
+#Record count of the target 'tbl_SoilChemistry_Dataset'
+def getTargetCount():
+    import sqlalchemy as sa
+    with getSoilsDBEngine(config.backfillTarget).connect() as conn:
+        return conn.execute(sa.text("SELECT COUNT(*) FROM " + config.soilsDatasetTable)).scalar()
+
+#Backfill writer - append a prepared EDD to the target ('pipeline.loadMain' with the 'soilsDB' set to the target and the 'staging' load method).  The history
+#statistics and values caches of the 'soilsDB' are not refreshed and the incremental load is off (the target starts empty).  The run journal is not used - the
+#target records are not fingerprinted in the workspace journal (an incremental load of the 'soilsDB' would skip them).  Returns the run record with the reconciliation counts.
+def loadBackfillEDD(runParameters, preparedRecord):
+    from romn_soils_etl import pipeline
+    from romn_soils_etl.cli import getRunRecord
+
+    reconcileRecord = {"FinalRecords": None, "Appended": None, "ExistingKey": None, "Rejected": None}
+    setBackfillParameters(runParameters)
+    config.setParameters(soilsDB=config.backfillTarget, loadMethod="staging", incrementalLoad=False, useRunJournal=False, applyOutlierFlags=False,
+                         valuesCacheRefresh=False)
+    loadStartTime = time.time()
+
+    if preparedRecord["runStatus"] == "Prepared":
+        dfs_final = preparedRecord["dfs_final"]
+        outVal = countExistingKeys(dfs_final)
+        countBefore = getTargetCount()
+        pipeline.resetRunState(clearCaches=False)
+        pipeline.loadMain(preparedRecord)
+        appendedCount = getTargetCount() - countBefore
+
+        # Rejected records - the rejects file when written by this load
+        rejectedMask = [np.zeros(dataset.shape[0], dtype=bool) for dataset in dfs_final]
+        if [extension for extension in (".parquet", ".csv") if os.path.exists(config.rejectsName + extension) and
+                                                               os.path.getmtime(config.rejectsName + extension) >= loadStartTime]:
+            outValRejects = readFrameFile(config.rejectsName)
+            if outValRejects[0].lower() == "success function" and outValRejects[1] is not None:
+                for eddTable, rejectRow in outValRejects[1][["EDDTable", "RejectRow"]].itertuples(index=False):
+                    rejectedMask[int(eddTable)][int(rejectRow)] = True
+
+        reconcileRecord["FinalRecords"] = sum(dataset.shape[0] for dataset in dfs_final)
+        reconcileRecord["Appended"] = appendedCount
+        reconcileRecord["Rejected"] = int(sum(mask.sum() for mask in rejectedMask))
+        if outVal[0].lower() == "success function":
+            reconcileRecord["ExistingKey"] = int(sum((existingMask & ~mask).sum() for existingMask, mask in zip(outVal[1], rejectedMask)))
+
+    pipeline.resetRunState(clearCaches=False)
+    resultRecord = getRunRecord()
+    resultRecord.update(reconcileRecord)
+    resultRecord.update(eddLayout=runParameters.get("eddLayout", config.eddLayout), stages=readManifestStages(resultRecord["runManifestName"]))
+    return resultRecord
+
+#Final records not appended for an existing key - the key (EventName, ParameterRaw) is in the target before the load, or in an earlier EDD table of the EDD.
+#Returns a boolean array per EDD table.
+def countExistingKeys(dfs_final):
+    try:
+        df_keys = pd.concat([pd.DataFrame({"EDDTable": loopCount, "EventName": dataset["EventName"].astype(str).to_numpy(),
+                                           "ParameterRaw": dataset["ParameterRaw"].astype(str).to_numpy()}) for loopCount, dataset in enumerate(dfs_final)], ignore_index=True)
+        outVal = getExistingRecords(df_keys["EventName"].unique())
+        if outVal[0].lower() != "success function":
+            return "failed function", "Null"
+        existingKeys = pd.MultiIndex.from_frame(outVal[1][["EventName", "ParameterRaw"]].astype(str))
+        inTarget = pd.MultiIndex.from_frame(df_keys[["EventName", "ParameterRaw"]]).isin(existingKeys)
+        earlierTable = (df_keys["EDDTable"] > df_keys.groupby(["EventName", "ParameterRaw"])["EDDTable"].transform("min")).to_numpy()
+        existingMask = inTarget | earlierTable
+        return "success function", [existingMask[(df_keys["EDDTable"] == loopCount).to_numpy()] for loopCount in range(len(dfs_final))]
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  countExistingKeys - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Stage records of a run manifest (rows out per stage) - empty when the run manifest was not written
+def readManifestStages(runManifestName):
+    if runManifestName is None or not os.path.exists(runManifestName):
+        return []
+    with open(runManifestName) as inFile:
+        return json.load(inFile)["stages"]
+
+#Write the backfill reconciliation - one record per EDD:  EDD rows extracted, final records (stacked), appended, existing key (not appended) and rejected.
+#'Reconciled' is True when the appended, existing key and rejected records account for every final record.
+def writeReconciliation(resultRecords):
+    try:
+        reconcileList = []
+        for resultRecord in resultRecords:
+            stageRows = {}
+            for stageRecord in resultRecord["stages"]:
+                if stageRecord["rowsOut"] is not None:
+                    stageRows[stageRecord["stage"]] = stageRows.get(stageRecord["stage"], 0) + stageRecord["rowsOut"]
+            reconcileRecord = {"InputFile": resultRecord["inputFile"],
+                               "EDDLayout": resultRecord["eddLayout"],
+                               "RunStatus": resultRecord["runStatus"],
+                               "SheetRows": stageRows.get("read_excel"),
+                               "EDDRows": stageRows.get("extractEDDTables"),
+                               "FinalRecords": resultRecord["FinalRecords"],
+                               "Appended": resultRecord["Appended"],
+                               "ExistingKey": resultRecord["ExistingKey"],
+                               "Rejected": resultRecord["Rejected"]}
+            reconcileRecord["Reconciled"] = (resultRecord["runStatus"] == "Appended" and resultRecord["ExistingKey"] is not None and
+                                             resultRecord["Appended"] + resultRecord["ExistingKey"] + resultRecord["Rejected"] == resultRecord["FinalRecords"])
+            reconcileRecord["RunManifest"] = resultRecord["runManifestName"]
+            resultRecord["Reconciled"] = reconcileRecord["Reconciled"]
+            reconcileList.append(reconcileRecord)
+
+        df_reconcile = pd.DataFrame(reconcileList)
+        df_reconcile.to_csv(config.backfillReconciliationName, index=False)
+
+        print("Backfill Reconciliation - " + config.backfillReconciliationName + " - " + timeFun())
+        print(df_reconcile.drop(columns=["RunManifest"]).assign(InputFile=df_reconcile["InputFile"].map(os.path.basename)).to_string(index=False))
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  writeReconciliation - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
@@ -0,0 +1,333 @@
+# ---------------------------------------------------------------------------
+# cli.py
+# Description:  Command line entry point - runs one or more EDDs with the parameters from the command line and/or a TOML (or YAML) run file in place of
+# editing the parameters at the top of the ETL scripts.
+# Code performs the following routines:
+# Reads the run file ('[defaults]' applied to every run and one '[[runs]]' table per EDD, or a single run of top level parameters), applies the command line
+# parameters to every run and runs each EDD with 'pipeline.main'.  Each run has its own output names (logfile, run manifest, preflight report, rejects).
+# With '--jobs' above 1 the runs are processed concurrently in worker processes when every run is a preflight only or dry run.  Runs which append to the
+# Soils DB are pipelined - the worker processes prepare the EDDs (Excel parsing, metadata, transform, QC) while this process appends the prepared EDDs one
+# at a time (the Access database is a single writer), with at most '--queue-size' prepared EDDs waiting for the writer.
+
+# Usage:  python -m romn_soils_etl --run-file runs.toml [--jobs 4] [--preflight-only | --dry-run]
+#         python -m romn_soils_etl --run-file runs.toml --resume    (continue the interrupted loads from the run journal checkpoint)
+#         python -m romn_soils_etl --backfill manifest.toml --target Soils_Backfill.accdb --jobs 4    (rebuild from the archived EDDs - see 'backfill.py')
+#         python -m romn_soils_etl --run-file watch.toml --watch C:\ETL\Inbox [--watch-action dryRun]    (process the EDDs as they arrive - see 'watch.py')
+#         python -m romn_soils_etl --layout 2024 --input EDD.xlsx --sheet "Raw Data" --soils-db Soils.accdb --workspace C:\ETL --set tableOneFirstLabID=2024S3339 ...
+
+# Run file parameters are the 'config' parameter names (e.g. 'inputFile', 'tableOneNumberRecords', 'fieldCrossWalk1').  Relative paths are relative to the run file.
+# ---------------------------------------------------------------------------
+import os
+import sys
+import json
+import argparse
+import collections
+import traceback
+import concurrent.futures
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun
+
+#Parameters with file/folder paths - relative paths in a run file are defined relative to the run file folder
+pathParameters = ["inputFile", "soilsDB", "workspace", "outputFolder", "qcRulesFile", "replayRejectsFile", "exportFolder", "watchInbox", "watchOutbox", "backfillTarget",
+                  "backfillReconciliationName", "metadataOverrideFile"]
+
+#Command line arguments and the run parameter set by each
+argumentParameters = {"layout": "eddLayout", "input": "inputFile", "sheet": "rawDataSheet", "soils_db": "soilsDB", "workspace": "workspace", "out_name": "outName",
+                      "transform_engine": "transformEngine", "chunk_samples": "transformChunkSamples", "replay_rejects": "replayRejectsFile", "watch": "watchInbox", "outbox": "watchOutbox",
+                      "watch_action": "watchAction", "target": "backfillTarget"}
+
+#################################################
+##
+
+def main(argv=None):
+    try:
+        outVal = parseArguments(argv)
+        if outVal[0].lower() != "success function":
+            return 2
+        runList, jobs, queueSize = outVal[1], outVal[2], outVal[3]
+
+        # Watch mode - the inbox workbooks are processed as they arrive with the run parameters
+        if runList[0].get("watchInbox") is not None:
+            from romn_soils_etl.watch import watchInbox, failedStatuses
+            outVal = watchInbox(runList[0])
+            if outVal[0].lower() != "success function":
+                return 1
+            return 1 if [resultRecord for resultRecord in outVal[1] if resultRecord["runStatus"] in failedStatuses] else 0
+
+        # Backfill - the manifest EDDs are prepared concurrently and appended to a new target by a single writer, with a reconciliation per EDD
+        if [runParameters for runParameters in runList if runParameters.get("backfillTarget") is not None]:
+            from romn_soils_etl.backfill import runBackfill
+            outVal = runBackfill(runList, jobs, queueSize)
+            if outVal[0].lower() != "success function":
+                return 1
+            return 0 if all(resultRecord["Reconciled"] for resultRecord in outVal[1]) else 1
+
+        # Concurrent runs when no run appends to the Soils DB - else pipelined runs (EDDs prepared concurrently, appended one at a time by a single writer)
+        appendRuns = [runParameters for runParameters in runList if not (runParameters.get("preflightOnly") or runParameters.get("dryRun"))]
+
+        resultRecords = []
+        if jobs > 1 and len(runList) > 1 and appendRuns:
+            print(str(len(appendRuns)) + " runs append to the Soils DB - pipelined runs - " + str(jobs) + " EDDs prepared concurrently (queue size: " +
+                  str(queueSize) + "), appended one at a time - " + timeFun())
+            resultRecords = runPipelined(runList, jobs, queueSize)
+        elif jobs > 1 and len(runList) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(runList))) as executor:
+                for resultRecord in executor.map(runEDD, runList):
+                    resultRecords.append(resultRecord)
+        else:
+            for runParameters in runList:
+                resultRecords.append(runEDD(runParameters))
+
+        print("Run Summary - " + timeFun())
+        for resultRecord in resultRecords:
+            print("    " + resultRecord["runStatus"] + " - " + str(resultRecord["inputFile"]) + " - " + str(resultRecord["runManifestName"]))
+
+        failedCount = len([resultRecord for resultRecord in resultRecords if resultRecord["runStatus"] in ("Failed", "Preflight Errors", "Load Interrupted")])
+        return 1 if failedCount > 0 else 0
+
+    except:
+        print("Error function:  cli.main - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return 1
+
+#Parse the command line and run file - returns the list of run parameter dictionaries and the number of concurrent jobs
+def parseArguments(argv=None):
+    try:
+        parser = argparse.ArgumentParser(prog="romn_soils_etl", description="ROMN Soils ETL - CSU Soils lab EDD to the Soils database 'tbl_SoilChemistry_Dataset'")
+        parser.add_argument("--run-file", help="TOML (.toml) or YAML (.yaml/.yml) run file - '[defaults]' and one '[[runs]]' table per EDD")
+        parser.add_argument("--layout", choices=["pre2022", "gte2022", "2024"], help="EDD layout ('eddLayout')")
+        parser.add_argument("--input", help="Excel EDD from CSU Soils lab ('inputFile')")
+        parser.add_argument("--sheet", help="Name of the Raw Data Sheet in the EDD ('rawDataSheet')")
+        parser.add_argument("--soils-db", help="Soils Access database ('soilsDB')")
+        parser.add_argument("--workspace", help="Workspace folder for the run outputs ('workspace')")
+        parser.add_argument("--out-name", help="Output name prefix ('outName') - single run only")
+        parser.add_argument("--transform-engine", choices=["pandas", "polars"], help="Transform engine ('transformEngine')")
+        parser.add_argument("--chunk-samples", type=int, help="Transform the EDD tables in slices of this many samples, bounds the memory ('transformChunkSamples')")
+        parser.add_argument("--replay-rejects", help="Rejects file to replay ('replayRejectsFile')")
+        parser.add_argument("--preflight-only", action="store_true", help="Extraction, event resolution and preflight checks only ('preflightOnly')")
+        parser.add_argument("--dry-run", action="store_true", help="Stage the records to be appended with summary and diff ('dryRun')")
+        parser.add_argument("--incremental", action="store_true", help="Append only the records not appended by earlier loads, changed values reported ('incrementalLoad')")
+        parser.add_argument("--export-parquet", action="store_true", help="Add the appended records to the partitioned Parquet dataset ('exportParquet')")
+        parser.add_argument("--export-master", action="store_true", help="Replace the Parquet dataset with all the Soils DB records after the load ('exportMasterTable')")
+        parser.add_argument("--resume", action="store_true", help="Resume the latest interrupted load batch in the run journal from its checkpoint ('resumeLoad')")
+        parser.add_argument("--watch", metavar="INBOX", help="Watch the inbox folder and process each new EDD workbook as it arrives ('watchInbox')")
+        parser.add_argument("--outbox", help="Watch mode - folder for the processed workbooks and run outputs ('watchOutbox', default 'Outbox' in the inbox)")
+        parser.add_argument("--watch-action", choices=["preflight", "dryRun", "append"], help="Watch mode - run for each new workbook ('watchAction', default preflight)")
+        parser.add_argument("--watch-once", action="store_true", help="Watch mode - process the workbooks in the inbox and stop ('watchOnce')")
+        parser.add_argument("--backfill", metavar="MANIFEST", help="Backfill - run file of the archived EDDs appended to a new '--target' database, with a reconciliation per EDD")
+        parser.add_argument("--target", help="Backfill - new database created as a copy of the Soils DB with an empty 'tbl_SoilChemistry_Dataset' ('backfillTarget')")
+        parser.add_argument("--profile", action="store_true", help="Profile the runs with cProfile and tracemalloc ('profileRun')")
+        parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                            help="Any run parameter - VALUE is read as JSON where valid (e.g. 35, null, [\"Lab ID\", \"Sample ID\"]) else as text")
+        parser.add_argument("--jobs", type=int, default=1, help="Concurrent worker processes (default 1) - runs which append to the Soils DB are pipelined "
+                                                                "(EDDs prepared by the workers, appended one at a time)")
+        parser.add_argument("--queue-size", type=int, help="Pipelined runs - prepared EDDs held for the writer, bounds the memory (default the '--jobs' count)")
+        args = parser.parse_args(argv)
+
+        # Run file - '[defaults]' plus '[[runs]]', or the top level parameters as a single run
+        runList = [{}]
+        if args.backfill is not None and (args.run_file is not None or args.target is None):
+            print("WARNING - '--backfill' is the run file of the EDDs to backfill and requires a '--target' - Exiting Script")
+            return "failed function", "Null", "Null", "Null"
+        runFile = args.backfill if args.backfill is not None else args.run_file
+        if runFile is not None:
+            outVal = readRunFile(runFile)
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null", "Null", "Null"
+            runList = outVal[1]
+
+        # Command line parameters - applied to every run
+        commandParameters = {}
+        for argument, parameter in argumentParameters.items():
+            if getattr(args, argument) is not None:
+                commandParameters[parameter] = getattr(args, argument)
+        if args.preflight_only:
+            commandParameters["preflightOnly"] = True
+        if args.dry_run:
+            commandParameters["dryRun"] = True
+        if args.incremental:
+            commandParameters["incrementalLoad"] = True
+        if args.export_parquet:
+            commandParameters["exportParquet"] = True
+        if args.export_master:
+            commandParameters["exportMasterTable"] = True
+        if args.resume:
+            commandParameters["resumeLoad"] = True
+        if args.watch_once:
+            commandParameters["watchOnce"] = True
+        if args.profile:
+            commandParameters["profileRun"] = True
+        for setValue in args.set:
+            name, separator, value = setValue.partition("=")
+            if not separator:
+                print("WARNING - '--set " + setValue + "' is not NAME=VALUE - Exiting Script")
+                return "failed function", "Null", "Null", "Null"
+            try:
+                commandParameters[name.strip()] = json.loads(value)
+            except ValueError:
+                commandParameters[name.strip()] = value
+
+        runList = [dict(runParameters, **commandParameters) for runParameters in runList]
+        if "outName" in commandParameters and len(runList) > 1:
+            print("WARNING - '--out-name' applies to a single run - " + str(len(runList)) + " runs in the run file - Exiting Script")
+            return "failed function", "Null", "Null", "Null"
+
+        if runList[0].get("watchInbox") is not None and len(runList) > 1:
+            print("WARNING - watch mode applies the run parameters to every workbook - " + str(len(runList)) + " runs in the run file - Exiting Script")
+            return "failed function", "Null", "Null", "Null"
+
+        # Unknown parameter names are reported before any run starts
+        for runParameters in runList:
+            unknownNames = [name for name in runParameters if name not in config.parameterNames]
+            if unknownNames:
+                print("WARNING - " + str(unknownNames) + " are not ROMN Soils ETL parameters - Exiting Script")
+                return "failed function", "Null", "Null", "Null"
+            if (runParameters.get("inputFile") is None and runParameters.get("replayRejectsFile") is None and not runParameters.get("resumeLoad") and
+                    runParameters.get("watchInbox") is None):
+                print("WARNING - a run has no 'inputFile' (or 'replayRejectsFile'/'resumeLoad'/'watchInbox') defined - Exiting Script")
+                return "failed function", "Null", "Null", "Null"
+
+        jobs = max(args.jobs, 1)
+        return "success function", runList, jobs, max(args.queue_size or jobs, 1)
+
+    except:
+        print("Error function:  parseArguments - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function", "Null", "Null", "Null"
+
+#Read a TOML or YAML run file - returns the list of run parameter dictionaries ('[defaults]' merged into each '[[runs]]' table).  Parameters per EDD layout
+#(e.g. the '[layouts.pre2022]' table with the field crosswalks) are merged between the defaults and the run.
+#YAML run files require 'pip install pyyaml'.  Relative paths are defined relative to the run file folder.
+def readRunFile(runFile):
+    try:
+        if runFile.lower().endswith((".yaml", ".yml")):
+            import yaml
+            with open(runFile) as inFile:
+                runFileRecord = yaml.safe_load(inFile) or {}
+        else:
+            import tomllib
+            with open(runFile, "rb") as inFile:
+                runFileRecord = tomllib.load(inFile)
+
+        defaultParameters = runFileRecord.get("defaults", {})
+        layoutParameters = runFileRecord.get("layouts", {})
+        if "runs" in runFileRecord:
+            runList = runFileRecord["runs"]
+        else:
+            runList = [{name: value for name, value in runFileRecord.items() if name not in ("defaults", "layouts")}]
+        runList = [dict(defaultParameters, **layoutParameters.get(str(runParameters.get("eddLayout", defaultParameters.get("eddLayout", config.eddLayout))), {}), **runParameters)
+                   for runParameters in runList]
+
+        runFileFolder = os.path.dirname(os.path.abspath(runFile))
+        for runParameters in runList:
+            for parameter in pathParameters:
+                if isinstance(runParameters.get(parameter), str) and not os.path.isabs(runParameters[parameter]):
+                    runParameters[parameter] = os.path.join(runFileFolder, runParameters[parameter])
+
+        return "success function", runList
+
+    except:
+        print("Error function:  readRunFile - " + runFile + " - " + timeFun())
+        traceback.print_exc(file=sys.stdout)
+        return "failed function", "Null"
+
+#Pipelined runs - a producer pool prepares the final dataframes of the EDDs ('pipeline.prepareMain') while a single writer (this process) loads the prepared
+#EDDs in the run order ('pipeline.loadMain').  At most 'queueSize' EDDs are submitted or prepared and waiting for the writer - the next EDD is submitted when
+#the writer takes a prepared EDD (backpressure), so the final dataframes held in memory are bounded.  Replay and resume runs are run by the writer.
+#'loadRun' is the writer function ('loadEDD' when None) - returns the run record of the run parameters and prepared run record.
+def runPipelined(runList, jobs, queueSize, loadRun=None):
+    if loadRun is None:
+        loadRun = loadEDD
+    resultRecords = []
+    pendingRuns = collections.deque()
+    runIterator = iter(runList)
+    warmSharedCaches(runList[0])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(runList))) as executor:
+
+        # Submit the next run to the producer pool - replay/resume runs have no prepare stage
+        def submitNext():
+            for runParameters in runIterator:
+                if runParameters.get("replayRejectsFile") is not None or runParameters.get("resumeLoad"):
+                    pendingRuns.append((runParameters, None))
+                    continue
+                pendingRuns.append((runParameters, executor.submit(prepareEDD, runParameters)))
+                return
+
+        for _ in range(queueSize):
+            submitNext()
+        while pendingRuns:
+            runParameters, future = pendingRuns.popleft()
+            if future is None:
+                resultRecords.append(runEDD(runParameters))
+                continue
+            preparedRecord = future.result()
+            submitNext()
+            resultRecords.append(loadRun(runParameters, preparedRecord))
+
+    return resultRecords
+
+#Pipelined runs - the shared workspace caches (history statistics) are built once before the producers start, in place of each producer building them from
+#the Soils DB.  The producers flag the outliers against the history as of the start of the pipelined runs.
+def warmSharedCaches(runParameters):
+    from romn_soils_etl import pipeline
+    from romn_soils_etl.outliers import getHistoryStats
+
+    pipeline.resetRunState()
+    config.resetParameters()
+    config.setParameters(**runParameters)
+    config.defineOutputNames()
+    if not os.path.exists(config.workspace):
+        os.makedirs(config.workspace)
+    if config.applyOutlierFlags:
+        getHistoryStats()
+    pipeline.resetRunState()
+
+#Pipelined runs (producer) - prepare the final dataframes of one EDD in a worker process - returns the 'pipeline.prepareMain' prepared run record
+def prepareEDD(runParameters):
+    from romn_soils_etl import pipeline
+
+    pipeline.resetRunState()
+    config.resetParameters()
+    config.setParameters(**runParameters)
+    preparedRecord = pipeline.prepareMain()
+    pipeline.resetRunState()
+    return preparedRecord
+
+#Pipelined runs (writer) - load a prepared EDD ('pipeline.loadMain') - runs ending in the prepare stage (e.g. preflight errors) have their run report written
+#by the producer.  Returns the run record.
+def loadEDD(runParameters, preparedRecord):
+    from romn_soils_etl import pipeline
+
+    pipeline.resetRunState()
+    config.resetParameters()
+    config.setParameters(**runParameters)
+    config.defineOutputNames()
+    pipeline.loadMain(preparedRecord)
+    pipeline.resetRunState()
+    return getRunRecord()
+
+#Run one EDD - parameters reset to the defaults, set for the run and 'pipeline.main' (or 'profileMain') run.  Returns the run record (status from the run manifest).
+#Module level function so it can be run in a worker process.
+def runEDD(runParameters):
+    from romn_soils_etl import pipeline
+
+    pipeline.resetRunState()
+    config.resetParameters()
+    config.setParameters(**runParameters)
+    if config.profileRun:
+        pipeline.profileMain()
+    else:
+        pipeline.main()
+    pipeline.resetRunState()
+    return getRunRecord()
+
+#Run record of the run parameters in 'config' - the run status is read from the run manifest
+def getRunRecord():
+    runStatus = "Failed"
+    if config.runManifestName is not None and os.path.exists(config.runManifestName):
+        with open(config.runManifestName) as inFile:
+            runStatus = json.load(inFile)["runStatus"]
+
+    return {"inputFile": config.inputFile, "runStatus": runStatus, "runManifestName": config.runManifestName, "logFileName": config.logFileName}
+
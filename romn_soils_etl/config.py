@@ -0,0 +1,248 @@
+# ---------------------------------------------------------------------------
+# config.py
+# Description:  Run parameters for the ROMN Soils ETL package - the module level parameters previously defined at the top of each ETL script.
+# Parameters are set with 'setParameters' (e.g. by the ETL scripts) prior to 'pipeline.main'.  Output names left as None are defined from the 'workspace'
+# and 'outName' parameters by 'defineOutputNames' when the run starts.  Importing this module has no side effects (no directories or files are created).
+# ---------------------------------------------------------------------------
+import os
+from datetime import date
+
+###################################################
+# EDD Layout and Input Parameters
+###################################################
+#EDD layout - 'pre2022' (single sheet with R-number Lab IDs - two stacked tables), 'gte2022' (Bulk Density, Chemistry and Texture/Carbon tables)
+#or '2024' (two tables).  The layout defines the EDD table extraction and the event tables used for the VCSS/WEI metadata.
+eddLayout = "2024"
+inputFile = None  # Excel EDD from CSU Soils lab
+rawDataSheet = None  # Name of the Raw Data Sheet in the inputFile
+
+#Soils Access Database location - a '.db', '.sqlite' or '.sqlite3' path is connected as a SQLite stand-in (e.g. benchmarks)
+soilsDB = None
+#Soils Dataset Table in Soils database  - this is the table data will be append to
+soilsDatasetTable = "tbl_SoilChemistry_Dataset"
+
+#Directory Information
+workspace = None  # Workspace Folder - created when the run starts
+#Get Current Date
+dateString = date.today().strftime("%Y%m%d")
+# Define Output Name for log file - None defines 'Soils_CSU_<eddLayout>_<inputFile name>_Preprocessed_<dateString>' (unique per EDD so concurrent runs have their own files)
+outName = None
+outputFolder = None  # Folder for the per run output files (logfile, run manifest, preflight report, dry run, rejects) - None uses the workspace
+
+###################################################
+# Logging, Run Report and Profiling
+###################################################
+#Logifile name - JSON lines (timestamp, level, stage, EDD table, record, message)
+logFileName = None
+consoleLogLevel = "INFO"  #Console verbosity - 'DEBUG' includes the per record append messages
+fileLogLevel = "INFO"  #Logfile verbosity - 'DEBUG' includes the per record append messages
+logBufferCapacity = 1000  #Log records buffered in memory before being written to the logfile (WARNING and above are written immediately)
+#Run Report - wall time, rows in/out and peak memory per stage - summary table logged at the end of the run and a JSON run manifest written to the workspace
+runManifestName = None
+trackStageMemory = True  #Peak memory per stage via 'tracemalloc' - set to False to remove the tracing overhead
+#Profiling - set to True (or run with the '--profile' argument) to profile 'main' with cProfile and take a tracemalloc snapshot per stage.
+#Written next to the logfile:  '_Profile.pstats', '_Profile_Collapsed.txt' (collapsed stacks for flame graphs) and '_Profile_Memory.txt' (top allocation sites per stage)
+profileRun = False
+profileOutputName = None
+profileTraceFrames = 15  #Frames stored per traced allocation - allocation sites are attributed to the calling line in the package
+profileTopAllocations = 15  #Allocation sites reported per stage
+
+###################################################
+# Preflight, Dry Run and Rejects
+###################################################
+#Preflight validation report name
+preflightReportName = None
+#Set to True to run extraction, event resolution and the preflight checks only (no transform or append)
+preflightOnly = False
+#Dry Run - set to True to run extraction, metadata and transform and stage the records to be appended (with summary and diff) instead of appending to the Soils DB
+dryRun = False
+dryRunStagingName = None  #Staging file name without extension - '_Summary.csv' and '_Diff.csv' are also written
+stagingFileFormat = "parquet"  #'parquet' (requires pyarrow) or 'csv'
+#Load Method - 'record' appends one record at a time (records failing to append are rejected), 'staging' bulk writes each final dataframe to the 'stagingTableName'
+#table in the Soils DB and appends with one 'INSERT INTO ... SELECT ... FROM staging WHERE NOT EXISTS' (records with an existing 'stagingKeyFields' key are not appended)
+loadMethod = "record"
+stagingTableName = "tbl_SoilChemistry_Staging"  #Staging table prefix - the process ID is added (concurrent loads each have their own table), replaced for each EDD table and dropped after the insert
+stagingKeyFields = ["EventName", "ParameterRaw"]  #Key fields of the NOT EXISTS clause - staged records with a key in 'tbl_SoilChemistry_Dataset' are not appended
+stagingChangesName = None  #Staged records with an existing key and a different Value (not appended) are written to the changes report (no extension '.csv') for review
+stagingChunkSize = 500  #Records per bulk write to the staging table
+#Rejects - records which fail to append are written with the error text to the rejects file (no extension) - replayed by setting 'replayRejectsFile'
+rejectsName = None
+replayRejectsFile = None  #Rejects file (.parquet or .csv) to replay to the Soils DB in place of processing the EDD - None processes the EDD
+#Run Journal - local SQLite database with the load batch, the next row to append per EDD table and the rejected rows, updated after each record sent to the Soils DB
+useRunJournal = True
+journalName = None  #Run journal database - shared across runs (default 'Soils_ETL_Journal.db' in the workspace)
+resumeLoad = False  #Set to True (or run with the '--resume' argument) to resume the latest interrupted load batch from the checkpoint - no extraction or metadata resolution
+journalMaxConsecutiveRejects = 25  #Consecutive rejected records treated as a lost Soils DB connection - the load is interrupted (rows rolled back to the first reject) for a '--resume'
+#Incremental Load - set to True to append only the new records of a re-issued EDD - records are compared to the fingerprints of the records appended by earlier loads
+#(stored in the run journal).  Unchanged records are not appended and records with a changed Value are written to the changes report (no extension '.csv') for review
+incrementalLoad = False
+incrementalChangesName = None
+
+###################################################
+# EDD Specific Content
+###################################################
+firstColumn = 3    #Variable defines the column number with data.  EDD in 2022 first two columns were null (i.e. column three is where the tables started
+
+noDataValue = "|NA|***NA"  #Variable defines the lab value being used to denote no data (EDD 2022 this was "*"). Records with this value will be dropped in the Stacked output.  None for no value
+
+#'pre2022' Layout - first and last 'R' Lab ID of the records to be retained (both tables start with the first Lab ID)
+firstLabID = None
+lastLabID = None
+
+#Define Table One in EDD
+tableOneFirstLabID = None  #Define the First 'Lab#' id in EDD Table One to facilitate selection of records to be retained - Bulk Density table 2022 EDD
+tableOneNumberRecords = None  #Number of total records in table One of EDD
+#Table One in EDD Fields ('2024' layout defaults)
+fieldCrossWalk1 = ['Lab ID', 'Sample ID', 'pH 1:1', 'Woodruff Buffer pH', 'EC 1:1', 'Lime_Categorical', 'OM (%)', 'NO3- (ppm)', 'NH4+ (ppm)', 'P (ppm)',
+                   'S (ppm)', 'K (ppm)', 'Ca (ppm)', 'Mg (ppm)', 'Na (ppm)', 'CEC', 'Zn (ppm)', 'Fe (ppm)', 'Mn (ppm)', 'Cu (ppm)', 'B (ppm)']
+
+#Define Table Two in EDD
+tableTwoFirstLabID = None #Define the First 'Lab#' id in EDD Table Two to facilitate selection of records to be retained - Second/Third 2022 EDD
+tableTwoNumberRecords = None  #Number of total records in table Two of EDD
+#Table Two in EDD Fields  #Defining P, S, K, Ca, Mg, Na, Zn, Fe, Mn, Cu and B with (ppm) suffix for uniqueness in the 'tlu_NameUnitCrossWalk' table
+fieldCrossWalk2 = ['Lab ID','Sample ID', 'SAR', 'H (%)','K (%)',
+                   'Ca (%)','Mg (%)','Na (%)', 'Total Base Saturation', 'TC (%)', 'TN (%)', 'C_N_Ratio']
+
+#Define Table Three in EDD ('gte2022' layout) - None when the EDD has two tables
+tableThreeFirstLabID = None
+tableThreeNumberRecords = None
+fieldCrossWalk3 = None
+
+bulkDensityTable_Suffix_Remove = "_BD"   #Variable defines the bulk density suffix to be replace by the 'bulkDensityTable_Suffix_Harmonize' variable (in 2022 '_BD' was replace by '_CM'
+bulkDensityTable_Suffix_Harmonize = "_CM"  #Suffix varible replacing the bulDensityTable_Suffix_Remove' parameter for the Bulk Density Table
+
+#Non-detects - lab values with a '<' prefix (e.g. GLORIA samples below the detection limit).  None appends the values as reported, 'exclude' drops the
+#non-detect records (append the detected results first) and 'only' appends only the non-detect records with the '<' removed, DataFlag '<' and no Min/Max
+nonDetectMode = None
+
+#Transform Engine - 'pandas' (default) or 'polars' (lazy multi-threaded Arrow query plan - requires 'pip install polars').  Both engines return the same frame to the loader
+transformEngine = "pandas"
+#Chunked Transform - EDD tables with more samples than 'transformChunkSamples' are transformed in slices of that many samples (stack, metadata join, crosswalk join
+#and clean per slice) so the transform copies are bounded by the slice size.  None transforms each EDD table in one pass - the final dataframes are the same either way
+transformChunkSamples = None
+
+#Event Metadata Indexes - samples are resolved against each index in the 'eventIndexPriority' order, the first index with a match defines the event
+#WEI is listed ahead of VCSS so a WEI 'Chem' sample match takes precedence over a VCSS SiteName/DateNum match
+eventIndexPriority = ["WEI", "VCSS", "GLORIA"]
+#GLORIA events query - must return 'SampleName_ROMN', 'EventName' and 'StartDate' fields.  Set to None when GLORIA events are not linked in the Soils database
+gloriaEventsQuery = None
+#Metadata Overrides - CSV of events per 'SampleName_ROMN' (e.g. GLORIA samples filled from the field sheets) applied after the event index lookups.  A sample with
+#'Protocol_ROMN', 'EventName' and 'StartDate' filled takes the override event (and 'SiteName' when filled).  Samples without an event are added to the file with the
+#event fields blank to be filled once - the file accumulates across runs and seasons.  Set 'applyMetadataOverrides' to False to not read or update the file.
+applyMetadataOverrides = True
+metadataOverrideFile = None  #Metadata override CSV - shared across runs (default 'Soils_Metadata_Overrides.csv' in the workspace)
+
+#Categorical/Numeric parameter type in the 'tlu_NameUnitCrossWalk' lookup table.  Categorical parameters (e.g. Lime, Texture, Peat) have Min and Max set to -999
+crossWalkTypeField = "ParameterType"  #Field in 'tlu_NameUnitCrossWalk' with the parameter type (i.e. 'Categorical' or 'Numeric')
+categoricalParameterPrefixes = ("Lime", "Texture", "Peat")  #Used only when 'crossWalkTypeField' is not in 'tlu_NameUnitCrossWalk' - evaluated once per lookup record on the 'ParameterDataset' and 'ParameterNative' fields
+
+#QC Rules - plausibility checks which populate the 'QC_Flag' and 'QC_Notes' fields prior to the append (QC_Status is left at 0 for review)
+applyQC = True
+qcRulesFile = None  #CSV with the QC rules table (RuleID, RuleType, MatchField, MatchPattern, TargetPattern, MinValue, MaxValue, Flag, Note) - None uses the default rules in 'qc.getQCRules'
+
+#Historical Outlier Flags - records compared to the 'tbl_SoilChemistry_Dataset' history via cached robust statistics per ParameterDataset and SiteName (or Protocol_ROMN)
+applyOutlierFlags = True
+historyValuesName = None  #Local cache of the numeric history values (no extension) - built from the Soils DB on the first run, appended after each load
+historyStatsName = None  #Local cache of the per group statistics (no extension)
+outlierZThreshold = 3.5  #Robust z-score threshold - 0.6745 * (Value - Median) / MAD
+outlierMinCount = 10  #Minimum history records for a group - Site groups below the minimum fall back to the Protocol group
+
+#Parquet Export - the records appended by each load are added to a Parquet dataset for analysis (requires pyarrow), partitioned by 'exportPartitionFields'
+exportParquet = False
+exportFolder = None  #Parquet dataset folder - shared across runs (default 'Soils_Chemistry_Parquet' in the workspace)
+exportMasterTable = False  #Set to True to replace the Parquet dataset with all the 'tbl_SoilChemistry_Dataset' records after the load (e.g. the first export or after a replay)
+exportPartitionFields = ["Protocol_ROMN", "YearSampled"]
+exportDictionaryFields = ["SiteName", "EventName", "ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset", "QC_Flag", "DataFlag"]  #Dictionary encoded text fields
+exportCompression = "zstd"
+
+#Values Cache - local columnar cache of 'tbl_SoilChemistry_Dataset' read by 'query.get_values' (built on the first request, the appended records added after each load)
+valuesCacheName = None  #Values cache file (no extension) - shared across runs (default 'Soils_Chemistry_Values' in the workspace) - the Soils DB name and path hash are added per Soils DB
+valuesCacheRefresh = True  #Set to False to not add the appended records to the values cache (e.g. loads to another database)
+valuesCacheMaxBatches = 20  #Load batch files kept next to the values cache file - the batches are merged into the cache file after this many loads
+
+#Watch Mode - the 'watchInbox' folder is polled for new EDD workbooks (run with '--watch').  A workbook is processed once its size and modified time are unchanged
+#for 'watchDebounceSeconds'.  Workbooks are fingerprinted (content hash in the run journal) so a workbook dropped again is not processed again for the same action.
+#The run parameters of a workbook are the watch run parameters plus the run file with the workbook name ('<workbook>.toml' or '.yaml') when in the inbox.
+#The workbook, its run file and the run outputs (logfile, run manifest, preflight report, dry run staging, rejects) are moved to a folder per workbook in the outbox.
+watchInbox = None
+watchOutbox = None  #Outbox folder - None defines 'Outbox' in the 'watchInbox' folder
+watchAction = "preflight"  #'preflight' (preflight checks only), 'dryRun' (stage the records with summary and diff) or 'append' (load to the Soils DB)
+watchPollSeconds = 5  #Seconds between inbox polls
+watchDebounceSeconds = 10  #Seconds a workbook must be unchanged before it is processed (e.g. a copy in progress)
+watchCacheRefreshMinutes = 60  #The lookup caches (crosswalk, event indexes, history statistics) and Soils DB connections are kept between workbooks and rebuilt after this interval
+watchOnce = False  #Set to True (or run with '--watch-once') to process the workbooks in the inbox and stop
+
+#Backfill - rebuild 'tbl_SoilChemistry_Dataset' from the archived EDDs in a manifest run file (run with '--backfill').  The 'backfillTarget' database is created as a
+#copy of the 'soilsDB' with an empty 'tbl_SoilChemistry_Dataset' - the EDDs are prepared in parallel worker processes (event metadata and lookups from the 'soilsDB')
+#and appended to the target by a single writer with the 'staging' load method.  A per EDD reconciliation of the record counts is written to the workspace.
+backfillTarget = None
+backfillReconciliationName = None  #Reconciliation report (default 'Soils_Backfill_Reconciliation_<dateString>.csv' in the workspace)
+
+#Parameters defined by this module (set via 'setParameters')
+parameterNames = [name for name in list(globals()) if not name.startswith("_") and name not in ("os", "date")]
+
+#################################################
+##
+
+#Set run parameters - raises an AttributeError for a name which is not a run parameter (e.g. a misspelled parameter)
+def setParameters(**parameters):
+    for name, value in parameters.items():
+        if name not in parameterNames:
+            raise AttributeError("'" + name + "' is not a ROMN Soils ETL parameter")
+        globals()[name] = value
+
+#Current run parameters as a dictionary
+def getParameters():
+    return {name: globals()[name] for name in parameterNames}
+
+#Reset the run parameters to the defaults defined in this module (e.g. between runs in one process)
+def resetParameters():
+    setParameters(**defaultParameters)
+
+#Define the output names not set - workspace (default the current directory) files named with the 'outName' prefix ('historyValuesName'/'historyStatsName'/'journalName'/'exportFolder'/'valuesCacheName'/'metadataOverrideFile' are shared across runs).
+#The per run output files are written to the 'outputFolder' when defined.
+def defineOutputNames():
+    global workspace, outName, logFileName, runManifestName, profileOutputName, preflightReportName, dryRunStagingName, rejectsName, historyValuesName, historyStatsName, journalName, \
+        incrementalChangesName, stagingChangesName, exportFolder, valuesCacheName, watchOutbox, backfillReconciliationName, metadataOverrideFile
+
+    if workspace is None:
+        workspace = os.getcwd()
+    if outName is None:
+        outName = "Soils_CSU_" + eddLayout + "_" + os.path.splitext(os.path.basename(str(inputFile)))[0].replace(" ", "_") + "_Preprocessed_" + dateString
+    outPrefix = os.path.join(workspace if outputFolder is None else outputFolder, outName)
+
+    if logFileName is None:
+        logFileName = outPrefix + "_logfile.jsonl"
+    if runManifestName is None:
+        runManifestName = outPrefix + "_RunManifest.json"
+    if profileOutputName is None:
+        profileOutputName = outPrefix + "_Profile"
+    if preflightReportName is None:
+        preflightReportName = outPrefix + "_Preflight.csv"
+    if dryRunStagingName is None:
+        dryRunStagingName = outPrefix + "_DryRun_Staged"
+    if rejectsName is None:
+        rejectsName = outPrefix + "_Rejects"
+    if incrementalChangesName is None:
+        incrementalChangesName = outPrefix + "_Incremental_Changes.csv"
+    if stagingChangesName is None:
+        stagingChangesName = outPrefix + "_Staging_Changes.csv"
+    if historyValuesName is None:
+        historyValuesName = os.path.join(workspace, "Soils_History_Values")
+    if historyStatsName is None:
+        historyStatsName = os.path.join(workspace, "Soils_History_Stats")
+    if journalName is None:
+        journalName = os.path.join(workspace, "Soils_ETL_Journal.db")
+    if exportFolder is None:
+        exportFolder = os.path.join(workspace, "Soils_Chemistry_Parquet")
+    if valuesCacheName is None:
+        valuesCacheName = os.path.join(workspace, "Soils_Chemistry_Values")
+    if metadataOverrideFile is None:
+        metadataOverrideFile = os.path.join(workspace, "Soils_Metadata_Overrides.csv")
+    if backfillReconciliationName is None:
+        backfillReconciliationName = os.path.join(workspace, "Soils_Backfill_Reconciliation_" + dateString + ".csv")
+    if watchOutbox is None and watchInbox is not None:
+        watchOutbox = os.path.join(watchInbox, "Outbox")
+
+#Default run parameters - copied (lists are not shared with the runs) when the module is imported
+defaultParameters = {name: list(value) if isinstance(value, list) else value for name, value in getParameters().items()}
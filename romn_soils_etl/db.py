@@ -0,0 +1,81 @@
+# ---------------------------------------------------------------------------
+# db.py
+# Description:  Soils DB connections - read only queries via pyodbc and the SQLAlchemy engine used by the loader.  The Access drivers are imported on first use.
+# ---------------------------------------------------------------------------
+import os
+import sqlite3
+import pandas as pd
+
+from romn_soils_etl.runlog import timeFun, logMessage, StageTimer
+
+#Connect to Access DB and perform defined query - return query in a dataframe - Using PYODBC issues with SQL Alchemy Access
+#Connection is opened Read Only - all queries via this function are Select queries
+@StageTimer("connect_to_AcessDB")
+def connect_to_AcessDB(query, inDB):
+
+    try:
+        if isSQLiteDB(inDB):
+            # SQLite stand-in (e.g. benchmarks) - dates are stored as text ('YYYY-MM-DD' or with a time when appended by 'to_sql') - the date part is read
+            cnxn = sqlite3.connect(inDB)
+            dataf = pd.read_sql(query, cnxn)
+            cnxn.close()
+            if "StartDate" in dataf.columns:
+                dataf["StartDate"] = pd.to_datetime(dataf["StartDate"].str.slice(0, 10))
+            return "success function", dataf
+
+        # PyODBC - imported on first use (the package imports without the Access drivers, e.g. with the SQLite stand-in)
+        import pyodbc
+        connStr = (r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};DBQ=" + inDB + ";ReadOnly=1;")
+        cnxn = pyodbc.connect(connStr)
+        dataf = pd.read_sql(query, cnxn)
+        cnxn.close()
+
+        #SQL Alchemy Connection
+        # connStr = (r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};DBQ=" + soilsDB + ";ExtendedAnsiSQL=1;")
+        # cnxn = sa.engine.URL.create("access+pyodbc", query={"odbc_connect": connStr})
+        # engine = sa.create_engine(cnxn)
+        # dataf = pd.read_sql(query, cnxn)
+        # del (engine)
+        # del (cnxn)
+
+        return "success function", dataf
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  connect_to_AcessDB - " +  messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#SQLite stand-in for the Soils DB - 'inDB' paths ending with '.db', '.sqlite' or '.sqlite3' (e.g. the benchmark database built by 'benchmarks/ROMN_Soils_Synthetic_EDD.py')
+def isSQLiteDB(inDB):
+    return str(inDB).lower().endswith((".db", ".sqlite", ".sqlite3"))
+
+#Soils DB key of the records kept per database in the workspace (run journal batches and fingerprints, values cache) - the absolute, case normalized 'inDB' path
+def getSoilsDBKey(inDB):
+    return os.path.normcase(os.path.abspath(str(inDB)))
+
+
+#SQL Alchemy engines for the appends to the Soils DB - one engine (connection pool) per database, reused across the EDD tables and runs until 'disposeEngines'
+engineCache = {}
+
+#SQL Alchemy engine for the appends to the Soils DB - sqlalchemy and sqlalchemy-access (Access dialect) are imported on first use
+def getSoilsDBEngine(inDB):
+    if inDB in engineCache:
+        return engineCache[inDB]
+
+    import sqlalchemy as sa
+    if isSQLiteDB(inDB):
+        engine = sa.create_engine("sqlite:///" + inDB)  # SQLite stand-in (e.g. benchmarks)
+    else:
+        import sqlalchemy_access  # Registers the 'access+pyodbc' dialect
+        connStr = (r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};DBQ=" + inDB + ";ExtendedAnsiSQL=1;")  # sqlAlchemy-access connection
+        # cnxn = pyodbc.connect(connStr)  #PYODBC Connection
+        cnxn = sa.engine.URL.create("access+pyodbc", query={"odbc_connect": connStr})
+        engine = sa.create_engine(cnxn)
+    engineCache[inDB] = engine
+    return engine
+
+#Close the pooled Soils DB connections (e.g. at the end of the run) - the Access lock file is released
+def disposeEngines():
+    for inDB in list(engineCache):
+        engineCache.pop(inDB).dispose()
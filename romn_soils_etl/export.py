@@ -0,0 +1,131 @@
+# ---------------------------------------------------------------------------
+# export.py
+# Description:  Parquet export of 'tbl_SoilChemistry_Dataset' for analysis - a Parquet dataset partitioned by 'exportPartitionFields' (hive folders e.g.
+# 'Protocol_ROMN=VCSS/YearSampled=2024') with dictionary encoded parameter fields.  Read with predicate pushdown, e.g.
+# pyarrow.dataset.dataset(exportFolder, partitioning="hive").to_table(filter=(pc.field("YearSampled") >= 2020)) or polars.scan_parquet(exportFolder + "/**/*.parquet").
+# The records appended by each load are added as new files ('batch-<outName>_<time>-<n>.parquet') - the master export ('exportMasterTable') replaces the
+# dataset with all 'tbl_SoilChemistry_Dataset' records ('master-<n>.parquet').  Requires pyarrow.
+# ---------------------------------------------------------------------------
+import os
+import shutil
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import connect_to_AcessDB
+
+#Exported fields - 'tbl_SoilChemistry_Dataset' fields as appended by the loader (fields not in the integer/float lists are text)
+exportFields = ["SiteName", "Protocol_ROMN", "EventName", "StartDate", "YearSampled", "ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset",
+                "QC_Status", "QC_Flag", "QC_Notes", "DataFlag", "Count", "StDev", "STErr", "Value", "Min", "Max"]
+integerFields = ["YearSampled", "QC_Status", "Count"]
+floatFields = ["StDev", "STErr", "Min", "Max"]
+
+#pyarrow installed - the export is skipped with a warning when not installed
+def arrowInstalled():
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        messageTime = timeFun()
+        logMessage("WARNING - 'pyarrow' is not installed - Parquet export skipped - " + messageTime, "WARNING")
+        return False
+
+#Export schema - the same field types for the load batches (final dataframes) and the master export (Soils DB records)
+def getExportSchema():
+    import pyarrow as pa
+    fieldList = []
+    for field in exportFields:
+        if field == "StartDate":
+            fieldType = pa.timestamp("ms")
+        elif field in integerFields:
+            fieldType = pa.int32()
+        elif field in floatFields:
+            fieldType = pa.float64()
+        elif field in config.exportDictionaryFields:
+            fieldType = pa.dictionary(pa.int32(), pa.string())
+        else:
+            fieldType = pa.string()
+        fieldList.append(pa.field(field, fieldType))
+    return pa.schema(fieldList)
+
+#Records to the export schema - text fields as text ('Value' keeps the lab formatting), 'Min'/'Max' numeric (text values are null) and 'StartDate' as a date
+def prepareExportTable(df_records):
+    import pyarrow as pa
+    df_export = pd.DataFrame(index=df_records.index)
+    for field in exportFields:
+        if field not in df_records.columns:
+            df_export[field] = None
+        elif field == "StartDate":
+            df_export[field] = pd.to_datetime(df_records[field])
+        elif field in integerFields:
+            df_export[field] = pd.to_numeric(df_records[field], errors="coerce").astype("Int32")
+        elif field in floatFields:
+            df_export[field] = pd.to_numeric(df_records[field], errors="coerce").astype("float64")
+        else:
+            df_export[field] = df_records[field].map(lambda x: None if x is None or (not isinstance(x, str) and pd.isna(x)) else str(x))
+    return pa.Table.from_pandas(df_export, schema=getExportSchema(), preserve_index=False)
+
+#Write records to a Parquet dataset folder - files named with the 'basenameTemplate' ('{i}' is the file number) in the partition folders
+def writeExportDataset(exportTable, outFolder, basenameTemplate, existingDataBehavior="overwrite_or_ignore"):
+    import pyarrow.dataset as ds
+    fileFormat = ds.ParquetFileFormat()
+    fileOptions = fileFormat.make_write_options(compression=config.exportCompression, use_dictionary=list(config.exportDictionaryFields))
+    ds.write_dataset(exportTable, outFolder, format=fileFormat, file_options=fileOptions, basename_template=basenameTemplate,
+                     partitioning=ds.partitioning(exportTable.schema.empty_table().select(config.exportPartitionFields).schema, flavor="hive"),
+                     existing_data_behavior=existingDataBehavior)
+
+#Export the records appended by a load (list of dataframes, rejected records removed) to the Parquet dataset as new files - the existing files are retained
+def exportLoadBatch(dfs_appended):
+    try:
+        if not arrowInstalled():
+            return "success function"
+
+        df_batch = pd.concat([dataset.reset_index() for dataset in dfs_appended], ignore_index=True)
+        if df_batch.empty:
+            return "success function"
+        batchName = config.outName + "_" + timeFun().replace(":", "").replace("-", "").replace(".", "")
+        writeExportDataset(prepareExportTable(df_batch), config.exportFolder, "batch-" + batchName + "-{i}.parquet")
+
+        messageTime = timeFun()
+        scriptMsg = ("Parquet Export - " + str(df_batch.shape[0]) + " appended records added to: " + config.exportFolder + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  exportLoadBatch - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#Export all the 'tbl_SoilChemistry_Dataset' records - the Parquet dataset is replaced (written to a new folder and moved into place)
+def exportMasterTable():
+    try:
+        if not arrowInstalled():
+            return "success function"
+
+        inQuery = "SELECT * FROM " + config.soilsDatasetTable + ";"
+        outVal = connect_to_AcessDB(inQuery, config.soilsDB)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function connect_to_AcessDB - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function"
+        df_master = outVal[1]
+
+        tempFolder = config.exportFolder + "_" + str(os.getpid()) + ".tmp"
+        if os.path.exists(tempFolder):
+            shutil.rmtree(tempFolder)
+        writeExportDataset(prepareExportTable(df_master), tempFolder, "master-{i}.parquet", "error")
+        if os.path.exists(config.exportFolder):
+            shutil.rmtree(config.exportFolder)
+        os.replace(tempFolder, config.exportFolder)
+
+        messageTime = timeFun()
+        scriptMsg = ("Parquet Export - master table: " + str(df_master.shape[0]) + " records written to: " + config.exportFolder + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  exportMasterTable - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
@@ -0,0 +1,199 @@
+# ---------------------------------------------------------------------------
+# extract.py
+# Description:  Extract the EDD tables from the raw data sheet for each EDD layout.
+# ---------------------------------------------------------------------------
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+
+#Extract the EDD Tables from the Raw Data Sheet for the 'eddLayout' - returns the lists of table dataframes, table field names and the EDD header labels above each table.
+#Table dataframes are returned with the 'Lab ID' and 'Sample ID' fields for all layouts.
+def extractEDDTables(rawDataDf):
+    try:
+        if config.eddLayout == "pre2022":
+            return extractEDDTables_Pre2022(rawDataDf)
+        elif config.eddLayout in ("gte2022", "2024"):
+            return extractEDDTables_Stacked(rawDataDf)
+        else:
+            messageTime = timeFun()
+            logMessage("WARNING - EDD Layout: '" + str(config.eddLayout) + "' is not defined ('pre2022', 'gte2022' or '2024') - " + messageTime, "WARNING")
+            return "failed function", "Null", "Null", "Null"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  extractEDDTables - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null", "Null", "Null"
+
+#Extract the stacked EDD tables ('gte2022' and '2024' layouts) - table one starts at 'tableOneFirstLabID' in the 'firstColumn', each following table is the block
+#below the prior table starting with the table 'FirstLabID'.  Tables two and three are extracted where 'fieldCrossWalk2'/'fieldCrossWalk3' are defined.
+def extractEDDTables_Stacked(rawDataDf):
+    try:
+        # List to hold all the processed dataframes
+        datasetList = []
+        crossWalkList = []
+        headerList = []
+
+        #####################
+        #Define Data Frame EDD Table One
+        #####################
+
+        # Define the first dataframe column with data
+        firstColumn_1 = config.firstColumn - 1
+        # Find Record Index values with the firstLabID  - This will be used to subset datasets one and two
+        indexDf = rawDataDf[rawDataDf.iloc[:, firstColumn_1] == config.tableOneFirstLabID]
+
+        # Define first Index Value  - This is the
+        indexFirst = indexDf.index.values[0]
+
+        # Get far right column count based on number of fields in 'fieldCrossWalk1')
+        lenColumnTableOne = len(config.fieldCrossWalk1)
+
+        # EDD Header labels for Table One - the row above the first record (the sheet header when table one starts on the first row)
+        if indexFirst > 0:
+            headerList.append(list(rawDataDf.iloc[indexFirst - 1, firstColumn_1:firstColumn_1 + lenColumnTableOne]))
+        else:
+            headerList.append(list(rawDataDf.columns[firstColumn_1:firstColumn_1 + lenColumnTableOne]))
+
+        # Remove False Header Rows
+        rawDataDfOneNoHeader = rawDataDf.iloc[indexFirst:, firstColumn_1:]
+
+        # Table One EDD Dataframe without header
+        dfOneTrimmed_wHeader = rawDataDfOneNoHeader.iloc[0:config.tableOneNumberRecords, :lenColumnTableOne]
+
+        # Add Header to DataFrame - this is the Data Frame One
+        dfOneTrimmed_wHeader.columns = config.fieldCrossWalk1
+
+        #Bulk Density Sample ID had a '_BD' suffix' changing to '_CM" suffic which was used for tables two and three.
+        dfOneTrimmed_wHeader["Sample ID"] = dfOneTrimmed_wHeader["Sample ID"].apply(lambda x: x.replace(config.bulkDensityTable_Suffix_Remove, config.bulkDensityTable_Suffix_Harmonize))
+
+        datasetList.append(dfOneTrimmed_wHeader)
+        crossWalkList.append(config.fieldCrossWalk1)
+
+        ########################################
+        #Subset Directly Below the Prior Table - Define Data Frame EDD Tables Two and Three
+        ########################################
+
+        #Create Root DF for the following tables working off rawDataDfOneNoHeader prior to trim.
+        rawDataDfBelow = rawDataDfOneNoHeader[config.tableOneNumberRecords:]
+        del(rawDataDfOneNoHeader)
+
+        tableDefinitions = [[config.tableTwoFirstLabID, config.tableTwoNumberRecords, config.fieldCrossWalk2],
+                            [config.tableThreeFirstLabID, config.tableThreeNumberRecords, config.fieldCrossWalk3]]
+        for tableFirstLabID, tableNumberRecords, fieldCrossWalk in tableDefinitions:
+            if fieldCrossWalk is None:
+                continue
+
+            # Reset Index
+            rawDataDfBelow = rawDataDfBelow.reset_index(drop=True)
+
+            # Find Record Index values with the table firstLabID
+            indexDfTable = rawDataDfBelow[rawDataDfBelow.iloc[:, 0] == tableFirstLabID]
+
+            # Define first Index Value  - This is the record 1 in the table
+            indexFirstTable = indexDfTable.index.values[0]
+
+            # Get far right column count based on number of fields in the table 'fieldCrossWalk'
+            lenColumnTable = len(fieldCrossWalk)
+
+            # EDD Header labels for the Table - the row above the first record
+            if indexFirstTable > 0:
+                headerList.append(list(rawDataDfBelow.iloc[indexFirstTable - 1, 0:lenColumnTable]))
+            else:
+                headerList.append([None] * lenColumnTable)
+
+            # Remove Header Rows
+            rawDataDfTableNoHeader = rawDataDfBelow[indexFirstTable:]
+
+            # Table EDD Dataframe without header - subset to the number of records in the table (i.e. Trimmed)
+            dfTableTrimmed_wHeader = rawDataDfTableNoHeader.iloc[0:tableNumberRecords, 0:lenColumnTable]
+            # Add Header to DataFrame
+            dfTableTrimmed_wHeader.columns = fieldCrossWalk
+
+            datasetList.append(dfTableTrimmed_wHeader)
+            crossWalkList.append(fieldCrossWalk)
+
+            # Root DF for the next table - records below the trimmed table
+            rawDataDfBelow = rawDataDfTableNoHeader[tableNumberRecords:]
+
+        return "success function", datasetList, crossWalkList, headerList
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  extractEDDTables_Stacked - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null", "Null", "Null"
+
+#Extract the 'pre2022' EDD tables - a single sheet with both tables starting at the 'firstLabID' record in the first column.  Records are retained for the 'R' Lab ID
+#range ('firstLabID' to 'lastLabID'), table two starts at the second 'firstLabID' record.  The 'SampleName_Lab'/'SampleName_ROMN' fields are renamed 'Lab ID'/'Sample ID'.
+def extractEDDTables_Pre2022(rawDataDf):
+    try:
+        # List to hold all the processed dataframes
+        datasetList = []
+        crossWalkList = []
+        headerList = []
+        sampleFields = {"SampleName_Lab": "Lab ID", "SampleName_ROMN": "Sample ID"}
+        fieldCrossWalk1 = [sampleFields.get(field, field) for field in config.fieldCrossWalk1]
+        fieldCrossWalk2 = [sampleFields.get(field, field) for field in config.fieldCrossWalk2]
+
+        # Find Record Index values with the firstLabID  - This will be used to subset datasets one and two
+        indexDf = rawDataDf[rawDataDf.iloc[:, 0] == config.firstLabID]
+
+        # Define first Index Value
+        indexFirst = indexDf.index.values[0]
+
+        # EDD Header labels for Table One - the row above the first record (the sheet header when table one starts on the first row)
+        lenColumnTableOne = len(fieldCrossWalk1)
+        if indexFirst > 0:
+            headerList.append(list(rawDataDf.iloc[indexFirst - 1, 0:lenColumnTableOne]))
+        else:
+            headerList.append(list(rawDataDf.columns[0:lenColumnTableOne]))
+
+        # Create Data Frame with Header Columns Removed - Rename Header Columns
+        rawDataDfOneNoHeader = rawDataDf.iloc[indexFirst:, 0:lenColumnTableOne]
+        rawDataDfOneNoHeader.columns = fieldCrossWalk1
+
+        # Retain Records with a defined 'Lab ID' in the 'R' Lab ID range
+        firstRec = int(config.firstLabID.replace("R", ""))
+        lastRec = int(config.lastLabID.replace("R", ""))
+        recordList = ['R' + str(rec) for rec in range(firstRec, lastRec + 1)]
+
+        # Subset to only Records with Data
+        rawDataRecordOnly = rawDataDfOneNoHeader[rawDataDfOneNoHeader['Lab ID'].isin(recordList)]
+
+        # Reset Index
+        rawDataRecordOnly = rawDataRecordOnly.reset_index(drop=True)
+
+        # Find Second firstRec this is the location for the Second Dataset
+        indexDf = rawDataRecordOnly.loc[rawDataRecordOnly['Lab ID'] == config.firstLabID]
+
+        # Define Second first Record Value - Index Value
+        indexSecondFirst = indexDf.index.values[1]
+
+        #####################
+        # Define First Dataset
+        #####################
+        df_FirstDataset = rawDataRecordOnly[:indexSecondFirst]
+        datasetList.append(df_FirstDataset)
+        crossWalkList.append(fieldCrossWalk1)
+
+        ######################
+        # Define Second Dataset - remove columns without Data
+        ######################
+        lenColumnTableTwo = len(fieldCrossWalk2)
+        df_SecondDataset = rawDataRecordOnly.iloc[indexSecondFirst:, 0:lenColumnTableTwo]
+
+        #Define Header for Second Dataset - EDD header labels are not defined for table two
+        df_SecondDataset.columns = fieldCrossWalk2
+        df_SecondDataset = df_SecondDataset.reset_index(drop=True)
+        headerList.append([None] * lenColumnTableTwo)
+
+        datasetList.append(df_SecondDataset)
+        crossWalkList.append(fieldCrossWalk2)
+
+        return "success function", datasetList, crossWalkList, headerList
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  extractEDDTables_Pre2022 - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null", "Null", "Null"
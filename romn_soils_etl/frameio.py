@@ -0,0 +1,84 @@
+# ---------------------------------------------------------------------------
+# frameio.py
+# Description:  Dataframe files - Parquet (requires pyarrow) or CSV files used for the staging, rejects and history caches, and the lock file for a shared workspace
+# file updated by concurrent runs.
+# ---------------------------------------------------------------------------
+import os
+import time
+import contextlib
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+
+#Read a dataframe written by 'writeFrameFile' - 'inPathNoExt' is the path without extension (Parquet is read ahead of CSV).  Returns None when neither file exists.
+def readFrameFile(inPathNoExt):
+    try:
+        if os.path.exists(inPathNoExt + ".parquet"):
+            return "success function", pd.read_parquet(inPathNoExt + ".parquet")
+        if os.path.exists(inPathNoExt + ".csv"):
+            return "success function", pd.read_csv(inPathNoExt + ".csv")
+        return "success function", None
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  readFrameFile - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Write a dataframe to a Parquet (requires pyarrow) or CSV file - 'outPathNoExt' is the path without extension.  Returns the path of the written file.
+#Mixed type fields (e.g. Min/Max with -999 and EDD values) are written as text for Parquet.  The file is written to a temporary file and moved into place,
+#so concurrent runs sharing a workspace (e.g. the history caches) never read a partly written file.
+def writeFrameFile(inDf, outPathNoExt):
+    try:
+        if config.stagingFileFormat.lower() == "parquet":
+            try:
+                import pyarrow
+                outDf = inDf.copy()
+                for field in outDf.columns[outDf.dtypes == object]:
+                    outDf[field] = outDf[field].map(lambda x: x if x is None or isinstance(x, str) else str(x))
+                outPath = outPathNoExt + ".parquet"
+                outDf.to_parquet(outPath + "." + str(os.getpid()) + ".tmp", index=False)
+                os.replace(outPath + "." + str(os.getpid()) + ".tmp", outPath)
+                return "success function", outPath
+            except ImportError:
+                messageTime = timeFun()
+                logMessage("WARNING - 'pyarrow' is not installed - file written as CSV - " + messageTime, "WARNING")
+
+        outPath = outPathNoExt + ".csv"
+        inDf.to_csv(outPath + "." + str(os.getpid()) + ".tmp", index=False)
+        os.replace(outPath + "." + str(os.getpid()) + ".tmp", outPath)
+        return "success function", outPath
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  writeFrameFile - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Exclusive lock on a shared workspace file (e.g. the metadata override file) for a read and write by concurrent runs (e.g. '--jobs' worker processes) - the
+#'<inPath>.lock' file is created exclusively and removed on exit.  A lock file older than 'staleSeconds' (a run stopped while holding the lock) is removed.
+@contextlib.contextmanager
+def fileLock(inPath, timeoutSeconds=60, staleSeconds=300):
+    lockFile = inPath + ".lock"
+    startTime = time.monotonic()
+    while True:
+        try:
+            lockHandle = os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lockFile) > staleSeconds:
+                    os.remove(lockFile)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() - startTime > timeoutSeconds:
+                raise TimeoutError("Lock file: " + lockFile + " held for more than " + str(timeoutSeconds) + " seconds")
+            time.sleep(0.1)
+    try:
+        os.write(lockHandle, str(os.getpid()).encode())
+        yield lockFile
+    finally:
+        os.close(lockHandle)
+        os.remove(lockFile)
@@ -0,0 +1,117 @@
+# ---------------------------------------------------------------------------
+# incremental.py
+# Description:  Incremental loads - only the new records of a re-issued (revised) EDD are appended.  Each appended record is fingerprinted in the run journal
+# per Soils DB ('tbl_Fingerprints' - SoilsDB, EventName, ParameterRaw and a hash of the Value).  With 'incrementalLoad' the final records are compared to the
+# fingerprints stored for the 'soilsDB':  new records are appended, unchanged records are dropped and records with a changed Value are written to the changes report for review (not appended).
+# Events without stored fingerprints (e.g. loaded before the run journal) are compared to the 'tbl_SoilChemistry_Dataset' records.
+# ---------------------------------------------------------------------------
+import hashlib
+import pandas as pd
+
+from romn_soils_etl import config, journal
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import getSoilsDBKey
+from romn_soils_etl.load import getExistingRecords, appendedRecords
+
+#Fingerprint per record - hash of the EventName, ParameterRaw and Value text
+def fingerprintRecords(df_records):
+    keyText = df_records["EventName"].astype(str) + "|" + df_records["ParameterRaw"].astype(str) + "|" + df_records["Value"].astype(str)
+    return keyText.map(lambda text: hashlib.sha1(text.encode("utf-8")).hexdigest()[:20])
+
+#Filter the final dataframes to the new records - returns the filtered final dataframes.  Records with a changed Value are written to 'incrementalChangesName'.
+def filterIncrementalRecords(dfs_final):
+    try:
+        cnxn = journal.getJournal()
+        soilsDBKey = getSoilsDBKey(config.soilsDB)
+        eventNames = sorted(set().union(*[dataset["EventName"].dropna().unique() for dataset in dfs_final]))
+        fingerprintList = []
+        for startIndex in range(0, len(eventNames), 500):
+            eventBlock = eventNames[startIndex:startIndex + 500]
+            inQuery = ("SELECT EventName, ParameterRaw, Fingerprint, Value FROM tbl_Fingerprints WHERE SoilsDB = ? AND EventName IN (" + ", ".join("?" * len(eventBlock)) + ")")
+            fingerprintList.append(pd.read_sql(inQuery, cnxn, params=[soilsDBKey] + [str(eventName) for eventName in eventBlock]))
+        df_fingerprints = pd.concat(fingerprintList, ignore_index=True) if fingerprintList else pd.DataFrame(columns=["EventName", "ParameterRaw", "Fingerprint", "Value"])
+
+        # Events without fingerprints - the existing Soils DB records of the events are fingerprinted and stored
+        fingerprintEvents = set(df_fingerprints["EventName"])
+        seedEvents = [eventName for eventName in eventNames if str(eventName) not in fingerprintEvents]
+        if seedEvents:
+            outVal = getExistingRecords(seedEvents)
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null"
+            df_seed = outVal[1][["EventName", "ParameterRaw", "Value"]].copy()
+            df_seed["Fingerprint"] = fingerprintRecords(df_seed)
+            cnxn.executemany("INSERT OR IGNORE INTO tbl_Fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                             [(soilsDBKey, eventName, parameterRaw, fingerprint, value, "Soils DB") for eventName, parameterRaw, fingerprint, value in
+                              df_seed[["EventName", "ParameterRaw", "Fingerprint", "Value"]].itertuples(index=False)])
+            cnxn.commit()
+            df_fingerprints = pd.concat([df_fingerprints, df_seed[df_fingerprints.columns]], ignore_index=True)
+            messageTime = timeFun()
+            scriptMsg = ("Incremental Load - fingerprinted: " + str(df_seed.shape[0]) + " existing Soils DB records for: " + str(len(seedEvents)) + " events - " + messageTime)
+            logMessage(scriptMsg)
+
+        knownFingerprints = set(df_fingerprints["Fingerprint"])
+        df_loadedValues = df_fingerprints.groupby(["EventName", "ParameterRaw"])["Value"].agg(lambda x: "|".join(sorted(set(x)))).rename("ValueLoaded").reset_index()
+        knownKeys = pd.MultiIndex.from_frame(df_loadedValues[["EventName", "ParameterRaw"]])
+
+        dfs_new = []
+        changesList = []
+        newCount = unchangedCount = 0
+        for loopCount, dataset in enumerate(dfs_final):
+            fingerprints = fingerprintRecords(dataset)
+            unchanged = fingerprints.isin(knownFingerprints).to_numpy()
+            keyLoaded = pd.MultiIndex.from_arrays([dataset["EventName"].astype(str), dataset["ParameterRaw"].astype(str)]).isin(knownKeys)
+            changed = keyLoaded & ~unchanged
+            newRecords = ~keyLoaded & ~unchanged
+
+            if changed.any():
+                df_changed = dataset[changed].reset_index()[["SiteName", "Protocol_ROMN", "EventName", "ParameterRaw", "Value"]]
+                df_changed.insert(0, "EDDTable", loopCount)
+                changesList.append(pd.merge(df_changed.astype({"EventName": str, "ParameterRaw": str}), df_loadedValues, how="left", on=["EventName", "ParameterRaw"]))
+
+            dfs_new.append(dataset[newRecords])
+            newCount += int(newRecords.sum())
+            unchangedCount += int(unchanged.sum())
+
+        changedCount = 0
+        if changesList:
+            df_changes = pd.concat(changesList, ignore_index=True)
+            changedCount = df_changes.shape[0]
+            df_changes.to_csv(config.incrementalChangesName, index=False)
+
+        messageTime = timeFun()
+        scriptMsg = ("Incremental Load - New: " + str(newCount) + " - Unchanged (not appended): " + str(unchangedCount) + " - Changed Value (not appended): " + str(changedCount) +
+                     ("" if changedCount == 0 else " - review: " + config.incrementalChangesName) + " - " + messageTime)
+        logMessage(scriptMsg, "WARNING" if changedCount > 0 else "INFO")
+
+        return "success function", dfs_new
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  filterIncrementalRecords - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Store the fingerprints of the records appended to the 'soilsDB' (rejected records and the skipped records of a staging load excluded) - 'eddTables' are the EDD table numbers
+#of the dataframes (default 0, 1, ...)
+def recordFingerprints(dfs_appendedFrom, df_rejects, batchID, eddTables=None, df_skipped=None):
+    try:
+        cnxn = journal.getJournal()
+        soilsDBKey = getSoilsDBKey(config.soilsDB)
+        recordCount = 0
+        for df_appended in appendedRecords(dfs_appendedFrom, df_rejects, df_skipped, eddTables):
+            fingerprints = fingerprintRecords(df_appended)
+            cnxn.executemany("INSERT OR IGNORE INTO tbl_Fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                             zip([soilsDBKey] * df_appended.shape[0], df_appended["EventName"].astype(str), df_appended["ParameterRaw"].astype(str), fingerprints,
+                                 df_appended["Value"].astype(str), [batchID] * df_appended.shape[0]))
+            recordCount += df_appended.shape[0]
+        cnxn.commit()
+
+        messageTime = timeFun()
+        logMessage("Fingerprinted: " + str(recordCount) + " appended records in run journal - " + messageTime, "DEBUG")
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  recordFingerprints - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
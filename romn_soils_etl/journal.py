@@ -0,0 +1,162 @@
+# ---------------------------------------------------------------------------
+# journal.py
+# Description:  Run journal - a local SQLite database recording each load batch (the final dataframes staged to the workspace), the next row to append per
+# EDD table and the rejected rows.  The journal is updated after each record sent to the Soils DB, so an interrupted load (Access file locked, network drop,
+# process stopped) is resumed from the checkpoint ('resumeLoad' or '--resume') without re-extracting or re-resolving the event metadata.
+# The Soils DB append and the journal update are separate commits - on a resume the record at the checkpoint is checked in the dataset table (key and Value) and not sent
+# again when it was appended before the process stopped.
+# Each batch records the Soils DB it is loaded to ('db.getSoilsDBKey') - a batch is only resumed against the same Soils DB.
+# The journal also holds the fingerprints of the appended records per Soils DB used by the incremental loads ('incremental.py') and of the workbooks processed in watch mode ('watch.py').
+# ---------------------------------------------------------------------------
+import os
+import sqlite3
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.frameio import readFrameFile, writeFrameFile
+from romn_soils_etl.db import getSoilsDBKey
+
+#Open journal connection for the run - created on first use
+journalCache = {}
+
+#Get the run journal connection - the journal tables are created when not present
+def getJournal():
+    if config.journalName in journalCache:
+        return journalCache[config.journalName]
+
+    cnxn = sqlite3.connect(config.journalName)
+    cnxn.execute("PRAGMA journal_mode=WAL")
+    cnxn.execute("PRAGMA synchronous=NORMAL")
+    cnxn.execute("CREATE TABLE IF NOT EXISTS tbl_Batches (BatchID TEXT PRIMARY KEY, InputFile TEXT, EDDLayout TEXT, StagingName TEXT, TableCount INTEGER, "
+                 "Status TEXT, StartTime TEXT, UpdateTime TEXT, SoilsDB TEXT)")
+    cnxn.execute("CREATE TABLE IF NOT EXISTS tbl_Checkpoints (BatchID TEXT, EDDTable INTEGER, TotalRows INTEGER, NextRow INTEGER, PRIMARY KEY (BatchID, EDDTable))")
+    cnxn.execute("CREATE TABLE IF NOT EXISTS tbl_Rejects (BatchID TEXT, EDDTable INTEGER, RejectRow INTEGER, RejectError TEXT)")
+    # Journal created before the fingerprints were kept per Soils DB - the fingerprints are renamed (not read) and the events are fingerprinted again from the
+    # Soils DB records by the next incremental load
+    fingerprintFields = [row[1] for row in cnxn.execute("PRAGMA table_info(tbl_Fingerprints)")]
+    if fingerprintFields and "SoilsDB" not in fingerprintFields:
+        cnxn.execute("ALTER TABLE tbl_Fingerprints RENAME TO tbl_Fingerprints_NoSoilsDB")
+    cnxn.execute("CREATE TABLE IF NOT EXISTS tbl_Fingerprints (SoilsDB TEXT, EventName TEXT, ParameterRaw TEXT, Fingerprint TEXT, Value TEXT, BatchID TEXT, "
+                 "PRIMARY KEY (SoilsDB, EventName, ParameterRaw, Fingerprint))")
+    cnxn.execute("CREATE TABLE IF NOT EXISTS tbl_WatchFiles (Fingerprint TEXT, WatchAction TEXT, InputFile TEXT, RunStatus TEXT, OutboxFolder TEXT, ProcessTime TEXT)")
+    # Journal created before the Soils DB was recorded - the batches without a Soils DB are not resumed
+    if "SoilsDB" not in [row[1] for row in cnxn.execute("PRAGMA table_info(tbl_Batches)")]:
+        cnxn.execute("ALTER TABLE tbl_Batches ADD COLUMN SoilsDB TEXT")
+    cnxn.commit()
+    journalCache[config.journalName] = cnxn
+    return cnxn
+
+#Close the journal connection (e.g. at the end of the run)
+def closeJournal():
+    for journalName in list(journalCache):
+        journalCache.pop(journalName).close()
+
+#Start a load batch - the final dataframes are staged to the workspace ('<outName>_Batch_<EDD table>') and the batch and checkpoints recorded.  Returns the BatchID.
+def startBatch(dfs_final):
+    try:
+        messageTime = timeFun()
+        batchID = config.outName + "_" + messageTime.replace(":", "").replace("-", "").replace(".", "")
+        stagingName = os.path.join(config.workspace, batchID + "_Batch")
+        for loopCount, dataset in enumerate(dfs_final):
+            outVal = writeFrameFile(dataset.reset_index(), stagingName + "_" + str(loopCount))
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null"
+
+        cnxn = getJournal()
+        cnxn.execute("INSERT INTO tbl_Batches (BatchID, InputFile, EDDLayout, StagingName, TableCount, Status, StartTime, UpdateTime, SoilsDB) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (batchID, config.inputFile, config.eddLayout, stagingName, len(dfs_final), "Loading", messageTime, messageTime, getSoilsDBKey(config.soilsDB)))
+        cnxn.executemany("INSERT INTO tbl_Checkpoints VALUES (?, ?, ?, ?)", [(batchID, loopCount, dataset.shape[0], 0) for loopCount, dataset in enumerate(dfs_final)])
+        cnxn.commit()
+
+        scriptMsg = ("Load Batch: " + batchID + " - journal: " + config.journalName + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function", batchID
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  startBatch - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Record a row sent to the Soils DB - the next row to append for the EDD table and the reject error (None when appended)
+def recordRow(batchID, eddTable, row, rejectError=None):
+    cnxn = getJournal()
+    if rejectError is not None:
+        cnxn.execute("INSERT INTO tbl_Rejects VALUES (?, ?, ?, ?)", (batchID, eddTable, row, rejectError))
+    cnxn.execute("UPDATE tbl_Checkpoints SET NextRow = ? WHERE BatchID = ? AND EDDTable = ?", (row + 1, batchID, eddTable))
+    cnxn.commit()
+
+#Roll the checkpoint of an EDD table back to 'nextRow' - rejects from 'nextRow' on are removed (e.g. rows rejected while the Soils DB was unavailable)
+def rollbackRows(batchID, eddTable, nextRow):
+    cnxn = getJournal()
+    cnxn.execute("DELETE FROM tbl_Rejects WHERE BatchID = ? AND EDDTable = ? AND RejectRow >= ?", (batchID, eddTable, nextRow))
+    cnxn.execute("UPDATE tbl_Checkpoints SET NextRow = ? WHERE BatchID = ? AND EDDTable = ?", (nextRow, batchID, eddTable))
+    cnxn.commit()
+
+#Set the batch status - 'Loading', 'Interrupted' or 'Complete'
+def setBatchStatus(batchID, status):
+    cnxn = getJournal()
+    cnxn.execute("UPDATE tbl_Batches SET Status = ?, UpdateTime = ? WHERE BatchID = ?", (status, timeFun(), batchID))
+    cnxn.commit()
+
+#Get the batch to resume - the latest 'Loading' or 'Interrupted' batch loaded to the 'soilsDB' (for the 'inputFile' when defined).  Returns the BatchID, the staged final dataframes,
+#the next row per EDD table and the prior rejects per EDD table ([rows], [errors]).  BatchID is None when there is no batch to resume.
+def getResumeBatch():
+    try:
+        cnxn = getJournal()
+        df_batches = pd.read_sql("SELECT * FROM tbl_Batches WHERE Status IN ('Loading', 'Interrupted') ORDER BY StartTime DESC", cnxn)
+        if config.inputFile is not None:
+            df_batches = df_batches[df_batches["InputFile"] == config.inputFile]
+        isSoilsDB = (df_batches["SoilsDB"] == getSoilsDBKey(config.soilsDB)).to_numpy()
+        if not isSoilsDB.any():
+            if not df_batches.empty:
+                messageTime = timeFun()
+                scriptMsg = ("WARNING - " + str(df_batches.shape[0]) + " interrupted load batches loaded to another Soils DB not resumed - " +
+                             str(sorted(df_batches["SoilsDB"].fillna("Not Recorded").unique())) + " - " + messageTime)
+                logMessage(scriptMsg, "WARNING")
+            return "success function", None, "Null", "Null", "Null"
+        batchRecord = df_batches[isSoilsDB].iloc[0]
+        batchID = batchRecord["BatchID"]
+
+        df_checkpoints = pd.read_sql("SELECT * FROM tbl_Checkpoints WHERE BatchID = ? ORDER BY EDDTable", cnxn, params=(batchID,))
+        df_rejects = pd.read_sql("SELECT * FROM tbl_Rejects WHERE BatchID = ? ORDER BY EDDTable, RejectRow", cnxn, params=(batchID,))
+
+        from romn_soils_etl.load import restoreFrameTypes
+        dfs_final = []
+        for loopCount in range(int(batchRecord["TableCount"])):
+            outVal = readFrameFile(batchRecord["StagingName"] + "_" + str(loopCount))
+            if outVal[0].lower() != "success function" or outVal[1] is None:
+                messageTime = timeFun()
+                logMessage("WARNING - Staged batch file missing for EDD Table: " + str(loopCount) + " - " + batchRecord["StagingName"] + " - " + messageTime, "WARNING")
+                return "failed function", "Null", "Null", "Null", "Null"
+            dfs_final.append(restoreFrameTypes(outVal[1]).set_index("SiteName"))
+
+        startRows = df_checkpoints["NextRow"].astype(int).tolist()
+        priorRejects = [(df_rejects.loc[df_rejects["EDDTable"] == loopCount, "RejectRow"].astype(int).tolist(),
+                         df_rejects.loc[df_rejects["EDDTable"] == loopCount, "RejectError"].tolist()) for loopCount in range(len(dfs_final))]
+
+        messageTime = timeFun()
+        scriptMsg = ("Resuming Load Batch: " + batchID + " (" + batchRecord["Status"] + ") - next rows per EDD table: " + str(startRows) + " of " +
+                     str(df_checkpoints["TotalRows"].astype(int).tolist()) + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function", batchID, dfs_final, startRows, priorRejects
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  getResumeBatch - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null", "Null", "Null", "Null"
+
+#Watch mode - the latest processed run of a workbook fingerprint for the watch action with one of the 'runStatuses'.  Returns None when not processed.
+def getWatchFile(fingerprint, watchAction, runStatuses):
+    cnxn = getJournal()
+    inQuery = ("SELECT InputFile, RunStatus, OutboxFolder, ProcessTime FROM tbl_WatchFiles WHERE Fingerprint = ? AND WatchAction = ? AND RunStatus IN (" +
+               ", ".join("?" * len(runStatuses)) + ") ORDER BY ProcessTime DESC")
+    return cnxn.execute(inQuery, [fingerprint, watchAction] + list(runStatuses)).fetchone()
+
+#Watch mode - record a processed workbook (fingerprint, watch action, run status and outbox folder)
+def recordWatchFile(fingerprint, watchAction, inputFile, runStatus, outboxFolder):
+    cnxn = getJournal()
+    cnxn.execute("INSERT INTO tbl_WatchFiles VALUES (?, ?, ?, ?, ?, ?)", (fingerprint, watchAction, inputFile, runStatus, outboxFolder, timeFun()))
+    cnxn.commit()
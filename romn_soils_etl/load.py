@@ -0,0 +1,487 @@
+# ---------------------------------------------------------------------------
+# load.py
+# Description:  Load the final dataframes to the Soils DB - per record append with a rejects file, rejects replay and the dry run staging.
+# ---------------------------------------------------------------------------
+import os
+import sys
+import logging
+import traceback
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage, runLogger, StageTimer
+from romn_soils_etl.db import connect_to_AcessDB, getSoilsDBEngine
+from romn_soils_etl.frameio import writeFrameFile
+
+#Rouitne to append the final dataframe (df_ToAppendFinal2) to the Soils DB.  With a run journal 'batchID' each record is checkpointed in the journal - the append
+#starts at 'startRow' (rows before 'startRow' were sent in a prior run, 'priorRejects' are their ([rows], [errors])) and stops with 'load interrupted'
+#after 'journalMaxConsecutiveRejects' consecutive rejects (the checkpoint is rolled back to the first of the consecutive rejects).  On a resume the record at the
+#checkpoint is not sent again when it is already in the dataset table (appended before the interruption, not checkpointed).
+def apppendDataframesToSoilDB(df_ToAppendFinal2, datasetLoopCount, startRow=0, batchID=None, priorRejects=None):
+    try:
+        from romn_soils_etl import journal
+
+        ###################################
+        # Append df_ToAppendFinal to Dataset - appending one record at a time - unable to get one append for full dataset to work
+        ###################################
+        engine = getSoilsDBEngine(config.soilsDB)
+
+        # Create iteration range for records to be appended
+        shapeDf = df_ToAppendFinal2.shape
+        lenRows = shapeDf[0]
+
+        # Resumed load ('priorRejects' from the journal) - the record at the checkpoint was in flight when the load stopped
+        if batchID is not None and priorRejects is not None and startRow < lenRows:
+            outVal = recordInDataset(df_ToAppendFinal2.iloc[startRow], engine)
+            if outVal[0].lower() != "success function":
+                return "function failed", "Null", "Null"
+            if outVal[1]:
+                journal.recordRow(batchID, datasetLoopCount, startRow)
+                messageTime = timeFun()
+                scriptMsg = ("Resume - checkpoint record at row: " + str(startRow) + " of EDD Dataset: " + str(datasetLoopCount) + " is in " + config.soilsDatasetTable +
+                             " (appended before the interruption) - not sent again - " + messageTime)
+                logMessage(scriptMsg, eddTable=datasetLoopCount)
+                startRow += 1
+
+        rowRange = range(startRow, lenRows)
+
+        # Per record messages are DEBUG - message built only when DEBUG records are logged.  Failed records are collected for the rejects file.
+        logRecords = runLogger().isEnabledFor(logging.DEBUG)
+        rejectRows = [] if priorRejects is None else list(priorRejects[0])
+        rejectErrors = [] if priorRejects is None else list(priorRejects[1])
+        priorRejectCount = len(rejectRows)
+        loadStatus = "success function"
+        consecutiveRejects = 0
+        nextRow = lenRows
+
+        try:
+            loopCount = startRow
+            for row in rowRange:
+                df3 = df_ToAppendFinal2[row:row + 1]
+                recordIdSeries = df3.iloc[0]
+                recordId = recordIdSeries.get('EventName')
+                parameterRaw = recordIdSeries.get('ParameterRaw')
+                try:
+                    df3.to_sql(config.soilsDatasetTable, con=engine, if_exists='append')
+                    consecutiveRejects = 0
+                    if batchID is not None:
+                        journal.recordRow(batchID, datasetLoopCount, row)
+                    if logRecords:
+                        messageTime = timeFun()
+                        scriptMsg = "Successfully Appended RecordID - " + recordId + " - Parameter - " + parameterRaw + " - for EDD Dataset: " + str(datasetLoopCount) + " - " + messageTime
+                        logMessage(scriptMsg, "DEBUG", eddTable=datasetLoopCount, record=recordId + " - " + parameterRaw)
+
+                except:
+                    rejectRows.append(row)
+                    rejectErrors.append(traceback.format_exception_only(*sys.exc_info()[:2])[-1].strip())
+                    consecutiveRejects += 1
+                    if batchID is not None:
+                        journal.recordRow(batchID, datasetLoopCount, row, rejectErrors[-1])
+                    if logRecords:
+                        messageTime = timeFun()
+                        scriptMsg = "WARNING Failed to Appended RecordID - " + recordId + " - Parameter - " + parameterRaw + " - for EDD Dataset: " + str(datasetLoopCount) + " - " + messageTime
+                        logMessage(scriptMsg, "DEBUG", eddTable=datasetLoopCount, record=recordId + " - " + parameterRaw)
+
+                    # Consecutive rejects - Soils DB locked or connection lost - the rejects are rolled back to be resumed from the journal checkpoint
+                    if batchID is not None and consecutiveRejects >= config.journalMaxConsecutiveRejects:
+                        firstReject = row + 1 - consecutiveRejects
+                        lastError = rejectErrors[-1]
+                        journal.rollbackRows(batchID, datasetLoopCount, firstReject)
+                        del rejectRows[-consecutiveRejects:]
+                        del rejectErrors[-consecutiveRejects:]
+                        loadStatus = "load interrupted"
+                        nextRow = firstReject
+                        messageTime = timeFun()
+                        scriptMsg = ("WARNING - " + str(consecutiveRejects) + " consecutive records rejected (last error: " + lastError + ") - load interrupted at row: " +
+                                     str(firstReject) + " of EDD Dataset: " + str(datasetLoopCount) + " - " + messageTime)
+                        logMessage(scriptMsg, "WARNING", eddTable=datasetLoopCount)
+                        break
+
+                loopCount += 1
+        except:
+            messageTime = timeFun()
+            scriptMsg = "WARNING Failed to Append RecordID - " + recordId + " - " + parameterRaw + " - for Dataset: " + str(
+                loopCount) + " - " + messageTime
+            logMessage(scriptMsg, "WARNING", eddTable=datasetLoopCount, record=recordId + " - " + parameterRaw)
+            # Records not attempted are rejected with the loop error - with a run journal the load is interrupted at the checkpoint (resumed with '--resume')
+            loopError = traceback.format_exception_only(*sys.exc_info()[:2])[-1].strip()
+            if batchID is not None:
+                loadStatus = "load interrupted"
+                nextRow = loopCount
+            else:
+                for row in range(loopCount, lenRows):
+                    if row not in rejectRows:
+                        rejectRows.append(row)
+                        rejectErrors.append(loopError)
+
+        # Rejected records - the rows as passed to 'to_sql' with the EDD table, row position and error text
+        df_rejects = df_ToAppendFinal2.iloc[rejectRows].reset_index()
+        df_rejects["EDDTable"] = datasetLoopCount
+        df_rejects["RejectRow"] = rejectRows
+        df_rejects["RejectError"] = rejectErrors
+
+        messageTime = timeFun()
+        scriptMsg = ("Append Summary - EDD Dataset: " + str(datasetLoopCount) + " - Appended: " + str(nextRow - startRow - len(rejectRows) + priorRejectCount) + " - Rejected: " + str(len(rejectRows) - priorRejectCount) +
+                     ("" if nextRow == lenRows else " - Not Sent: " + str(lenRows - nextRow)) + " - " + messageTime)
+        logMessage(scriptMsg, "WARNING" if rejectRows or nextRow < lenRows else "INFO", eddTable=datasetLoopCount)
+
+        return loadStatus, df_rejects, []
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error 'apppendDataframesToSoilDB' - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "function failed", "Null", "Null"
+
+#Record in the dataset table - a record with the 'stagingKeyFields' key (EventName, ParameterRaw) and Value of the final dataframe record.  Returns True when found.
+def recordInDataset(recordSeries, engine):
+    try:
+        import sqlalchemy as sa
+
+        matchFields = list(config.stagingKeyFields) + ["Value"]
+        whereText = " AND ".join("[" + field + "] = :match" + str(fieldIndex) for fieldIndex, field in enumerate(matchFields))
+        matchValues = {"match" + str(fieldIndex): str(recordSeries.get(field)) for fieldIndex, field in enumerate(matchFields)}
+        with engine.connect() as conn:
+            recordCount = conn.execute(sa.text("SELECT COUNT(*) FROM " + config.soilsDatasetTable + " WHERE " + whereText), matchValues).scalar()
+        return "success function", recordCount > 0
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  recordInDataset - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Append the final dataframe (df_ToAppendFinal2) to the Soils DB via a staging table - the dataframe is bulk written to the 'stagingTableName' table of the process, checked with
+#validation queries (staged record count, records with an existing key) and appended with a single set based 'INSERT INTO ... SELECT ... WHERE NOT EXISTS'.
+#The insert is one statement - when it fails all the records are rejected.  Returns ('success function', rejects dataframe, skipped rows, changed records) - the skipped rows
+#are the positions of the staged records with an existing key (not appended by the NOT EXISTS clause), the changed records are the skipped records with a different Value
+#(EDDTable, SiteName, Protocol_ROMN, EventName, ParameterRaw, Value and the ValueLoaded in the dataset table).
+def appendDataframesViaStaging(df_ToAppendFinal2, datasetLoopCount, startRow=0, batchID=None, priorRejects=None):
+    try:
+        import sqlalchemy as sa
+        from romn_soils_etl import journal
+
+        engine = getSoilsDBEngine(config.soilsDB)
+        lenRows = df_ToAppendFinal2.shape[0]
+        rejectRows = [] if priorRejects is None else list(priorRejects[0])
+        rejectErrors = [] if priorRejects is None else list(priorRejects[1])
+        skippedRows = []
+        df_changed = pd.DataFrame(columns=["EDDTable", "SiteName", "Protocol_ROMN", "EventName", "ParameterRaw", "Value", "ValueLoaded"])
+
+        # A resumed EDD table is staged in full - records appended before the interruption are excluded by the NOT EXISTS clause
+        if startRow < lenRows:
+            rejectRows = []
+            rejectErrors = []
+            fieldList = [df_ToAppendFinal2.index.name] + list(df_ToAppendFinal2.columns)
+            fieldText = ", ".join("[" + field + "]" for field in fieldList)
+            keyText = " AND ".join("t.[" + field + "] = s.[" + field + "]" for field in config.stagingKeyFields)
+            existsText = "EXISTS (SELECT 1 FROM " + config.soilsDatasetTable + " AS t WHERE " + keyText + ")"
+            df_loadedValues = pd.DataFrame(columns=["StagingRow", "ValueLoaded"])
+            # Staging table of the process - a concurrent staging load (e.g. a backfill and a '--watch append') does not replace or drop the table
+            stagingTable = config.stagingTableName + "_" + str(os.getpid())
+            try:
+                with StageTimer("writeStagingTable", rowsIn=lenRows, eddTable=datasetLoopCount):
+                    # 'StagingRow' - position of the staged record in the final dataframe (not inserted to the dataset table)
+                    df_ToAppendFinal2.assign(StagingRow=np.arange(lenRows)).to_sql(stagingTable, con=engine, if_exists='replace',
+                                                                                  chunksize=config.stagingChunkSize)
+
+                with engine.begin() as conn:
+                    # Validation queries against the staged records
+                    stagedCount = conn.execute(sa.text("SELECT COUNT(*) FROM " + stagingTable)).scalar()
+                    if stagedCount != lenRows:
+                        raise ValueError("Staged records: " + str(stagedCount) + " - expected: " + str(lenRows))
+                    skippedRows = sorted(int(row) for row in conn.execute(sa.text("SELECT s.StagingRow FROM " + stagingTable + " AS s WHERE " +
+                                                                                  existsText)).scalars())
+
+                    # Skipped records with a different Value - the Values of the existing records with the key (none equal to the staged Value)
+                    changedText = ("SELECT s.StagingRow, t.[Value] FROM " + stagingTable + " AS s INNER JOIN " + config.soilsDatasetTable + " AS t ON (" + keyText + ")" +
+                                   " WHERE NOT EXISTS (SELECT 1 FROM " + config.soilsDatasetTable + " AS u WHERE " + keyText.replace("t.[", "u.[") +
+                                   " AND (u.[Value] = s.[Value] OR (u.[Value] IS NULL AND s.[Value] IS NULL)))")
+                    df_loadedValues = pd.DataFrame(conn.execute(sa.text(changedText)).fetchall(), columns=["StagingRow", "ValueLoaded"])
+
+                    conn.execute(sa.text("INSERT INTO " + config.soilsDatasetTable + " (" + fieldText + ") SELECT " + ", ".join("s.[" + field + "]" for field in fieldList) +
+                                         " FROM " + stagingTable + " AS s WHERE NOT " + existsText))
+
+            except:
+                skippedRows = []
+                df_loadedValues = df_loadedValues.iloc[0:0]
+                rejectRows = list(range(lenRows))
+                rejectErrors = [traceback.format_exception_only(*sys.exc_info()[:2])[-1].strip()] * lenRows
+                messageTime = timeFun()
+                scriptMsg = ("WARNING - Staged insert failed - all records rejected for EDD Dataset: " + str(datasetLoopCount) + " - " + rejectErrors[0] + " - " + messageTime)
+                logMessage(scriptMsg, "WARNING", eddTable=datasetLoopCount)
+
+            finally:
+                # Staging table dropped (Access has no 'DROP TABLE IF EXISTS')
+                with engine.begin() as conn:
+                    if sa.inspect(conn).has_table(stagingTable):
+                        conn.execute(sa.text("DROP TABLE " + stagingTable))
+
+            # Changed records - the staged record with the existing Values of the key
+            if df_loadedValues.shape[0] > 0:
+                df_loadedValues = df_loadedValues.groupby("StagingRow")["ValueLoaded"].agg(lambda x: "|".join(sorted(set(x.astype(str))))).reset_index()
+                df_changed = df_ToAppendFinal2.iloc[df_loadedValues["StagingRow"]].reset_index()[["SiteName", "Protocol_ROMN", "EventName", "ParameterRaw", "Value"]]
+                df_changed.insert(0, "EDDTable", datasetLoopCount)
+                df_changed["ValueLoaded"] = df_loadedValues["ValueLoaded"].to_numpy()
+
+            if batchID is not None:
+                for row, rejectError in zip(rejectRows, rejectErrors):
+                    journal.recordRow(batchID, datasetLoopCount, row, rejectError)
+                journal.recordRow(batchID, datasetLoopCount, lenRows - 1)
+
+        # Rejected records - the rows as staged with the EDD table, row position and error text
+        df_rejects = df_ToAppendFinal2.iloc[rejectRows].reset_index()
+        df_rejects["EDDTable"] = datasetLoopCount
+        df_rejects["RejectRow"] = rejectRows
+        df_rejects["RejectError"] = rejectErrors
+
+        messageTime = timeFun()
+        scriptMsg = ("Append Summary - EDD Dataset: " + str(datasetLoopCount) + " - Staged: " + str(lenRows) + " - Appended: " +
+                     str(lenRows - len(rejectRows) - len(skippedRows)) + " - Existing Key (not appended): " + str(len(skippedRows)) +
+                     " - Changed Value (not appended): " + str(df_changed.shape[0]) + " - Rejected: " + str(len(rejectRows)) + " - " + messageTime)
+        logMessage(scriptMsg, "WARNING" if rejectRows or df_changed.shape[0] > 0 else "INFO", eddTable=datasetLoopCount)
+
+        return "success function", df_rejects, skippedRows, df_changed
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error 'appendDataframesViaStaging' - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "function failed", "Null", "Null", "Null"
+
+#Routine to Append the list of final dataframes (i.e. one per EDD table) to the Soils DB - rejected records from all EDD tables are written to the 'rejectsName' file.
+#'eddTables' are the EDD table numbers of the dataframes (default 0, 1, ...).  Returns the rejected records dataframe and the skipped rows dataframe (EDDTable, SkippedRow -
+#staged records with an existing key, not appended).  Staged records with an existing key and a different Value are written to the 'stagingChangesName' report.
+#With a run journal 'batchID' the append starts at the 'startRows' checkpoint per EDD table ('priorRejects' per EDD table) - returns 'load interrupted'
+#(the rejects file is not written) when an EDD table load is interrupted, the remaining EDD tables are not sent.
+def append_DB(dfs_final, eddTables=None, batchID=None, startRows=None, priorRejects=None):
+    if eddTables is None:
+        eddTables = list(range(len(dfs_final)))
+    if startRows is None:
+        startRows = [0] * len(dfs_final)
+    if priorRejects is None:
+        priorRejects = [None] * len(dfs_final)
+    rejectsList = []
+    skippedList = []
+    changesList = []
+    for loopCount, dataset, startRow, tableRejects in zip(eddTables, dfs_final, startRows, priorRejects):
+        # Append Final Dataframe to Soils DB
+        if config.loadMethod.lower() == "staging":
+            with StageTimer("appendDataframesViaStaging", rowsIn=dataset.shape[0], eddTable=loopCount):
+                outVal = appendDataframesViaStaging(dataset, loopCount, startRow, batchID, tableRejects)
+            if outVal[0].lower() == "success function":
+                changesList.append(outVal[3])
+        else:
+            with StageTimer("apppendDataframesToSoilDB", rowsIn=dataset.shape[0] - startRow, eddTable=loopCount):
+                outVal = apppendDataframesToSoilDB(dataset, loopCount, startRow, batchID, tableRejects)
+        if outVal[0].lower() == "load interrupted":
+            messageTime = timeFun()
+            logMessage("WARNING - Load of EDD Dataset: " + str(loopCount) + " interrupted - checkpoint in run journal: " + config.journalName + " - " + messageTime,
+                       "WARNING", eddTable=loopCount)
+            return "load interrupted", outVal[1], "Null"
+        elif outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage(
+                "WARNING - Function apppendDataframesToSoilDB - " + str(
+                    messageTime) + " - Failed - Exiting Script", "WARNING", eddTable=loopCount)
+            return "failed function", "Null", "Null"
+        else:
+            rejectsList.append(outVal[1])
+            skippedList.append(pd.DataFrame({"EDDTable": loopCount, "SkippedRow": pd.Series(outVal[2], dtype="int64")}))
+            messageTime = timeFun()
+            scriptMsg = ("Success - Function 'apppendDataframesToSoilDB' - for Dataset Loop Count:" + str (loopCount) + " - " + messageTime)
+            logMessage(scriptMsg, eddTable=loopCount)
+
+    df_rejects = pd.concat(rejectsList, ignore_index=True) if rejectsList else pd.DataFrame(columns=["EDDTable", "RejectRow", "RejectError"])
+    if df_rejects.shape[0] > 0:
+        outVal = writeFrameFile(df_rejects, config.rejectsName)
+        messageTime = timeFun()
+        scriptMsg = ("WARNING - " + str(df_rejects.shape[0]) + " records rejected - see: " + str(outVal[1]) + " - replay with 'replayRejectsFile' - " + messageTime)
+        logMessage(scriptMsg, "WARNING")
+
+    df_changes = pd.concat(changesList, ignore_index=True) if changesList else pd.DataFrame()
+    if df_changes.shape[0] > 0:
+        df_changes.to_csv(config.stagingChangesName, index=False)
+        messageTime = timeFun()
+        scriptMsg = ("WARNING - " + str(df_changes.shape[0]) + " staged records with an existing key and a changed Value not appended - review: " +
+                     config.stagingChangesName + " - " + messageTime)
+        logMessage(scriptMsg, "WARNING")
+
+    df_skipped = pd.concat(skippedList, ignore_index=True) if skippedList else pd.DataFrame(columns=["EDDTable", "SkippedRow"])
+    return "success function", df_rejects, df_skipped
+
+#Appended records of the final dataframes - the rejected records and the skipped records (existing key, not appended by a staging load) are removed.
+#'eddTables' are the EDD table numbers of the dataframes (default 0, 1, ...).
+def appendedRecords(dfs_final, df_rejects, df_skipped=None, eddTables=None):
+    if eddTables is None:
+        eddTables = list(range(len(dfs_final)))
+    dfs_appended = []
+    for loopCount, dataset in zip(eddTables, dfs_final):
+        notAppended = df_rejects.loc[df_rejects["EDDTable"] == loopCount, "RejectRow"].tolist()
+        if df_skipped is not None:
+            notAppended += df_skipped.loc[df_skipped["EDDTable"] == loopCount, "SkippedRow"].tolist()
+        dfs_appended.append(dataset[~np.isin(np.arange(dataset.shape[0]), notAppended)])
+    return dfs_appended
+
+#Restore the record types written as text to a rejects or staged batch file - 'Min'/'Max' numeric values (integer text as int, text values are retained) and 'StartDate'
+def restoreFrameTypes(df_records):
+    for field in ("Min", "Max"):
+        valueNumeric = pd.to_numeric(df_records[field], errors="coerce")
+        valueInteger = valueNumeric.notna() & df_records[field].astype(str).str.fullmatch(r"-?\d+")
+        df_records[field] = df_records[field].astype(object).where(valueNumeric.isna(), valueNumeric.astype(object))
+        df_records.loc[valueInteger, field] = valueNumeric[valueInteger].astype("int64").astype(object)
+    df_records["StartDate"] = pd.to_datetime(df_records["StartDate"])
+    return df_records
+
+#Replay a rejects file - only the rejected records are re-sent to the Soils DB (per EDD table).  Records rejected again are written to the 'rejectsName' file.
+def replayRejects(rejectsFile):
+    try:
+        # Text fields read as text from CSV rejects files (e.g. 'Value' keeps the lab formatting)
+        textFields = ["SiteName", "Protocol_ROMN", "EventName", "ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset", "QC_Flag", "QC_Notes", "DataFlag", "Value", "RejectError"]
+        if rejectsFile.lower().endswith(".csv"):
+            df_rejects = pd.read_csv(rejectsFile, dtype={field: str for field in textFields}, keep_default_na=False, na_values=[""])
+        else:
+            df_rejects = pd.read_parquet(rejectsFile)
+
+        df_rejects = restoreFrameTypes(df_rejects)
+
+        eddTables = []
+        dfs_replay = []
+        for eddTable, df_table in df_rejects.groupby("EDDTable", sort=True):
+            eddTables.append(int(eddTable))
+            dfs_replay.append(df_table.drop(columns=["EDDTable", "RejectRow", "RejectError"]).set_index("SiteName"))
+
+        messageTime = timeFun()
+        scriptMsg = ("Replaying " + str(df_rejects.shape[0]) + " rejected records from: " + rejectsFile + " - " + messageTime)
+        logMessage(scriptMsg)
+
+        outVal = append_DB(dfs_replay, eddTables)
+        if outVal[0].lower() != "success function":
+            return "failed function"
+        if config.useRunJournal:
+            from romn_soils_etl.incremental import recordFingerprints
+            recordFingerprints(dfs_replay, outVal[1], "Replay " + rejectsFile, eddTables, outVal[2])
+
+        messageTime = timeFun()
+        scriptMsg = ("Replay Summary - Appended: " + str(df_rejects.shape[0] - outVal[1].shape[0] - outVal[2].shape[0]) + " - Existing Key (not appended): " +
+                     str(outVal[2].shape[0]) + " - Rejected: " + str(outVal[1].shape[0]) + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  replayRejects - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#Resume the latest interrupted load batch in the run journal - the staged final dataframes are appended from the journal checkpoint per EDD table.
+#Returns the batch final dataframes, the rejected records of the batch and the skipped records ('Null' when there is no batch to resume).
+def resumeLoad():
+    try:
+        from romn_soils_etl import journal
+        from romn_soils_etl.incremental import recordFingerprints
+
+        outVal = journal.getResumeBatch()
+        if outVal[0].lower() != "success function":
+            return "failed function", "Null", "Null", "Null"
+        batchID, dfs_final, startRows, priorRejects = outVal[1:]
+        if batchID is None:
+            messageTime = timeFun()
+            scriptMsg = ("WARNING - No interrupted load batch to resume in run journal: " + config.journalName + " - " + messageTime)
+            logMessage(scriptMsg, "WARNING")
+            return "success function", "Null", "Null", "Null"
+
+        journal.setBatchStatus(batchID, "Loading")
+        outVal = append_DB(dfs_final, batchID=batchID, startRows=startRows, priorRejects=priorRejects)
+        if outVal[0].lower() == "load interrupted":
+            journal.setBatchStatus(batchID, "Interrupted")
+            return "load interrupted", dfs_final, outVal[1], "Null"
+        elif outVal[0].lower() != "success function":
+            return "failed function", "Null", "Null", "Null"
+        journal.setBatchStatus(batchID, "Complete")
+        recordFingerprints(dfs_final, outVal[1], batchID, df_skipped=outVal[2])
+
+        messageTime = timeFun()
+        scriptMsg = ("Resumed Load Batch: " + batchID + " - Complete - Rejected: " + str(outVal[1].shape[0]) + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function", dfs_final, outVal[1], outVal[2]
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  resumeLoad - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null", "Null", "Null"
+
+#Existing records (EventName, ParameterRaw, Value as text) in 'tbl_SoilChemistry_Dataset' for a list of events - queried in blocks of 100 events via read only connections
+def getExistingRecords(eventNames):
+    try:
+        eventNames = sorted(eventNames)
+        existingList = []
+        for startIndex in range(0, len(eventNames), 100):
+            inList = ", ".join("'" + str(eventName).replace("'", "''") + "'" for eventName in eventNames[startIndex:startIndex + 100])
+            inQuery = ("SELECT " + config.soilsDatasetTable + ".EventName, " + config.soilsDatasetTable + ".ParameterRaw, " + config.soilsDatasetTable + ".Value FROM " +
+                       config.soilsDatasetTable + " WHERE " + config.soilsDatasetTable + ".EventName IN (" + inList + ");")
+            outVal = connect_to_AcessDB(inQuery, config.soilsDB)
+            if outVal[0].lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function connect_to_AcessDB - " + messageTime + " - Failed - Exiting Script", "WARNING")
+                return "failed function", "Null"
+            existingList.append(outVal[1])
+
+        df_existing = pd.concat(existingList, ignore_index=True) if existingList else pd.DataFrame(columns=["EventName", "ParameterRaw", "Value"])
+        df_existing["Value"] = df_existing["Value"].astype(str)
+        return "success function", df_existing
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  getExistingRecords - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Dry Run - writes the exact rows 'apppendDataframesToSoilDB' would append to a staging file, a summary of record counts per Protocol/Parameter and
+#a key level (EventName, ParameterRaw) diff against the records in 'tbl_SoilChemistry_Dataset'.  Only read only connections are opened to the Soils DB.
+def dryRunStaging(dfs_final):
+    try:
+        # Rows as written by 'to_sql' - the 'SiteName' index is the first field
+        df_staged = pd.concat([dataset.reset_index() for dataset in dfs_final], ignore_index=True)
+        df_staged.insert(0, "EDDTable", np.repeat(np.arange(len(dfs_final)), [dataset.shape[0] for dataset in dfs_final]))
+
+        outVal = writeFrameFile(df_staged.drop(columns=["EDDTable"]), config.dryRunStagingName)
+        if outVal[0].lower() != "success function":
+            return "failed function"
+        stagingFile = outVal[1]
+
+        # Summary - record counts per EDD Table, Protocol and Parameter
+        df_summary = df_staged.groupby(["EDDTable", "Protocol_ROMN", "ParameterDataset"], as_index=False, dropna=False).size()
+        df_summary.rename(columns={"size": "RecordCount"}, inplace=True)
+        df_summary.to_csv(config.dryRunStagingName + "_Summary.csv", index=False)
+
+        # Diff - existing records in 'tbl_SoilChemistry_Dataset' for the staged events
+        outVal = getExistingRecords(df_staged["EventName"].dropna().unique())
+        if outVal[0].lower() != "success function":
+            return "failed function"
+        df_existing = outVal[1]
+        df_existing = df_existing.groupby(["EventName", "ParameterRaw"], as_index=False).agg(ValueExisting=("Value", lambda x: "|".join(sorted(set(x)))),
+                                                                                                 CountExisting=("Value", "size"))
+
+        df_diff = pd.merge(df_staged[["EDDTable", "Protocol_ROMN", "SiteName", "EventName", "ParameterRaw", "Value"]], df_existing, how="left",
+                           on=["EventName", "ParameterRaw"])
+        df_diff["DiffStatus"] = np.select([df_diff["CountExisting"].isna(), df_diff["ValueExisting"] == df_diff["Value"]],
+                                          ["New", "Existing - Same Value"], "Existing - Different Value")
+        df_diff.to_csv(config.dryRunStagingName + "_Diff.csv", index=False)
+
+        statusCounts = df_diff["DiffStatus"].value_counts()
+        messageTime = timeFun()
+        scriptMsg = ("Dry Run - Staged Records: " + str(df_staged.shape[0]) + " - New: " + str(int(statusCounts.get("New", 0))) +
+                     " - Existing Same Value: " + str(int(statusCounts.get("Existing - Same Value", 0))) +
+                     " - Existing Different Value: " + str(int(statusCounts.get("Existing - Different Value", 0))) + " - " + stagingFile + " - " + messageTime)
+        logMessage(scriptMsg)
+
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  dryRunStaging - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
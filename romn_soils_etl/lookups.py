@@ -0,0 +1,107 @@
+# ---------------------------------------------------------------------------
+# lookups.py
+# Description:  Lookup tables pulled from the Soils DB ('tlu_NameUnitCrossWalk') and the run lookup cache.
+# ---------------------------------------------------------------------------
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import connect_to_AcessDB
+
+#Lookup tables pulled from the Soils DB - populated on first use and reused for all EDD tables in the run
+lookupCache = {}
+
+#Function to pull the 'tlu_NameUnitCrossWalk' lookup table with the 'Categorical' parameter attribute defined - queried once and held in 'lookupCache'
+def getNameUnitCrossWalk():
+
+    try:
+        if "tlu_NameUnitCrossWalk" in lookupCache:
+            return "success function", lookupCache["tlu_NameUnitCrossWalk"]
+
+        inQuery = "SELECT tlu_NameUnitCrossWalk.* FROM tlu_NameUnitCrossWalk;"
+        outVal = connect_to_AcessDB(inQuery, config.soilsDB)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function connect_to_AcessDB - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function", "Null"
+
+        outDfCrossWalk = outVal[1]
+
+        #Define the 'Categorical' attribute from the parameter type field if present, else from the Categorical parameter prefixes
+        if config.crossWalkTypeField in outDfCrossWalk.columns:
+            outDfCrossWalk["Categorical"] = outDfCrossWalk[config.crossWalkTypeField].astype(str).str.strip().str.lower() == "categorical"
+        else:
+            outDfCrossWalk["Categorical"] = (outDfCrossWalk["ParameterDataset"].astype(str).str.startswith(config.categoricalParameterPrefixes) |
+                                             outDfCrossWalk["ParameterNative"].astype(str).str.startswith(config.categoricalParameterPrefixes))
+
+        lookupCache["tlu_NameUnitCrossWalk"] = outDfCrossWalk
+
+        return "success function", outDfCrossWalk
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  getNameUnitCrossWalk - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Function Check that parameter is defined in the 'tlu_NameUnitCrossWalk' table
+def checkFieldNameCrossWalk(inDf):
+
+    try:
+
+        #Impor the 'tlu_NameUnitCrossWalk' table - cached after the first EDD table
+        outVal = getNameUnitCrossWalk()
+        if outVal[0].lower()!= "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function getNameUnitCrossWalk - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function", "Null"
+        else:
+
+            #Evalute if the 'col' variable is defined in the 'ParameterNative' field
+            outDfCrossWalk = outVal[1]
+
+            #Group By on input dataframe (i.e. stacked output') on the 'ParameterRaw' field
+            inDfGB = inDf.groupby(['ParameterRaw'], axis=0, as_index=False).count()
+
+            # Join (via merge) 'outDfCurYear' (i.e. current year events) on SiteName field to 'df_uniqueGB' (i.e. the input dataset with records.
+            df_mergeCWDfGB = pd.merge(inDfGB, outDfCrossWalk, how='left', left_on='ParameterRaw', right_on='ParameterNative', suffixes=("_data", "_lookup"))
+
+            #Identify Records without a 'ParameterRaw_lookup' value
+            # Subset to only Records with Data
+            df_noCrossWalk = df_mergeCWDfGB[df_mergeCWDfGB['ParameterNative'].isna()]
+
+            rowCount = df_noCrossWalk.shape[0]
+            if rowCount > 0: #No Cross-walk defined
+
+                messageTime = timeFun()
+                scriptMsg = ("WARNING - Parameters are undefined in 'tlu_NameUnitCrossWalk' please define and reprocess - " + messageTime)
+                logMessage(scriptMsg, "WARNING")
+
+                #Looper through 'df_noCrossWalk' to log pramaters missing in 'tlu_NameUnitCrossWalk'
+                df_noCrossWalk.reset_index()
+                for index, row in df_noCrossWalk.iterrows():
+                    scriptMsg = ('WARNING - Parameter: ' + row['ParameterRaw'] + " is not defined in table 'tlu_NameUnitCrossWalk")
+                    logMessage(scriptMsg, "WARNING", record=row['ParameterRaw'])
+
+                return "failed function", df_noCrossWalk
+
+            else:
+
+                #Return Dataframe with the Lookup fields
+                df_lookupFields = df_mergeCWDfGB[["ParameterRaw", "UnitNative", "ParameterDataset", "UnitDataset", "Categorical"]]
+
+                #Rename fields:
+                outFieldList = ["ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset", "Categorical"]
+                df_lookupFields.columns = outFieldList
+
+                messageTime = timeFun()
+                scriptMsg = ("Success - Function 'checkFieldNameCrossWalk - " + messageTime)
+                logMessage(scriptMsg)
+
+        return "success function", df_lookupFields
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error checkFieldNameCrossWalk - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
@@ -0,0 +1,274 @@
+# ---------------------------------------------------------------------------
+# metadata.py
+# Description:  Event metadata - VCSS, WEI and GLORIA events resolved for the EDD samples via hash indexes on the Soils DB event tables, with the events
+# defined per sample in the metadata override file applied after the index lookups.
+# ---------------------------------------------------------------------------
+import os
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import connect_to_AcessDB
+from romn_soils_etl.lookups import lookupCache
+from romn_soils_etl.frameio import fileLock
+
+#Event index definitions per EDD layout - Protocol, Query, Sample key fields (df_uniqueGB), Event key fields (query), EventName defined from the 'data' or 'metadata'.
+#The VCSS and WEI event tables ('tbl_Events'/'tbl_Events1') differ across the EDD layouts.
+weiQuery = ("SELECT {0}.EventName, {0}.StartDate, tbl_Soil.Chem, tbl_Soil.Comments_Soil, tbl_Soil.Comments_Sample FROM {0} INNER JOIN tbl_Soil ON {0}.EventName = "
+            "tbl_Soil.EventName;")
+layoutEventIndexes = {
+    "pre2022": [["VCSS", "SELECT tbl_Events1.* FROM tbl_Events1;", ["EventName"], ["EventName"], "data"],
+                ["WEI", weiQuery.format("tbl_Events"), ["Sample ID"], ["Chem"], "metadata"]],
+    "gte2022": [["VCSS", "SELECT tbl_Events.* FROM tbl_Events;", ["SiteName", "DateNum"], ["SiteName", "DateNum"], "data"],
+                ["WEI", weiQuery.format("tbl_Events"), ["Sample ID"], ["Chem"], "metadata"]],
+    "2024": [["VCSS", "SELECT tbl_Events.* FROM tbl_Events;", ["SiteName", "DateNum"], ["SiteName", "DateNum"], "data"],
+             ["WEI", weiQuery.format("tbl_Events1"), ["Sample ID"], ["Chem"], "metadata"]]}
+
+#Metadata override file fields - one record per 'SampleName_ROMN', the event fields are blank until filled (e.g. from the field sheets)
+overrideFields = ["SampleName_ROMN", "SampleName_Lab", "Protocol_ROMN", "EventName", "SiteName", "StartDate", "Notes", "InputFile", "DateAdded"]
+
+#Unique Lab and ROMN sample combinations across all EDD tables with the SiteName, EventName and DateNum keys defined from the 'Sample ID'
+#(e.g. table one samples after the '_BD' to '_CM' swap).  EventName is all prior to the third '_' - logic will not work for WEI - only used for VCSS.
+def defineSampleKeys(datasetList):
+    df_unique = pd.concat([dataset[['Lab ID', 'Sample ID']] for dataset in datasetList], ignore_index=True)
+    df_uniqueGB = df_unique.groupby(['Lab ID', 'Sample ID'], as_index=False).count()
+    df_uniqueGB['StartDate'] = pd.NaT
+    df_uniqueGB['YearSample'] = None
+
+    # Define SiteName
+    df_uniqueGB['SiteName'] = df_uniqueGB['Sample ID'].str[:8]
+    # Define EventName all prior to the third '_'
+    df_uniqueGB['EventName'] = ['_'.join(x.split('_')[:3]) for x in df_uniqueGB['Sample ID']]
+    # Define DateNum
+    df_uniqueGB['DateNum'] = ['_'.join(x.split('_')[2:3]) for x in df_uniqueGB['EventName']]
+    return df_uniqueGB
+
+#Function to build the event metadata hash indexes (VCSS, WEI and GLORIA) - event tables are queried once and the indexes held in 'lookupCache'
+def getEventIndexes():
+
+    try:
+        if "eventIndexes" in lookupCache:
+            return "success function", lookupCache["eventIndexes"]
+
+        #Index definitions for the EDD layout plus the GLORIA events query
+        indexDefinitions = layoutEventIndexes[config.eddLayout] + [["GLORIA", config.gloriaEventsQuery, ["Sample ID"], ["SampleName_ROMN"], "metadata"]]
+
+        eventIndexes = {}
+        for protocol, inQuery, sampleKeyFields, eventKeyFields, eventNameFrom in indexDefinitions:
+
+            if inQuery is None:
+                continue
+
+            outVal = connect_to_AcessDB(inQuery, config.soilsDB)
+            if outVal[0].lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function connect_to_AcessDB - " + protocol + " - " + messageTime + " - Failed - Exiting Script", "WARNING")
+                return "failed function", "Null"
+
+            #Events dataframe - only events with a defined EventName and StartDate can resolve a sample
+            outDf = outVal[1]
+            outDf = outDf[outDf["EventName"].notna() & outDf["StartDate"].notna()]
+
+            #Retain the first event per key - a duplicate key would otherwise duplicate the sample records
+            duplicateCount = int(outDf.duplicated(subset=eventKeyFields).sum())
+            if duplicateCount > 0:
+                messageTime = timeFun()
+                scriptMsg = ("WARNING - " + str(duplicateCount) + " duplicate " + protocol + " event keys on " + str(eventKeyFields) + " - first event retained - " + messageTime)
+                logMessage(scriptMsg, "WARNING")
+                outDf = outDf.drop_duplicates(subset=eventKeyFields)
+
+            if len(eventKeyFields) > 1:
+                eventIndex = pd.MultiIndex.from_frame(outDf[eventKeyFields])
+            else:
+                eventIndex = pd.Index(outDf[eventKeyFields[0]])
+
+            eventIndexes[protocol] = {"index": eventIndex,
+                                      "sampleKeyFields": sampleKeyFields,
+                                      "eventNameFrom": eventNameFrom,
+                                      "EventName": outDf["EventName"].to_numpy(dtype=object),
+                                      "StartDate": pd.to_datetime(outDf["StartDate"]).to_numpy(dtype="datetime64[ns]")}
+
+        lookupCache["eventIndexes"] = eventIndexes
+
+        return "success function", eventIndexes
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  getEventIndexes - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Define VCSS, WEI and GLORIA Event Metadata in a single pass - each sample is looked up in the event indexes and coalesced in 'eventIndexPriority' order.
+#Samples without a match are set to 'TBD'.  The 'MatchIndex' field records the index which resolved the sample.
+def resolveEventMetadata(df_uniqueGB):
+
+    try:
+        outVal = getEventIndexes()
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function getEventIndexes - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function", "Null"
+        eventIndexes = outVal[1]
+
+        recordCount = df_uniqueGB.shape[0]
+        matchIndex = np.full(recordCount, "TBD", dtype=object)
+        protocol = np.full(recordCount, "TBD", dtype=object)
+        eventName = np.full(recordCount, "TBD", dtype=object)
+        startDate = np.full(recordCount, np.datetime64("NaT"), dtype="datetime64[ns]")
+        dataEventName = df_uniqueGB["EventName"].to_numpy(dtype=object)
+
+        for indexName in config.eventIndexPriority:
+            if indexName not in eventIndexes:
+                continue
+            eventIndex = eventIndexes[indexName]
+
+            #Sample keys for the index lookup
+            sampleKeyFields = eventIndex["sampleKeyFields"]
+            if len(sampleKeyFields) > 1:
+                sampleKeys = pd.MultiIndex.from_frame(df_uniqueGB[sampleKeyFields])
+            else:
+                sampleKeys = pd.Index(df_uniqueGB[sampleKeyFields[0]])
+
+            #Position of each sample in the event index (-1 no match) - only samples not resolved by a higher priority index are updated
+            position = eventIndex["index"].get_indexer(sampleKeys)
+            newMatch = (position >= 0) & (matchIndex == "TBD")
+            matchPosition = position[newMatch]
+
+            matchIndex[newMatch] = indexName
+            protocol[newMatch] = indexName
+            startDate[newMatch] = eventIndex["StartDate"][matchPosition]
+            if eventIndex["eventNameFrom"] == "data":
+                eventName[newMatch] = dataEventName[newMatch]
+            else:
+                eventName[newMatch] = eventIndex["EventName"][matchPosition]
+
+        df_wVCSS_wWEI = pd.DataFrame({"Protocol_ROMN": protocol,
+                                      "SampleName_Lab": df_uniqueGB["Lab ID"].to_numpy(),
+                                      "SampleName_ROMN": df_uniqueGB["Sample ID"].to_numpy(),
+                                      "EventName": eventName,
+                                      "SiteName": df_uniqueGB["SiteName"].to_numpy(),
+                                      "StartDate": startDate,
+                                      "MatchIndex": matchIndex})
+
+        return "success function", df_wVCSS_wWEI
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  resolveEventMetadata - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Apply the metadata overrides to the resolved event metadata - samples with a filled override record (Protocol_ROMN, EventName and StartDate) take the override event,
+#found by an index lookup on 'SampleName_ROMN' ('MatchIndex' set to 'Override').  Samples still without an event that are not in the override file are added to it
+#with blank event fields, so the events are filled once and applied on every later run.
+def applyMetadataOverrides(df_wVCSS_wWEI):
+
+    try:
+        outVal = readMetadataOverrides()
+        if outVal[0].lower() != "success function":
+            return "failed function", "Null"
+        df_overrides = outVal[1]
+
+        # Filled override records - the last record of a sample listed more than once is applied
+        startDate = pd.to_datetime(df_overrides["StartDate"], errors="coerce")
+        isFilled = df_overrides["Protocol_ROMN"].notna() & df_overrides["EventName"].notna() & startDate.notna()
+        df_invalidDate = df_overrides[df_overrides["StartDate"].notna() & startDate.isna()]
+        for index, row in df_invalidDate.iterrows():
+            scriptMsg = ("WARNING - Metadata override for Sample: " + str(row["SampleName_ROMN"]) + " - StartDate '" + str(row["StartDate"]) +
+                         "' is not a date - override not applied")
+            logMessage(scriptMsg, "WARNING", record=str(row["SampleName_ROMN"]))
+
+        df_filled = df_overrides[isFilled].assign(StartDate=startDate[isFilled]).drop_duplicates(subset=["SampleName_ROMN"], keep="last")
+        overrideIndex = pd.Index(df_filled["SampleName_ROMN"])
+
+        # Position of each sample in the override index (-1 no override)
+        df_wVCSS_wWEI = df_wVCSS_wWEI.copy()
+        position = overrideIndex.get_indexer(df_wVCSS_wWEI["SampleName_ROMN"].astype(str))
+        isOverride = position >= 0
+        matchPosition = position[isOverride]
+
+        siteName = df_filled["SiteName"].to_numpy(dtype=object)[matchPosition]
+        df_wVCSS_wWEI.loc[isOverride, "Protocol_ROMN"] = df_filled["Protocol_ROMN"].to_numpy(dtype=object)[matchPosition]
+        df_wVCSS_wWEI.loc[isOverride, "EventName"] = df_filled["EventName"].to_numpy(dtype=object)[matchPosition]
+        df_wVCSS_wWEI.loc[isOverride, "SiteName"] = np.where(pd.notna(siteName), siteName, df_wVCSS_wWEI.loc[isOverride, "SiteName"].to_numpy(dtype=object))
+        df_wVCSS_wWEI.loc[isOverride, "StartDate"] = df_filled["StartDate"].to_numpy(dtype="datetime64[ns]")[matchPosition]
+        df_wVCSS_wWEI.loc[isOverride, "MatchIndex"] = "Override"
+
+        # Samples without an event not yet in the override file - added with blank event fields to be filled.  The file is read again and written under
+        # the file lock so samples added by a concurrent run (e.g. '--jobs' worker processes) are retained.
+        df_pending = df_wVCSS_wWEI[(df_wVCSS_wWEI["EventName"] == "TBD") & ~df_wVCSS_wWEI["SampleName_ROMN"].astype(str).isin(df_overrides["SampleName_ROMN"])]
+        if df_pending.shape[0] > 0:
+            os.makedirs(os.path.dirname(os.path.abspath(config.metadataOverrideFile)), exist_ok=True)
+            with fileLock(config.metadataOverrideFile):
+                outVal = readMetadataOverrides()
+                if outVal[0].lower() != "success function":
+                    return "failed function", "Null"
+                df_overrides = outVal[1]
+                df_pending = df_pending[~df_pending["SampleName_ROMN"].astype(str).isin(df_overrides["SampleName_ROMN"])]
+                if df_pending.shape[0] > 0:
+                    df_added = pd.DataFrame({"SampleName_ROMN": df_pending["SampleName_ROMN"].astype(str).to_numpy(),
+                                             "SampleName_Lab": df_pending["SampleName_Lab"].astype(str).to_numpy(),
+                                             "SiteName": df_pending["SiteName"].to_numpy(dtype=object),
+                                             "InputFile": os.path.basename(str(config.inputFile)),
+                                             "DateAdded": config.dateString}, columns=overrideFields)
+                    outVal = writeMetadataOverrides(pd.concat([df_overrides, df_added], ignore_index=True))
+                    if outVal.lower() != "success function":
+                        return "failed function", "Null"
+
+        pendingCount = int((df_wVCSS_wWEI["EventName"] == "TBD").sum())
+        messageTime = timeFun()
+        scriptMsg = ("Metadata overrides - " + str(int(isOverride.sum())) + " samples defined by the override file - " + str(df_pending.shape[0]) + " samples added to the file - " +
+                     str(pendingCount) + " samples without an event - " + config.metadataOverrideFile + " - " + messageTime)
+        logMessage(scriptMsg)
+        if pendingCount > 0:
+            logMessage("WARNING - Fill 'Protocol_ROMN', 'EventName' and 'StartDate' for the samples without an event in: " + config.metadataOverrideFile + " and rerun", "WARNING")
+
+        return "success function", df_wVCSS_wWEI
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  applyMetadataOverrides - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Read the metadata override file - all fields as text (blank fields null), no records when the file does not exist
+def readMetadataOverrides():
+
+    try:
+        if not os.path.exists(config.metadataOverrideFile):
+            return "success function", pd.DataFrame(columns=overrideFields, dtype=object)
+
+        df_overrides = pd.read_csv(config.metadataOverrideFile, dtype=str, keep_default_na=False, na_values=[""])
+        missingFields = [field for field in ("SampleName_ROMN", "Protocol_ROMN", "EventName", "StartDate") if field not in df_overrides.columns]
+        if missingFields:
+            messageTime = timeFun()
+            logMessage("WARNING - Metadata override file: " + config.metadataOverrideFile + " - missing fields: " + str(missingFields) + " - " + messageTime, "WARNING")
+            return "failed function", "Null"
+        for field in overrideFields:
+            if field not in df_overrides.columns:
+                df_overrides[field] = None
+        df_overrides = df_overrides[df_overrides["SampleName_ROMN"].notna()]
+        df_overrides["SampleName_ROMN"] = df_overrides["SampleName_ROMN"].str.strip()
+        return "success function", df_overrides.reset_index(drop=True)
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  readMetadataOverrides - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Write the metadata override file - written to a temporary file and renamed so a failed write does not lose the filled records.  Run under the 'fileLock'.
+def writeMetadataOverrides(df_overrides):
+
+    try:
+        tempFile = config.metadataOverrideFile + "." + str(os.getpid()) + ".tmp"
+        df_overrides.to_csv(tempFile, index=False)
+        os.replace(tempFile, config.metadataOverrideFile)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  writeMetadataOverrides - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
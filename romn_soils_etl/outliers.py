@@ -0,0 +1,182 @@
+# ---------------------------------------------------------------------------
+# outliers.py
+# Description:  Historical outlier flags - robust statistics per ParameterDataset and SiteName/Protocol_ROMN cached in the workspace and refreshed after each load.
+# ---------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import connect_to_AcessDB
+from romn_soils_etl.lookups import lookupCache
+from romn_soils_etl.frameio import readFrameFile, writeFrameFile
+from romn_soils_etl.qc import appendQCText, setQCFields
+
+#Robust statistics per group - Count, Median, MAD (median absolute deviation) and the 1st/99th percentiles of the numeric values.
+#Statistics are computed for the 'Site' level (ParameterDataset, SiteName) and the 'Protocol' level (ParameterDataset, Protocol_ROMN).
+def computeGroupStats(df_values):
+    statsList = []
+    for groupLevel, groupField in (("Site", "SiteName"), ("Protocol", "Protocol_ROMN")):
+        groupFields = ["ParameterDataset", groupField]
+        grouped = df_values.groupby(groupFields)["ValueNumeric"]
+        groupMedian = grouped.transform("median")
+        df_stats = grouped.agg(Count="size", Median="median",
+                               Q01=lambda x: x.quantile(0.01), Q99=lambda x: x.quantile(0.99))
+        df_stats["MAD"] = (df_values["ValueNumeric"] - groupMedian).abs().groupby([df_values[field] for field in groupFields]).median()
+        df_stats = df_stats.reset_index().rename(columns={groupField: "GroupKey"})
+        df_stats.insert(0, "GroupLevel", groupLevel)
+        statsList.append(df_stats)
+    return pd.concat(statsList, ignore_index=True)
+
+#Numeric history values from a final/master dataframe - fields used for the statistics groups
+def getNumericValues(df_long):
+    df_values = df_long[["ParameterDataset", "SiteName", "Protocol_ROMN"]].copy()
+    df_values["ValueNumeric"] = pd.to_numeric(df_long["Value"], errors="coerce")
+    return df_values.dropna(subset=["ValueNumeric", "ParameterDataset"]).reset_index(drop=True)
+
+#Get the cached history statistics - on the first run the history values are pulled from 'tbl_SoilChemistry_Dataset' (one full scan) and both caches written to the workspace
+def getHistoryStats():
+    try:
+        if "historyStats" in lookupCache:
+            return "success function", lookupCache["historyStats"]
+
+        outVal = readFrameFile(config.historyStatsName)
+        if outVal[0].lower() != "success function":
+            return "failed function", "Null"
+        df_stats = outVal[1]
+
+        if df_stats is None:
+            inQuery = ("SELECT " + config.soilsDatasetTable + ".ParameterDataset, " + config.soilsDatasetTable + ".SiteName, " + config.soilsDatasetTable + ".Protocol_ROMN, " +
+                       config.soilsDatasetTable + ".Value FROM " + config.soilsDatasetTable + ";")
+            outVal = connect_to_AcessDB(inQuery, config.soilsDB)
+            if outVal[0].lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function connect_to_AcessDB - " + messageTime + " - Failed - Exiting Script", "WARNING")
+                return "failed function", "Null"
+
+            df_values = getNumericValues(outVal[1])
+            df_stats = computeGroupStats(df_values)
+            writeFrameFile(df_values, config.historyValuesName)
+            writeFrameFile(df_stats, config.historyStatsName)
+
+            messageTime = timeFun()
+            scriptMsg = ("History statistics cache built from '" + config.soilsDatasetTable + "' - " + str(df_values.shape[0]) + " values - " + messageTime)
+            logMessage(scriptMsg)
+
+        lookupCache["historyStats"] = df_stats
+        return "success function", df_stats
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  getHistoryStats - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Flag records which are outliers relative to the history - statistics are looked up per record via the group index (Site level, else Protocol level)
+#and flagged where the robust z-score exceeds 'outlierZThreshold' (or outside the 1st/99th percentiles where the MAD is 0)
+def flagHistoricalOutliers(dfs_final):
+    try:
+        outVal = getHistoryStats()
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function getHistoryStats - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function", "Null"
+        df_stats = outVal[1]
+        df_stats = df_stats[df_stats["Count"] >= config.outlierMinCount]
+
+        df_long = pd.concat([dataset.reset_index() for dataset in dfs_final], ignore_index=True)
+        recordCount = df_long.shape[0]
+        valueNumeric = pd.to_numeric(df_long["Value"], errors="coerce").to_numpy(dtype=float)
+
+        # Statistics per record - Site level first, Protocol level where the Site group is not defined
+        statFields = ["Count", "Median", "MAD", "Q01", "Q99"]
+        recordStats = np.full((recordCount, len(statFields)), np.nan)
+        statLevel = np.full(recordCount, "", dtype=object)
+        for groupLevel, groupField in (("Site", "SiteName"), ("Protocol", "Protocol_ROMN")):
+            df_levelStats = df_stats[df_stats["GroupLevel"] == groupLevel]
+            groupIndex = pd.MultiIndex.from_frame(df_levelStats[["ParameterDataset", "GroupKey"]].astype(str))
+            recordKeys = pd.MultiIndex.from_arrays([df_long["ParameterDataset"].astype(str), df_long[groupField].astype(str)])
+            position = groupIndex.get_indexer(recordKeys)
+            newMatch = (position >= 0) & (statLevel == "")
+            recordStats[newMatch] = df_levelStats[statFields].to_numpy(dtype=float)[position[newMatch]]
+            statLevel[newMatch] = groupLevel
+
+        count, median, mad, q01, q99 = recordStats.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            robustZ = np.where(mad > 0, 0.6745 * (valueNumeric - median) / mad, np.nan)
+        outlierMask = ((mad > 0) & (np.abs(robustZ) > config.outlierZThreshold)) | ((mad == 0) & ((valueNumeric < q01) | (valueNumeric > q99)))
+        outlierMask = outlierMask & ~np.isnan(valueNumeric)
+
+        qcFlag = df_long["QC_Flag"].to_numpy(dtype=object).copy()
+        qcNotes = df_long["QC_Notes"].to_numpy(dtype=object).copy()
+        outlierNotes = np.full(recordCount, "", dtype=object)
+        if outlierMask.any():
+            outlierNotes[outlierMask] = ("Historical outlier - " + pd.Series(statLevel[outlierMask]) + " median " + pd.Series(median[outlierMask]).round(3).astype(str) +
+                                         " - robust z " + pd.Series(robustZ[outlierMask]).round(1).astype(str) + " - n " + pd.Series(count[outlierMask]).astype(int).astype(str)).to_numpy(dtype=object)
+        appendQCText(qcFlag, outlierMask, "QC Outlier")
+        appendQCText(qcNotes, outlierMask, outlierNotes)
+
+        dfs_qc = setQCFields(dfs_final, qcFlag, qcNotes)
+
+        messageTime = timeFun()
+        scriptMsg = ("Historical Outliers - " + str(int(outlierMask.sum())) + " of " + str(recordCount) + " records flagged - " +
+                     str(int((statLevel != "").sum())) + " records with history - " + messageTime)
+        logMessage(scriptMsg)
+
+        return "success function", dfs_qc
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  flagHistoricalOutliers - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Incremental refresh of the history caches after a load - the appended values are added to the history values cache and the statistics
+#are recomputed only for the groups (Site and Protocol) with new values
+def updateHistoryStats(dfs_final):
+    try:
+        outVal = readFrameFile(config.historyValuesName)
+        if outVal[0].lower() != "success function" or outVal[1] is None:
+            return "failed function"
+        df_history = outVal[1]
+
+        df_new = getNumericValues(pd.concat([dataset.reset_index() for dataset in dfs_final], ignore_index=True))
+        df_history = pd.concat([df_history, df_new], ignore_index=True)
+
+        outVal = getHistoryStats()
+        if outVal[0].lower() != "success function":
+            return "failed function"
+        df_stats = outVal[1]
+
+        # Groups with new values
+        siteKeys = pd.MultiIndex.from_frame(df_new[["ParameterDataset", "SiteName"]].astype(str)).unique()
+        protocolKeys = pd.MultiIndex.from_frame(df_new[["ParameterDataset", "Protocol_ROMN"]].astype(str)).unique()
+
+        def touchedGroups(df, levelField, siteField, protocolField):
+            siteMask = pd.MultiIndex.from_arrays([df["ParameterDataset"].astype(str), df[siteField].astype(str)]).isin(siteKeys)
+            protocolMask = pd.MultiIndex.from_arrays([df["ParameterDataset"].astype(str), df[protocolField].astype(str)]).isin(protocolKeys)
+            if levelField is None:
+                return siteMask | protocolMask
+            return (siteMask & (df[levelField] == "Site").to_numpy()) | (protocolMask & (df[levelField] == "Protocol").to_numpy())
+
+        touchedStats = touchedGroups(df_stats, "GroupLevel", "GroupKey", "GroupKey")
+        df_touchedStats = computeGroupStats(df_history[touchedGroups(df_history, None, "SiteName", "Protocol_ROMN")])
+        df_touchedStats = df_touchedStats[touchedGroups(df_touchedStats, "GroupLevel", "GroupKey", "GroupKey")]
+
+        df_stats = pd.concat([df_stats[~touchedStats], df_touchedStats], ignore_index=True)
+
+        writeFrameFile(df_history, config.historyValuesName)
+        writeFrameFile(df_stats, config.historyStatsName)
+        lookupCache["historyStats"] = df_stats
+
+        messageTime = timeFun()
+        scriptMsg = ("History statistics cache updated - " + str(df_new.shape[0]) + " values added - " + str(df_touchedStats.shape[0]) + " groups refreshed - " + messageTime)
+        logMessage(scriptMsg)
+
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  updateHistoryStats - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
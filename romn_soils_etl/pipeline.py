@@ -0,0 +1,448 @@
+# ---------------------------------------------------------------------------
+# pipeline.py
+# Description:  ETL pipeline - extract, event metadata, preflight, transform, QC and load of an EDD with the run parameters in 'config'.
+# ---------------------------------------------------------------------------
+import os
+import io
+import logging
+import cProfile
+import pstats
+import tracemalloc
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage, flushRunLog, StageTimer, countRows, writeRunReport, writeCollapsedStacks, stageRecords, profileMemoryRecords
+from romn_soils_etl.lookups import lookupCache
+from romn_soils_etl.db import disposeEngines
+from romn_soils_etl.extract import extractEDDTables
+from romn_soils_etl.metadata import defineSampleKeys, resolveEventMetadata, applyMetadataOverrides
+from romn_soils_etl.validate import runPreflight
+from romn_soils_etl.transform import joinMetadataToDataframes
+from romn_soils_etl.qc import applyQCRules
+from romn_soils_etl.outliers import flagHistoricalOutliers, updateHistoryStats
+from romn_soils_etl.load import append_DB, appendedRecords, replayRejects, resumeLoad, dryRunStaging
+from romn_soils_etl.export import exportLoadBatch, exportMasterTable
+from romn_soils_etl.query import updateValuesCache
+from romn_soils_etl.incremental import filterIncrementalRecords, recordFingerprints
+from romn_soils_etl import journal
+
+#ETL routine for the EDD defined in 'config' - replay rejects, resume an interrupted load or prepare and load the EDD
+def main():
+    runStatus = "Failed"
+    runStartTime = timeFun()
+    startRun()
+
+    try:
+
+        #####################
+        #Replay Rejects - re-send only the records in the rejects file
+        #####################
+        if config.replayRejectsFile is not None:
+            with StageTimer("replayRejects"):
+                outVal = replayRejects(config.replayRejectsFile)
+            if outVal.lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function replayRejects - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+                return
+            runStatus = "Replayed Rejects"
+            return
+
+        #####################
+        #Resume Load - append the latest interrupted load batch in the run journal from its checkpoint (no extraction or metadata resolution)
+        #####################
+        if config.resumeLoad:
+            with StageTimer("resumeLoad"):
+                outVal = resumeLoad()
+            if outVal[0].lower() == "load interrupted":
+                messageTime = timeFun()
+                logMessage("WARNING - Resumed load interrupted again - rerun with '--resume' (or 'resumeLoad') - " + messageTime, "WARNING")
+                runStatus = "Load Interrupted"
+                return
+            elif outVal[0].lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function resumeLoad - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+                return
+            if not isinstance(outVal[1], list):
+                runStatus = "No Load To Resume"
+                return
+            refreshHistoryStats(outVal[1], outVal[2], outVal[3])
+            refreshValuesCache(outVal[1], outVal[2], outVal[3])
+            exportLoad(outVal[1], outVal[2], outVal[3])
+            runStatus = "Resumed"
+            return
+
+        #####################
+        #Prepare the final dataframes (extract, event metadata, preflight, transform, QC and outlier flags) and load
+        #####################
+        outVal = prepareEDD()
+        if outVal[0] == "Prepared":
+            runStatus = loadEDD(outVal[1])
+        else:
+            runStatus = outVal[0]
+
+    except:
+
+        messageTime = timeFun()
+        scriptMsg = "Error function:  pipeline.main - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+
+    finally:
+        endRun(runStatus, runStartTime)
+
+#Start a run - output names not set are defined from the 'workspace' and 'outName' parameters, the workspace is created and the stage memory tracing started
+def startRun():
+    config.defineOutputNames()
+    if not os.path.exists(config.workspace):
+        os.makedirs(config.workspace)
+    if config.trackStageMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+#End a run - stage summary and run manifest, then write the buffered run log records
+def endRun(runStatus, runStartTime):
+    journal.closeJournal()
+    writeRunReport(runStatus, runStartTime)
+    if config.trackStageMemory and tracemalloc.is_tracing() and not config.profileRun:
+        tracemalloc.stop()
+    flushRunLog()
+
+#Pipelined runs (producer) - prepare the final dataframes of the EDD defined in 'config' (e.g. in a worker process).  Returns the prepared run record with the
+#run status, start time, final dataframes and stage records for 'loadMain'.  The run report is written here when the run ends without a load (preflight/failed).
+def prepareMain():
+    preparedRecord = {"runStatus": "Failed", "runStartTime": timeFun(), "dfs_final": None, "stageRecords": []}
+    startRun()
+    try:
+        outVal = prepareEDD()
+        preparedRecord["runStatus"] = outVal[0]
+        if outVal[0] == "Prepared":
+            preparedRecord["dfs_final"] = outVal[1]
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  pipeline.prepareMain - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+
+    finally:
+        if preparedRecord["runStatus"] == "Prepared":
+            preparedRecord["stageRecords"] = list(stageRecords)
+            journal.closeJournal()
+            flushRunLog()
+        else:
+            endRun(preparedRecord["runStatus"], preparedRecord["runStartTime"])
+    return preparedRecord
+
+#Pipelined runs (writer) - load the final dataframes of a 'prepareMain' prepared run record with the run parameters in 'config'.  The stage records of the
+#prepare stages are added to the run report and the run log records are appended to the run logfile.
+def loadMain(preparedRecord):
+    if preparedRecord["runStatus"] != "Prepared":
+        return
+    runStatus = "Failed"
+    stageRecords.extend(preparedRecord["stageRecords"])
+    startRun()
+    try:
+        runStatus = loadEDD(preparedRecord["dfs_final"])
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  pipeline.loadMain - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+
+    finally:
+        endRun(runStatus, preparedRecord["runStartTime"])
+
+#Prepare the final dataframes of the EDD defined in 'config' - extract, event metadata, preflight, transform, QC and historical outlier flags.
+#Returns the run status ('Prepared' with the final dataframes, or 'Preflight Errors'/'Preflight Only'/'Failed').  Run within the 'main' (or 'prepareMain') error handling.
+def prepareEDD():
+    #####################
+    #Process the Raw Data - Define Data Frames for the EDD Tables
+    #####################
+
+    with StageTimer("read_excel") as timer:
+        rawDataDf = pd.read_excel(config.inputFile, sheet_name=config.rawDataSheet)
+        timer.rowsOut = rawDataDf.shape[0]
+
+    with StageTimer("extractEDDTables", rowsIn=rawDataDf.shape[0]) as timer:
+        outVal = extractEDDTables(rawDataDf)
+        timer.rowsOut = countRows(outVal)
+    if outVal[0].lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function 'extractEDDTables' - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+        return "Failed", "Null"
+    else:
+        # Lists with the EDD table dataframes, field names and the EDD header labels
+        datasetList = outVal[1]
+        crossWalkList = outVal[2]
+        headerList = outVal[3]
+        del (rawDataDf)
+
+    ###############################
+    # Get Metadata for all Events - Must Check WEI and VCSS metadata
+    ##############################
+    ####################################################
+    # Get distinct dataframe Lab and ROMN Sample Numbers
+    # Get Unique Dataframe with Lab and ROMN sample combinations and the SiteName, EventName and DateNum keys
+    df_uniqueGB = defineSampleKeys(datasetList)
+
+    # Find metadata Information - VCSS, WEI and GLORIA events resolved in one lookup against the event indexes
+    with StageTimer("resolveEventMetadata", rowsIn=df_uniqueGB.shape[0]) as timer:
+        outVal = resolveEventMetadata(df_uniqueGB)
+        timer.rowsOut = countRows(outVal)
+    if outVal[0].lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function 'resolveEventMetadata' - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+        return "Failed", "Null"
+    else:
+        # Return datafdrame with VCSS, WEI and GLORIA events defined
+        df_wVCSS_wWEI = outVal[1]
+        messageTime = timeFun()
+        scriptMsg = ("Success - Function 'resolveEventMetadata' - " + messageTime)
+        logMessage(scriptMsg)
+
+    # Metadata Overrides - events defined per sample in the override file (e.g. GLORIA samples filled from the field sheets), samples without an event added to the file
+    if config.applyMetadataOverrides:
+        with StageTimer("applyMetadataOverrides", rowsIn=df_wVCSS_wWEI.shape[0]) as timer:
+            outVal = applyMetadataOverrides(df_wVCSS_wWEI)
+            timer.rowsOut = countRows(outVal)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function 'applyMetadataOverrides' - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+            return "Failed", "Null"
+        else:
+            df_wVCSS_wWEI = outVal[1]
+
+    ################################################################################
+    # Preflight Validation - all checks across all EDD tables in one pass, report written to the workspace
+    ################################################################################
+    with StageTimer("runPreflight", rowsIn=countRows(datasetList)) as timer:
+        outVal = runPreflight(datasetList, crossWalkList, headerList, df_wVCSS_wWEI)
+        timer.rowsOut = countRows(outVal)
+    if outVal[0].lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function 'runPreflight' - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+        return "Failed", "Null"
+    else:
+        df_preflightReport = outVal[1]
+
+    errorCount = int((df_preflightReport["Severity"] == "Error").sum())
+    if errorCount > 0:
+        messageTime = timeFun()
+        scriptMsg = ("WARNING - Preflight found: " + str(errorCount) + " Errors - see: " + config.preflightReportName + " - Exiting Script - " + messageTime)
+        logMessage(scriptMsg, "WARNING")
+        logMessage(df_preflightReport[df_preflightReport["Severity"] == "Error"].to_string(index=False), "WARNING")
+        return "Preflight Errors", "Null"
+
+    if config.preflightOnly:
+        messageTime = timeFun()
+        scriptMsg = ("Preflight Only - no Errors in EDD: " + config.inputFile + " - see: " + config.preflightReportName + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "Preflight Only", "Null"
+
+    ################################################################################
+    #Join Metadata to the EDD Table Dataframes - returns the final dataframes to be appended
+    ################################################################################
+
+    with StageTimer("joinMetadataToDataframes", rowsIn=countRows(datasetList)) as timer:
+        outVal = joinMetadataToDataframes(df_wVCSS_wWEI, datasetList, crossWalkList)
+        timer.rowsOut = countRows(outVal)
+    if outVal[0].lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function joinMetadataToDataframes - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+        return "Failed", "Null"
+    else:
+        dfs_final = outVal[1]
+        messageTime = timeFun()
+        scriptMsg = ("Success - Function 'joinMetadataToDataframes' - " + messageTime)
+        logMessage(scriptMsg)
+
+    ################################################################################
+    #QC Rules - flag implausible values in the 'QC_Flag' and 'QC_Notes' fields
+    ################################################################################
+    if config.applyQC:
+        with StageTimer("applyQCRules", rowsIn=countRows(dfs_final)) as timer:
+            outVal = applyQCRules(dfs_final)
+            timer.rowsOut = countRows(outVal)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function applyQCRules - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+            return "Failed", "Null"
+        else:
+            dfs_final = outVal[1]
+
+    ################################################################################
+    #Historical Outlier Flags - compare values to the cached history statistics
+    ################################################################################
+    if config.applyOutlierFlags:
+        with StageTimer("flagHistoricalOutliers", rowsIn=countRows(dfs_final)) as timer:
+            outVal = flagHistoricalOutliers(dfs_final)
+            timer.rowsOut = countRows(outVal)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function flagHistoricalOutliers - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+            return "Failed", "Null"
+        else:
+            dfs_final = outVal[1]
+
+    return "Prepared", dfs_final
+
+#Load the final dataframes - incremental filter, dry run or the append to the Soils DB with the run journal, history and values cache refresh and Parquet export.
+#Returns the run status ('Appended', 'Dry Run', 'Load Interrupted' or 'Failed').  Run within the 'main' (or 'loadMain') error handling.
+def loadEDD(dfs_final):
+    ################################################################################
+    #Incremental Load - only the records not appended by earlier loads, changed values are reported for review
+    ################################################################################
+    if config.incrementalLoad:
+        with StageTimer("filterIncrementalRecords", rowsIn=countRows(dfs_final)) as timer:
+            outVal = filterIncrementalRecords(dfs_final)
+            timer.rowsOut = countRows(outVal)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function filterIncrementalRecords - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+            return "Failed"
+        else:
+            dfs_final = outVal[1]
+
+    ################################################################################
+    #Dry Run - stage the rows to be appended with a summary and diff against 'tbl_SoilChemistry_Dataset' - nothing is written to the Soils DB
+    ################################################################################
+    if config.dryRun:
+        with StageTimer("dryRunStaging", rowsIn=countRows(dfs_final)):
+            outVal = dryRunStaging(dfs_final)
+        if outVal.lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function dryRunStaging - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+            return "Failed"
+
+        messageTime = timeFun()
+        scriptMsg = ("Successfully Finished Dry Run of EDD: " + config.inputFile + " - nothing appended to the Soils Database - " + messageTime)
+        logMessage(scriptMsg)
+        return "Dry Run"
+
+    ################################################################################
+    #Append the final dataframes to the Soils DB
+    ################################################################################
+    # Load batch in the run journal - the final dataframes are staged to the workspace and each record sent is checkpointed for a '--resume'
+    batchID = None
+    if config.useRunJournal:
+        outVal = journal.startBatch(dfs_final)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function startBatch - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+            return "Failed"
+        batchID = outVal[1]
+
+    with StageTimer("append_DB", rowsIn=countRows(dfs_final)):
+        outVal = append_DB(dfs_final, batchID=batchID)
+    if outVal[0].lower() == "load interrupted":
+        journal.setBatchStatus(batchID, "Interrupted")
+        messageTime = timeFun()
+        logMessage("WARNING - Load interrupted - rerun with '--resume' (or 'resumeLoad') to continue from the checkpoint - " + messageTime, "WARNING")
+        return "Load Interrupted"
+    elif outVal[0].lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function append_DB - " + str(messageTime) + " - Failed - Exiting Script", "WARNING")
+        return "Failed"
+    else:
+        df_rejects, df_skipped = outVal[1], outVal[2]
+        if batchID is not None:
+            journal.setBatchStatus(batchID, "Complete")
+            recordFingerprints(dfs_final, df_rejects, batchID, df_skipped=df_skipped)
+
+    refreshHistoryStats(dfs_final, df_rejects, df_skipped)
+    refreshValuesCache(dfs_final, df_rejects, df_skipped)
+    exportLoad(dfs_final, df_rejects, df_skipped)
+
+    messageTime = timeFun()
+    scriptMsg = ("Successfully Finished Processing EDD: " + config.inputFile + " to the Soils Database - " + messageTime)
+    logMessage(scriptMsg)
+    return "Appended"
+
+#Refresh the history statistics cache with the appended records of the final dataframes (rejected and skipped records excluded)
+def refreshHistoryStats(dfs_final, df_rejects, df_skipped):
+    if not config.applyOutlierFlags:
+        return
+    dfs_appended = appendedRecords(dfs_final, df_rejects, df_skipped)
+    with StageTimer("updateHistoryStats", rowsIn=countRows(dfs_appended)):
+        outVal = updateHistoryStats(dfs_appended)
+    if outVal.lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function updateHistoryStats - " + str(messageTime) + " - Failed - history cache not updated", "WARNING")
+
+#Refresh the values cache ('query.get_values') with the appended records of the final dataframes - the cache is only updated when it has been built
+def refreshValuesCache(dfs_final, df_rejects, df_skipped):
+    if not config.valuesCacheRefresh:
+        return
+    dfs_appended = appendedRecords(dfs_final, df_rejects, df_skipped)
+    with StageTimer("updateValuesCache", rowsIn=countRows(dfs_appended)):
+        outVal = updateValuesCache(dfs_appended)
+    if outVal.lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Function updateValuesCache - " + str(messageTime) + " - Failed - rebuild the values cache with 'query.buildValuesCache'", "WARNING")
+
+#Parquet export of the load - the appended records are added to the Parquet dataset, or with 'exportMasterTable' the dataset is replaced with all the Soils DB records
+def exportLoad(dfs_final, df_rejects, df_skipped):
+    if config.exportMasterTable:
+        with StageTimer("exportMasterTable"):
+            outVal = exportMasterTable()
+    elif config.exportParquet:
+        dfs_appended = appendedRecords(dfs_final, df_rejects, df_skipped)
+        with StageTimer("exportLoadBatch", rowsIn=countRows(dfs_appended)):
+            outVal = exportLoadBatch(dfs_appended)
+    else:
+        return
+    if outVal.lower() != "success function":
+        messageTime = timeFun()
+        logMessage("WARNING - Parquet export - " + str(messageTime) + " - Failed - run with 'exportMasterTable' to rebuild the Parquet dataset", "WARNING")
+
+#Profile run - 'main' under cProfile with a tracemalloc snapshot per stage.  Writes the pstats, collapsed stacks and per stage allocation sites next to the logfile.
+def profileMain():
+    try:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(config.profileTraceFrames)
+
+        profiler = cProfile.Profile()
+        profiler.runcall(main)
+
+        profiler.dump_stats(config.profileOutputName + ".pstats")
+        profileStats = pstats.Stats(profiler)
+        writeCollapsedStacks(profileStats, config.profileOutputName + "_Collapsed.txt")
+
+        with open(config.profileOutputName + "_Memory.txt", "w") as outFile:
+            for stage, eddTable, peakMemoryMB, topSites in profileMemoryRecords:
+                outFile.write("Stage: " + stage + ("" if eddTable is None else " - EDD Table: " + str(eddTable)) + " - Peak Traced MB: " + str(peakMemoryMB) + "\n")
+                outFile.write("    SizeKB    Count  Script Line  -  Allocation Site\n")
+                for sizeKB, count, scriptLine, allocationSite in topSites:
+                    outFile.write("%10.1f %8d  %s  -  %s\n" % (sizeKB, count, scriptLine, allocationSite))
+                outFile.write("\n")
+
+        messageTime = timeFun()
+        scriptMsg = ("Profile written - " + config.profileOutputName + " (.pstats, _Collapsed.txt, _Memory.txt) - " + messageTime)
+        logMessage(scriptMsg)
+        profileText = io.StringIO()
+        pstats.Stats(profiler, stream=profileText).sort_stats("cumulative").print_stats(20)
+        logMessage("Top functions by cumulative time - " + messageTime + "\n" + profileText.getvalue())
+        flushRunLog()
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  profileMain - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        flushRunLog()
+        return "failed function"
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+#Reset the run state - clears the lookup cache, the stage and memory profile records and closes the Soils DB connections, run journal and run logger handlers
+#(e.g. between runs in one process).  'clearCaches' False keeps the lookup cache and Soils DB connections for the next run (watch mode).
+def resetRunState(clearCaches=True):
+    if clearCaches:
+        lookupCache.clear()
+        disposeEngines()
+    del stageRecords[:]
+    del profileMemoryRecords[:]
+    journal.closeJournal()
+    logger = logging.getLogger("ROMN_Soils_ETL")
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
@@ -0,0 +1,116 @@
+# ---------------------------------------------------------------------------
+# qc.py
+# Description:  QC rules - plausibility checks which populate the 'QC_Flag' and 'QC_Notes' fields of the final dataframes.
+# ---------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+
+#QC Rules table - 'Range' rules flag numeric values outside MinValue/MaxValue for records where 'MatchField' matches the 'MatchPattern' (regex).
+#'Sum' rules total the values of the 'MatchPattern' parameters (ParameterRaw) per EventName and flag the totals outside MinValue/MaxValue,
+#or when a 'TargetPattern' parameter is defined, totals differing from the target value by more than MaxValue.  Blank MinValue/MaxValue are unbounded.
+def getQCRules():
+    if config.qcRulesFile is not None:
+        return pd.read_csv(config.qcRulesFile)
+
+    qcRulesList = [
+        ["pH", "Range", "ParameterRaw", r"(?i)\bpH\b", None, 0, 14, "QC Range", "pH outside 0 - 14"],
+        ["Percent", "Range", "UnitDataset", r"^\s*%\s*$", None, 0, 100, "QC Range", "Percentage outside 0 - 100"],
+        ["PPM", "Range", "UnitDataset", r"(?i)^\s*ppm\s*$", None, 0, None, "QC Range", "Negative ppm value"],
+        ["TextureSum", "Sum", "ParameterRaw", r"^(Sand|Silt|Clay) \(%\)$", None, 95, 105, "QC Texture Sum", "Sand, Silt and Clay (%) do not sum to 100 +/- 5"],
+        ["BaseSaturation", "Sum", "ParameterRaw", r"^(K|Ca|Mg|Na) \(%\)$", r"^Total Base Saturation$", None, 5, "QC Base Saturation",
+         "K, Ca, Mg and Na (%) differ from Total Base Saturation by more than 5"]]
+
+    return pd.DataFrame(qcRulesList, columns=["RuleID", "RuleType", "MatchField", "MatchPattern", "TargetPattern", "MinValue", "MaxValue", "Flag", "Note"])
+
+#Evaluate the QC rules on a stacked dataframe (fields: EventName, ParameterRaw, ParameterDataset, UnitDataset, Value) - each rule is one vectorized mask.
+#Pattern matching is done once per distinct field value and mapped to the records by the factorized codes.  Returns the QC_Flag and QC_Notes arrays.
+def evaluateQCRules(df_long, df_qcRules):
+    recordCount = df_long.shape[0]
+    qcFlag = np.full(recordCount, "", dtype=object)
+    qcNotes = np.full(recordCount, "", dtype=object)
+    valueNumeric = pd.to_numeric(df_long["Value"], errors="coerce").to_numpy(dtype=float)
+
+    def matchMask(fieldName, pattern):
+        codes, uniques = pd.factorize(df_long[fieldName].astype(str))
+        uniqueMatch = pd.Series(uniques).str.contains(pattern, regex=True).to_numpy(dtype=bool)
+        return uniqueMatch[codes] if recordCount > 0 else np.zeros(0, dtype=bool)
+
+    for index, rule in df_qcRules.iterrows():
+        minValue = float(rule["MinValue"]) if pd.notna(rule["MinValue"]) else -np.inf
+        maxValue = float(rule["MaxValue"]) if pd.notna(rule["MaxValue"]) else np.inf
+        memberMask = matchMask(rule["MatchField"], rule["MatchPattern"])
+
+        if rule["RuleType"] == "Range":
+            ruleMask = memberMask & ((valueNumeric < minValue) | (valueNumeric > maxValue))
+
+        elif rule["RuleType"] == "Sum":
+            # Totals per EventName - events with a repeated member parameter (i.e. more than one sample) are not evaluated
+            df_members = pd.DataFrame({"EventName": df_long["EventName"].to_numpy()[memberMask], "Value": valueNumeric[memberMask]})
+            df_memberGB = df_members.groupby("EventName").agg(Total=("Value", "sum"), Count=("Value", "size"))
+            repeatedMembers = df_long[memberMask].duplicated(subset=["EventName", "ParameterRaw"], keep=False)
+            df_memberGB = df_memberGB[~df_memberGB.index.isin(df_long[memberMask][repeatedMembers]["EventName"])]
+
+            if pd.notna(rule["TargetPattern"]) and rule["TargetPattern"] != "":
+                targetMask = matchMask("ParameterRaw", rule["TargetPattern"])
+                df_target = pd.DataFrame({"EventName": df_long["EventName"].to_numpy()[targetMask], "Target": valueNumeric[targetMask]})
+                df_target = df_target.drop_duplicates(subset=["EventName"], keep=False).set_index("EventName")
+                df_memberGB = df_memberGB.join(df_target, how="inner")
+                eventFail = (df_memberGB["Total"] - df_memberGB["Target"]).abs() > maxValue
+                memberMask = memberMask | targetMask
+            else:
+                eventFail = (df_memberGB["Total"] < minValue) | (df_memberGB["Total"] > maxValue)
+
+            ruleMask = memberMask & df_long["EventName"].isin(df_memberGB.index[eventFail.to_numpy()]).to_numpy()
+
+        else:
+            continue
+
+        appendQCText(qcFlag, ruleMask, rule["Flag"])
+        appendQCText(qcNotes, ruleMask, rule["Note"])
+
+    return qcFlag, qcNotes
+
+#Append QC text (scalar or array aligned with 'textArray') to the masked records - existing text is kept and separated with '; '
+def appendQCText(textArray, mask, newText):
+    if not isinstance(newText, str):
+        newText = np.asarray(newText, dtype=object)[mask]
+    textArray[mask] = np.where(textArray[mask] == "", newText, textArray[mask] + "; " + newText)
+
+#Set the QC_Flag and QC_Notes arrays (aligned with the concatenated final dataframes) back on to each final dataframe
+def setQCFields(dfs_final, qcFlag, qcNotes):
+    dfs_qc = []
+    startIndex = 0
+    for dataset in dfs_final:
+        endIndex = startIndex + dataset.shape[0]
+        dataset = dataset.copy()
+        dataset["QC_Flag"] = qcFlag[startIndex:endIndex]
+        dataset["QC_Notes"] = qcNotes[startIndex:endIndex]
+        dfs_qc.append(dataset)
+        startIndex = endIndex
+    return dfs_qc
+
+#Apply the QC rules to the final dataframes - rules are evaluated across all EDD tables at once (cross parameter rules can span tables)
+def applyQCRules(dfs_final):
+    try:
+        df_qcRules = getQCRules()
+
+        df_long = pd.concat([dataset.reset_index() for dataset in dfs_final], ignore_index=True)
+        qcFlag, qcNotes = evaluateQCRules(df_long, df_qcRules)
+
+        dfs_qc = setQCFields(dfs_final, qcFlag, qcNotes)
+
+        flagCount = int((qcFlag != "").sum())
+        messageTime = timeFun()
+        scriptMsg = ("QC Rules - " + str(flagCount) + " of " + str(df_long.shape[0]) + " records flagged - " + messageTime)
+        logMessage(scriptMsg)
+
+        return "success function", dfs_qc
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  applyQCRules - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
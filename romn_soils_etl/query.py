@@ -0,0 +1,270 @@
+# ---------------------------------------------------------------------------
+# query.py
+# Description:  Read API over 'tbl_SoilChemistry_Dataset' - 'get_values' returns the records of sites, parameters and years from a local columnar cache of the
+# dataset ('valuesCacheName' - Parquet, or CSV without pyarrow) in place of an ODBC query of the Soils DB per request.  Each Soils DB has its own cache file
+# ('<valuesCacheName>_<Soils DB name>_<path hash>').
+# The cache is built from the Soils DB on the first request (or with 'buildValuesCache'), held in memory with a sorted (SiteName, ParameterDataset, YearSampled)
+# index.  The records appended by each load are written by the loader as a batch file next to the cache file ('<cache file>_Batch_<time>'), merged with the cache
+# file when the cache is read and merged into the cache file after 'valuesCacheMaxBatches' loads.  A cache updated by another process (e.g. a load) is reloaded on the next request.
+# Edits made in Access (e.g. QC_Status reviews) are not in the cache until it is rebuilt with 'buildValuesCache'.
+
+# Usage:  from romn_soils_etl import config
+#         from romn_soils_etl.query import get_values
+#         config.setParameters(soilsDB="Soil_ROMN_AllYears_MASTER.accdb", workspace="C:\\ETL")
+#         df_pH = get_values(site="ROMN_VCSS_GRKO_001", parameter="pH", years=range(2015, 2025))
+# ---------------------------------------------------------------------------
+import os
+import glob
+import hashlib
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.db import connect_to_AcessDB, getSoilsDBKey
+from romn_soils_etl.frameio import readFrameFile, writeFrameFile
+from romn_soils_etl.export import exportFields, floatFields
+
+#Index fields of the values cache
+valuesIndexFields = ["SiteName", "ParameterDataset", "YearSampled"]
+
+#Values cache held in memory - the indexed records, the ParameterRaw to ParameterDataset names and the cache and batch files read (path and modified time) per cache file name
+valuesCache = {}
+
+#Records of sites, parameters and years - 'site' (SiteName), 'parameter' (ParameterDataset, or an EDD ParameterRaw name e.g. 'pH 1:1') and 'years' (YearSampled)
+#are a value, a list of values (e.g. range(2015, 2025)) or None for all.  Returns the matching records sorted by SiteName, ParameterDataset and YearSampled
+#(None when the cache cannot be read or built).
+def get_values(site=None, parameter=None, years=None):
+    try:
+        outVal = getValuesCache()
+        if outVal[0].lower() != "success function":
+            return None
+        df_values, parameterRawNames = outVal[1], outVal[2]
+
+        # Keys per index level - keys not in the cache are dropped (no match), None selects the whole level
+        levelKeys = []
+        datasetParameters = []
+        rawParameters = []
+        for levelNumber, keyValue in enumerate([site, parameter, years]):
+            if keyValue is None:
+                levelKeys.append(slice(None))
+                continue
+            keyList = [keyValue] if isinstance(keyValue, str) or not hasattr(keyValue, "__iter__") else list(keyValue)
+            levelValues = df_values.index.levels[levelNumber]
+
+            # ParameterRaw names are looked up with their ParameterDataset names and the records filtered to the ParameterRaw below
+            if levelNumber == 1:
+                datasetParameters = [key for key in keyList if key in levelValues]
+                rawParameters = [key for key in keyList if key not in levelValues and key in parameterRawNames.index]
+                keyList = datasetParameters + [datasetName for key in rawParameters for datasetName in parameterRawNames[key]]
+
+            keyList = [key for key in dict.fromkeys(keyList) if key in levelValues]
+            if not keyList:
+                return df_values.iloc[0:0].reset_index()
+            levelKeys.append(keyList)
+
+        df_selected = df_values.iloc[df_values.index.get_locs(levelKeys)].reset_index()
+        if rawParameters:
+            df_selected = df_selected[df_selected["ParameterDataset"].isin(datasetParameters) | df_selected["ParameterRaw"].isin(rawParameters)].reset_index(drop=True)
+        return df_selected
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  get_values - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return None
+
+#Values cache of the 'soilsDB' - read when not in memory or when the cache or batch files were updated, built from the Soils DB when there is no cache file.
+#Returns the indexed records and the ParameterDataset names per ParameterRaw name.
+def getValuesCache():
+    try:
+        cacheName = getValuesCacheName()
+        if getValuesCacheFile(cacheName) is None:
+            outVal = buildValuesCache()
+            if outVal.lower() != "success function":
+                return "failed function", "Null", "Null"
+
+        cacheFiles = getValuesCacheFiles(cacheName)
+        if cacheName in valuesCache and valuesCache[cacheName]["cacheFiles"] == cacheFiles:
+            cacheRecord = valuesCache[cacheName]
+            return "success function", cacheRecord["df_values"], cacheRecord["parameterRawNames"]
+
+        # Files replaced while being read (e.g. batches merged by a load) are read again
+        for attempt in range(3):
+            outVal = readValuesCacheFiles(cacheFiles)
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null", "Null"
+            readFiles = getValuesCacheFiles(cacheName)
+            if readFiles == cacheFiles:
+                break
+            cacheFiles = readFiles
+        setValuesCache(outVal[1], cacheName, cacheFiles)
+        cacheRecord = valuesCache[cacheName]
+        return "success function", cacheRecord["df_values"], cacheRecord["parameterRawNames"]
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  getValuesCache - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null", "Null"
+
+#Values cache file name (no extension) of the 'soilsDB' - the 'valuesCacheName' (default 'Soils_Chemistry_Values' in the workspace, or in the current directory
+#before a run) with the Soils DB name and a hash of its path, so a copy or test database does not share the cache.  The run parameters are not changed.
+def getValuesCacheName():
+    cacheName = config.valuesCacheName
+    if cacheName is None:
+        cacheName = os.path.join(config.workspace if config.workspace is not None else os.getcwd(), "Soils_Chemistry_Values")
+    soilsDBKey = getSoilsDBKey(config.soilsDB)
+    return cacheName + "_" + os.path.splitext(os.path.basename(soilsDBKey))[0] + "_" + hashlib.sha1(soilsDBKey.encode("utf-8")).hexdigest()[:8]
+
+#Values cache file ('.parquet' or '.csv' as written by 'writeFrameFile') - None when not built
+def getValuesCacheFile(cacheName):
+    for extension in (".parquet", ".csv"):
+        if os.path.exists(cacheName + extension):
+            return cacheName + extension
+    return None
+
+#Values cache batch files - the records appended by each load not yet merged into the cache file, in load order
+def getValuesBatchFiles(cacheName):
+    return sorted(batchFile for batchFile in glob.glob(glob.escape(cacheName) + "_Batch_*") if batchFile.endswith((".parquet", ".csv")))
+
+#Cache and batch files with their modified times - a change in the files (e.g. a load) reloads the cache held in memory
+def getValuesCacheFiles(cacheName):
+    cacheFiles = []
+    for cacheFile in [getValuesCacheFile(cacheName)] + getValuesBatchFiles(cacheName):
+        try:
+            cacheFiles.append((cacheFile, os.path.getmtime(cacheFile)))
+        except (OSError, TypeError):
+            pass
+    return tuple(cacheFiles)
+
+#Read the cache and batch files - returns the records of all the files
+def readValuesCacheFiles(cacheFiles):
+    try:
+        dfs_records = []
+        for cacheFile, cacheTime in cacheFiles:
+            outVal = readFrameFile(os.path.splitext(cacheFile)[0])
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null"
+            if outVal[1] is not None:
+                dfs_records.append(prepareValuesRecords(outVal[1]))
+        if not dfs_records:
+            return "failed function", "Null"
+        return "success function", pd.concat(dfs_records, ignore_index=True)
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  readValuesCacheFiles - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Hold the values cache records in memory - indexed (sorted) by SiteName, ParameterDataset and YearSampled
+def setValuesCache(df_records, cacheName, cacheFiles):
+    df_values = df_records.set_index(valuesIndexFields).sort_index()
+    parameterRawNames = df_records.groupby("ParameterRaw")["ParameterDataset"].unique().map(list)
+    valuesCache[cacheName] = {"df_values": df_values, "parameterRawNames": parameterRawNames, "cacheFiles": cacheFiles}
+
+#Dataset records to the values cache fields and types - 'Value' keeps the lab text, 'Min'/'Max' numeric (text values are null), 'YearSampled' integer
+def prepareValuesRecords(df_records):
+    df_prepared = pd.DataFrame(index=df_records.index)
+    for field in exportFields:
+        if field not in df_records.columns:
+            df_prepared[field] = None
+        elif field == "StartDate":
+            df_prepared[field] = pd.to_datetime(df_records[field])
+        elif field == "YearSampled":
+            df_prepared[field] = pd.to_numeric(df_records[field], errors="coerce").astype("Int64")
+        elif field in floatFields:
+            df_prepared[field] = pd.to_numeric(df_records[field], errors="coerce").astype("float64")
+        else:
+            df_prepared[field] = df_records[field]
+    df_prepared["Value"] = df_prepared["Value"].map(lambda x: None if x is None or (not isinstance(x, str) and pd.isna(x)) else str(x))
+    return df_prepared.sort_values(valuesIndexFields, kind="stable").reset_index(drop=True)
+
+#Build the values cache from all the 'tbl_SoilChemistry_Dataset' records (e.g. the first request, or to include edits made in Access)
+def buildValuesCache():
+    try:
+        cacheName = getValuesCacheName()
+        inQuery = "SELECT * FROM " + config.soilsDatasetTable + ";"
+        outVal = connect_to_AcessDB(inQuery, config.soilsDB)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function connect_to_AcessDB - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function"
+
+        df_records = prepareValuesRecords(outVal[1])
+        os.makedirs(os.path.dirname(os.path.abspath(cacheName)), exist_ok=True)
+        outVal = writeFrameFile(df_records, cacheName)
+        if outVal[0].lower() != "success function":
+            return "failed function"
+
+        # Batch files are in the Soils DB records - removed
+        for batchFile in getValuesBatchFiles(cacheName):
+            os.remove(batchFile)
+        setValuesCache(df_records, cacheName, getValuesCacheFiles(cacheName))
+
+        messageTime = timeFun()
+        scriptMsg = ("Values cache built from '" + config.soilsDatasetTable + "' - " + str(df_records.shape[0]) + " records - " + outVal[1] + " - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  buildValuesCache - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#Incremental refresh of the values cache after a load - the appended records (list of dataframes) are written as a batch file, only the batch is written.
+#After 'valuesCacheMaxBatches' batch files the batches are merged into the cache file.  The cache is not built here (it is built from the Soils DB on the first request).
+def updateValuesCache(dfs_appended):
+    try:
+        cacheName = getValuesCacheName()
+        if getValuesCacheFile(cacheName) is None:
+            return "success function"
+        df_new = prepareValuesRecords(pd.concat([dataset.reset_index() for dataset in dfs_appended], ignore_index=True))
+        if df_new.shape[0] > 0:
+            batchTime = timeFun().replace(":", "").replace("-", "").replace(".", "")
+            outVal = writeFrameFile(df_new, cacheName + "_Batch_" + batchTime + "_" + str(os.getpid()))
+            if outVal[0].lower() != "success function":
+                return "failed function"
+
+        batchFiles = getValuesBatchFiles(cacheName)
+        if len(batchFiles) > config.valuesCacheMaxBatches:
+            outVal = mergeValuesBatches(cacheName)
+            if outVal.lower() != "success function":
+                return "failed function"
+
+        messageTime = timeFun()
+        scriptMsg = ("Values cache updated - " + str(df_new.shape[0]) + " records added - " + str(len(getValuesBatchFiles(cacheName))) + " batch files - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  updateValuesCache - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#Merge the batch files into the values cache file - the merged batch files are removed
+def mergeValuesBatches(cacheName):
+    try:
+        cacheFiles = getValuesCacheFiles(cacheName)
+        outVal = readValuesCacheFiles(cacheFiles)
+        if outVal[0].lower() != "success function":
+            return "failed function"
+        df_records = outVal[1].sort_values(valuesIndexFields, kind="stable").reset_index(drop=True)
+        outVal = writeFrameFile(df_records, cacheName)
+        if outVal[0].lower() != "success function":
+            return "failed function"
+        for batchFile, batchTime in cacheFiles[1:]:
+            os.remove(batchFile)
+
+        messageTime = timeFun()
+        scriptMsg = ("Values cache batches merged - " + str(len(cacheFiles) - 1) + " batch files - " + str(df_records.shape[0]) + " records - " + messageTime)
+        logMessage(scriptMsg)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  mergeValuesBatches - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
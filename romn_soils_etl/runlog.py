@@ -0,0 +1,249 @@
+# ---------------------------------------------------------------------------
+# runlog.py
+# Description:  Run logging (buffered JSON lines logfile and console), stage timing/memory records, the run report (manifest) and the profiling helpers.
+# ---------------------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import logging
+import logging.handlers
+import functools
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+
+#Stage timing records for the run - one record per timed stage (see 'StageTimer')
+stageRecords = []
+#Memory profile records - top allocation sites per stage (profile runs only)
+profileMemoryRecords = []
+
+# Function to Get the Date/Time
+def timeFun():
+    from datetime import datetime
+    b = datetime.now()
+    messageTime = b.isoformat()
+    return messageTime
+
+#JSON lines formatter for the run logfile - one JSON record per log message
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        from datetime import datetime
+        outRecord = {"timestamp": datetime.fromtimestamp(record.created).isoformat(),
+                     "level": record.levelname,
+                     "stage": getattr(record, "stage", None),
+                     "eddTable": getattr(record, "eddTable", None),
+                     "record": getattr(record, "record", None),
+                     "message": record.getMessage()}
+        if record.exc_info:
+            outRecord["exception"] = self.formatException(record.exc_info)
+        return json.dumps(outRecord, default=str)
+
+#Get the run logger - created on first use with a buffered (MemoryHandler) JSON lines logfile handler and a console handler
+def runLogger():
+    logger = logging.getLogger("ROMN_Soils_ETL")
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(min(logging.getLevelName(config.consoleLogLevel.upper()), logging.getLevelName(config.fileLogLevel.upper())))
+    logger.propagate = False
+
+    # Logfile handler only once the output names are defined (see 'config.defineOutputNames') - console only before the run starts
+    if config.logFileName is not None:
+        fileHandler = logging.FileHandler(config.logFileName, mode="a", encoding="utf-8", delay=True)
+        fileHandler.setFormatter(JsonLinesFormatter())
+        fileHandler.setLevel(config.fileLogLevel.upper())
+        memoryHandler = logging.handlers.MemoryHandler(config.logBufferCapacity, flushLevel=logging.WARNING, target=fileHandler, flushOnClose=True)
+        memoryHandler.setLevel(config.fileLogLevel.upper())
+        logger.addHandler(memoryHandler)
+
+    consoleHandler = logging.StreamHandler(sys.stdout)
+    consoleHandler.setFormatter(logging.Formatter("%(message)s"))
+    consoleHandler.setLevel(config.consoleLogLevel.upper())
+    logger.addHandler(consoleHandler)
+    return logger
+
+#Log a message to the console and the run logfile - 'stage' defaults to the calling function name
+def logMessage(scriptMsg, level="INFO", stage=None, eddTable=None, record=None, exc_info=False):
+    if stage is None:
+        stage = sys._getframe(1).f_code.co_name
+    runLogger().log(logging.getLevelName(level), scriptMsg, exc_info=exc_info, extra={"stage": stage, "eddTable": eddTable, "record": record})
+
+#Write the buffered log records to the run logfile
+def flushRunLog():
+    for handler in runLogger().handlers:
+        handler.flush()
+
+#Stage timer - context manager (or function decorator) recording the wall time, rows in/out and peak traced memory of a stage in 'stageRecords'.
+#Rows out is set on the timer in the 'with' block (the decorator counts the rows of the returned dataframes).  Nested stages roll their peak memory up to the enclosing stage.
+class StageTimer:
+    openTimers = []
+
+    def __init__(self, stage, rowsIn=None, eddTable=None):
+        self.stage = stage
+        self.rowsIn = rowsIn
+        self.rowsOut = None
+        self.eddTable = eddTable
+        self.peakBytes = 0
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            if StageTimer.openTimers:
+                parentTimer = StageTimer.openTimers[-1]
+                parentTimer.peakBytes = max(parentTimer.peakBytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if config.profileRun:
+                self.startSnapshot = tracemalloc.take_snapshot()
+        StageTimer.openTimers.append(self)
+        self.startTime = timeFun()
+        self.startCounter = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        seconds = time.perf_counter() - self.startCounter
+        StageTimer.openTimers.pop()
+        peakMemoryMB = None
+        if tracemalloc.is_tracing():
+            self.peakBytes = max(self.peakBytes, tracemalloc.get_traced_memory()[1])
+            if StageTimer.openTimers:
+                parentTimer = StageTimer.openTimers[-1]
+                parentTimer.peakBytes = max(parentTimer.peakBytes, self.peakBytes)
+            peakMemoryMB = round(self.peakBytes / 1048576, 2)
+            if config.profileRun:
+                profileMemoryRecords.append([self.stage, self.eddTable, peakMemoryMB, topAllocationSites(tracemalloc.take_snapshot(), self.startSnapshot)])
+
+        stageRecords.append({"stage": self.stage,
+                             "eddTable": self.eddTable,
+                             "startTime": self.startTime,
+                             "seconds": round(seconds, 4),
+                             "rowsIn": self.rowsIn,
+                             "rowsOut": self.rowsOut,
+                             "peakMemoryMB": peakMemoryMB,
+                             "status": "Failed" if excType is not None else "Success"})
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def stageWrapper(*args, **kwargs):
+            with StageTimer(self.stage) as timer:
+                outVal = func(*args, **kwargs)
+                timer.rowsOut = countRows(outVal)
+            return outVal
+        return stageWrapper
+
+#Top allocation sites in a tracemalloc snapshot (allocations since 'baseSnapshot' when defined) - each site is the allocating line and the calling line
+#in the package (e.g. the pandas copy and the 'joinMetadataToDataframes' line requesting it).  Returns [SizeKB, Count, Package Line, Allocation Site] records.
+def topAllocationSites(snapshot, baseSnapshot=None):
+    if baseSnapshot is not None:
+        statList = [(stat.size_diff, stat.count_diff, stat.traceback) for stat in snapshot.compare_to(baseSnapshot, "traceback") if stat.size_diff > 0]
+    else:
+        statList = [(stat.size, stat.count, stat.traceback) for stat in snapshot.statistics("traceback")]
+
+    packageFolder = os.path.dirname(os.path.abspath(__file__)) + os.sep
+    siteSizes = {}
+    for size, count, statTraceback in statList:
+        allocationFrame = statTraceback[-1]
+        # Skip the tracemalloc snapshots and import machinery
+        if allocationFrame.filename == tracemalloc.__file__ or allocationFrame.filename.startswith("<"):
+            continue
+        scriptFrame = next((frame for frame in reversed(statTraceback) if frame.filename.startswith(packageFolder)), None)
+        siteKey = (scriptFrame.filename + ":" + str(scriptFrame.lineno) if scriptFrame is not None else "",
+                   allocationFrame.filename + ":" + str(allocationFrame.lineno))
+        siteSize = siteSizes.setdefault(siteKey, [0, 0])
+        siteSize[0] += size
+        siteSize[1] += count
+
+    topSites = sorted(siteSizes.items(), key=lambda item: item[1][0], reverse=True)[:config.profileTopAllocations]
+    return [[round(size / 1024, 1), count, scriptLine, allocationSite] for (scriptLine, allocationSite), (size, count) in topSites]
+
+#Collapsed stack lines (flame graph input - 'frame;frame;frame microseconds') from the cProfile call graph.  cProfile records caller/callee edges only, so the
+#stacks are rebuilt from the roots with each callee time shared across its callers in proportion to the edge cumulative time.  Paths with a share below
+#'minShare' of the profiled time are not expanded (keeps the number of paths bounded on deep pandas call graphs).
+def writeCollapsedStacks(profileStats, outPath, maxDepth=64, minShare=0.002):
+    stats = profileStats.stats
+    minTime = max(profileStats.total_tt * minShare, 1e-6)
+    callees = {}
+    for func, (callCount, numCalls, totalTime, cumulativeTime, callers) in stats.items():
+        for caller, edgeStats in callers.items():
+            callees.setdefault(caller, []).append((func, edgeStats[3]))
+
+    def funcLabel(func):
+        return os.path.basename(func[0]) + ":" + func[2] if func[0] != "~" else func[2]
+
+    stackTimes = {}
+
+    def visitFunc(func, stack, shareTime):
+        cumulativeTime = stats[func][3]
+        if cumulativeTime <= 0 or shareTime < minTime:
+            return
+        label = funcLabel(func)
+        if label in stack or len(stack) >= maxDepth:
+            return
+        stack = stack + (label,)
+        scale = min(shareTime / cumulativeTime, 1.0)
+        stackKey = ";".join(stack)
+        stackTimes[stackKey] = stackTimes.get(stackKey, 0.0) + stats[func][2] * scale
+        for callee, edgeCumulativeTime in callees.get(func, []):
+            visitFunc(callee, stack, edgeCumulativeTime * scale)
+
+    for func, funcStats in stats.items():
+        if not funcStats[4]:
+            visitFunc(func, (), funcStats[3])
+
+    with open(outPath, "w") as outFile:
+        for stackKey, stackTime in stackTimes.items():
+            microseconds = int(round(stackTime * 1000000))
+            if microseconds > 0:
+                outFile.write(stackKey + " " + str(microseconds) + "\n")
+
+#Count the dataframe rows in a function return value - a dataframe, or the dataframes in a list/tuple (e.g. ("success function", df)).  None when there are no dataframes.
+def countRows(outVal):
+    if isinstance(outVal, pd.DataFrame):
+        return outVal.shape[0]
+    if isinstance(outVal, (list, tuple)):
+        rowCounts = [countRows(item) for item in outVal if isinstance(item, (pd.DataFrame, list, tuple))]
+        rowCounts = [rowCount for rowCount in rowCounts if rowCount is not None]
+        if rowCounts:
+            return sum(rowCounts)
+    return None
+
+#Log the stage summary table and write the JSON run manifest (run parameters, status and the 'stageRecords')
+def writeRunReport(runStatus, runStartTime):
+    try:
+        runEndTime = timeFun()
+        if stageRecords:
+            df_stages = pd.DataFrame(stageRecords)
+            df_stages["rowsIn"] = pd.to_numeric(df_stages["rowsIn"])
+            df_stages["rowsOut"] = pd.to_numeric(df_stages["rowsOut"])
+            df_summary = df_stages.groupby("stage", sort=False).agg(Calls=("stage", "size"),
+                                                                    Seconds=("seconds", "sum"),
+                                                                    RowsIn=("rowsIn", lambda x: x.sum(min_count=1)),
+                                                                    RowsOut=("rowsOut", lambda x: x.sum(min_count=1)),
+                                                                    PeakMemoryMB=("peakMemoryMB", "max"))
+            logMessage("Run Stage Summary - " + runStatus + " - " + runEndTime + "\n" + df_summary.to_string())
+
+        runManifest = {"script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+                       "eddLayout": config.eddLayout,
+                       "runStatus": runStatus,
+                       "startTime": runStartTime,
+                       "endTime": runEndTime,
+                       "inputFile": config.inputFile,
+                       "rawDataSheet": config.rawDataSheet,
+                       "soilsDB": config.soilsDB,
+                       "logFileName": config.logFileName,
+                       "parameters": {"transformEngine": config.transformEngine, "preflightOnly": config.preflightOnly, "dryRun": config.dryRun, "applyQC": config.applyQC,
+                                      "applyOutlierFlags": config.applyOutlierFlags, "trackStageMemory": config.trackStageMemory},
+                       "versions": {"python": sys.version.split()[0], "pandas": pd.__version__, "numpy": np.__version__},
+                       "stages": stageRecords}
+        with open(config.runManifestName, "w") as manifestFile:
+            json.dump(runManifest, manifestFile, indent=2, default=str)
+
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  writeRunReport - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
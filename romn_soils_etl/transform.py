@@ -0,0 +1,342 @@
+# ---------------------------------------------------------------------------
+# transform.py
+# Description:  Transform the EDD tables to the 'tbl_SoilChemistry_Dataset' format - stack, join the event metadata and crosswalk lookup fields and clean the values.
+# ---------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage, StageTimer, countRows
+from romn_soils_etl.lookups import checkFieldNameCrossWalk
+
+#Routine to Join the metadata Data Frame to EDD Dataframes, and prep final dataframe to be appended and Append the DataFrame.
+def joinMetadataToDataframes(df_wVCSS_wWEI, datasetList, crossWalkList):
+    try:
+        ##########################################
+        # Join metadata dataframe 'df_wVCSS_wWEI' with data dataframes (i.e. df_FirstDataset and df_SecondDataset) - returns the list of final dataframes to append
+        ##########################################
+        loopCount = 0
+        dfs_final = []
+        for dataset in datasetList:
+
+            ################################################
+            # Define Field List to be Stacked - all fields except 'Lab ID' and 'Sample ID'
+            fieldCrossWalkToStack = [field for field in crossWalkList[loopCount] if field not in ("Lab ID", "Sample ID")]
+
+            ########################################################################################
+            # Verify fields in dataset have been defined in the 'tlu_NameUnitCrossWalk' lookup table - pass the Parameters with data
+            df_parametersWithData = pd.DataFrame({"ParameterRaw": [field for field in fieldCrossWalkToStack if dataset[field].notna().any()]})
+            with StageTimer("checkFieldNameCrossWalk", rowsIn=df_parametersWithData.shape[0], eddTable=loopCount):
+                outVal = checkFieldNameCrossWalk(df_parametersWithData)
+            if outVal[0].lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function 'checkFieldNameCrossWalk' - " + str(
+                    messageTime) + " - Failed - loopCount:" + str(loopCount) + " - Exiting Script", "WARNING", eddTable=loopCount)
+                return "failed function", "Null"
+            else:
+                # Return datafdrame with fieldCrosswalk defined
+                df_wFieldCrossWalk = outVal[1]
+                messageTime = timeFun()
+                scriptMsg = ("Success - Function 'checkFieldNameCrossWalk' - looCount: " + str(
+                    loopCount) + " - " + messageTime)
+                logMessage(scriptMsg, eddTable=loopCount)
+            ######################################################################################
+
+            # Check for Records without a matching Eventname - samples with data not in the metadata dataframe
+            df_samplesWithData = dataset.loc[dataset[fieldCrossWalkToStack].notna().any(axis=1), ["Sample ID"]]
+            df_noEventName = df_samplesWithData[~df_samplesWithData["Sample ID"].isin(df_wVCSS_wWEI["SampleName_ROMN"])]
+
+            rowCount = df_noEventName.shape[0]
+            if rowCount > 0:  # No EventName defined
+
+                messageTime = timeFun()
+                scriptMsg = (
+                        "WARNING - Records don't have an EVENTNAME Defined in - existing script - " + messageTime)
+                logMessage(scriptMsg, "WARNING", eddTable=loopCount)
+
+                # Looper through 'df_noEventName' to log the samples without an EventName
+                for index, row in df_noEventName.iterrows():
+                    scriptMsg = ('WARNING - Sample: ' + str(row['Sample ID']) + " - doesn't have a defined EventName")
+                    logMessage(scriptMsg, "WARNING", eddTable=loopCount, record=str(row['Sample ID']))
+
+                return "failed function", "Null"
+
+            # Transform the EDD table to the 'tbl_SoilChemistry_Dataset' format via the 'transformEngine' - in slices of 'transformChunkSamples' samples for large tables
+            transformFunction = transformDataset_Polars if config.transformEngine.lower() == "polars" else transformDataset_Pandas
+            with StageTimer("transformDataset", rowsIn=dataset.shape[0], eddTable=loopCount) as timer:
+                if config.transformChunkSamples is not None and dataset.shape[0] > config.transformChunkSamples:
+                    outVal = transformDatasetChunked(dataset, fieldCrossWalkToStack, df_wVCSS_wWEI, df_wFieldCrossWalk, transformFunction, loopCount)
+                else:
+                    outVal = transformFunction(dataset, fieldCrossWalkToStack, df_wVCSS_wWEI, df_wFieldCrossWalk)
+                timer.rowsOut = countRows(outVal)
+            if outVal[0].lower() != "success function":
+                messageTime = timeFun()
+                logMessage("WARNING - Function 'transformDataset' - " + str(messageTime) + " - Failed - loopCount:" + str(loopCount) + " - Exiting Script", "WARNING",
+                           eddTable=loopCount)
+                return "failed function", "Null"
+            else:
+                df_ToAppendFinal2 = outVal[1]
+
+            # Non-detects ('<' values) - excluded or the only records appended per the 'nonDetectMode'
+            if config.nonDetectMode is not None:
+                df_ToAppendFinal2 = processNonDetects(df_ToAppendFinal2, loopCount)
+            dfs_final.append(df_ToAppendFinal2)
+
+            loopCount += 1
+        return "success function", dfs_final
+
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error joinMetadataToDataframes - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Transform an EDD table in slices of 'transformChunkSamples' samples - each slice is stacked, joined to the metadata and crosswalk lookups and cleaned on its own so the
+#transform copies are bounded by the slice size.  The metadata lookup is subset once to the table samples and shared by the slices with the crosswalk lookup.
+#The slices are returned in the stacked order of a one pass transform (parameter then sample order).
+def transformDatasetChunked(dataset, fieldCrossWalkToStack, df_wVCSS_wWEI, df_wFieldCrossWalk, transformFunction, loopCount):
+    try:
+        chunkSamples = max(int(config.transformChunkSamples), 1)
+        sampleNames = set(dataset["Sample ID"].astype(str))
+        df_metadata = df_wVCSS_wWEI.loc[df_wVCSS_wWEI["SampleName_ROMN"].astype(str).isin(sampleNames),
+                                        ["Protocol_ROMN", "SampleName_ROMN", "EventName", "SiteName", "StartDate"]].reset_index(drop=True)
+
+        dfs_chunk = []
+        for startRow in range(0, dataset.shape[0], chunkSamples):
+            outVal = transformFunction(dataset.iloc[startRow:startRow + chunkSamples], fieldCrossWalkToStack, df_metadata, df_wFieldCrossWalk)
+            if outVal[0].lower() != "success function":
+                return "failed function", "Null"
+            dfs_chunk.append(outVal[1])
+
+        # Stacked order of a one pass transform - stable sort of the slice records on the stacked field position
+        df_chunked = pd.concat(dfs_chunk)
+        del dfs_chunk[:]
+        fieldPosition = pd.Categorical(df_chunked["ParameterRaw"], categories=fieldCrossWalkToStack).codes
+        df_chunked = df_chunked.take(np.argsort(fieldPosition, kind="stable"))
+
+        messageTime = timeFun()
+        scriptMsg = ("Chunked transform - " + str(dataset.shape[0]) + " samples in " + str(-(-dataset.shape[0] // chunkSamples)) + " slices of " + str(chunkSamples) +
+                     " - " + str(df_chunked.shape[0]) + " records - " + messageTime)
+        logMessage(scriptMsg, eddTable=loopCount)
+        return "success function", df_chunked
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  transformDatasetChunked - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Transform an EDD table to the 'tbl_SoilChemistry_Dataset' format with pandas - stack (melt), join metadata and lookup fields, add the dataset fields and clean values
+def transformDataset_Pandas(dataset, fieldCrossWalkToStack, df_wVCSS_wWEI, df_wFieldCrossWalk):
+    try:
+        # Create Stacked Data Frame
+        df_melt = pd.melt(dataset, id_vars="Sample ID", var_name="ParameterRaw",
+                          value_vars=fieldCrossWalkToStack, value_name="Value")
+
+        # Remove Records with null value in 'df_melt
+        df_melt2 = df_melt.dropna(subset=['Value'])
+        df_melt2.reset_index(drop=True, inplace=True)
+        del (df_melt)
+        #################################################
+
+        # Join (via merge) stacked output (i.e. 'df_melt') with the metadata dataframe
+        df_stack_wMetadata = pd.merge(df_melt2, df_wVCSS_wWEI, how='left', left_on='Sample ID',
+                                      right_on='SampleName_ROMN', suffixes=("_data", "_metadata"))
+
+        # Subset to the desire fields to be append to 'tbl_SoilChemistry_Dataset'
+        df_ToAppend = df_stack_wMetadata[
+            ["Protocol_ROMN", "SiteName", "EventName", "StartDate", "ParameterRaw", "Value"]]
+        del (df_stack_wMetadata)
+
+        # Add Year Sampled Field
+        df_ToAppend.insert(4, 'YearSampled', None)
+        # Define Year Sampled
+        df_ToAppend['YearSampled'] = df_ToAppend['StartDate'].dt.strftime('%Y')
+
+        # Format Start Year to 'm/d/yyyy' as Date Time
+        # df_ToAppend['StartDate'] = df_ToAppend['StartDate'].dt.strftime('%m/%d/%Y')
+        df_ToAppend['StartDate'] = pd.to_datetime(df_ToAppend['StartDate'], format='%m/%d/%Y')
+
+        # Join the Parameter Name and Unit fields (i.e. UnitRaw, ParameterDataset and UnitDataset) dataframe (i.e. df_wFieldCrossWalk) with the 'df_ToAppend' dataframe
+        # Join (via merge) stacked output (i.e. 'df_melt') with the metadata dataframe
+        df_ToAppend_wLookup = pd.merge(df_ToAppend, df_wFieldCrossWalk, how='left', left_on='ParameterRaw',
+                                       right_on='ParameterRaw', suffixes=("_data", "_lookup"))
+
+        # Cleanup 'df_ToAppend_wLookup' to frame for Append - Match fields in tbl_SoilChemistry_Dataset
+        # Return Dataframe with the Lookup fields
+
+        df_ToAppendFinal = df_ToAppend_wLookup[
+            ["Protocol_ROMN", "SiteName", "EventName", "StartDate", "YearSampled", "ParameterRaw", "UnitRaw",
+             "ParameterDataset", "UnitDataset", "Value"]]  # With StartDate
+
+        #Add Fields to the stacked Dataframe
+        # Add Field - QC_Status
+        df_ToAppendFinal.insert(9, 'QC_Status', 0)
+
+        # Add Field - QC_Flag
+        df_ToAppendFinal.insert(10, 'QC_Flag', "")
+
+        # Add Field - QC_Notes
+        df_ToAppendFinal.insert(11, 'QC_Notes', "")
+
+        # Add Field - DataFlag
+        df_ToAppendFinal.insert(12, 'DataFlag', "Null")
+
+        # Add Field - Count
+        df_ToAppendFinal.insert(13, 'Count', 1)
+
+        # Add Field - StDev - All records are from one sample
+        df_ToAppendFinal.insert(14, 'StDev', -999)
+
+        # Add Field - StErr
+        df_ToAppendFinal.insert(15, 'STErr', -999)
+
+        # Define Categorical parameters via the 'Categorical' attribute in the 'tlu_NameUnitCrossWalk' lookup - ParameterRaw is mapped to
+        # the crosswalk category codes once and the Categorical flag is taken by array lookup on the codes
+        df_typeLookup = df_wFieldCrossWalk.drop_duplicates(subset=["ParameterRaw"])
+        parameterCodes = pd.Categorical(df_ToAppendFinal["ParameterRaw"], categories=df_typeLookup["ParameterRaw"]).codes
+        isCategorical = df_typeLookup["Categorical"].to_numpy(dtype=bool)[parameterCodes]
+
+        # Add Field - Min
+        # df_ToAppendFinal.insert(14, 'Min', df_ToAppendFinal["Value"])
+        # If Categorical (i.e. Lime, Texture or Peat) - set Min and Max to -999
+        df_ToAppendFinal["Min"] = np.where(isCategorical, -999, df_ToAppendFinal["Value"])
+
+        # Add Field - Max
+        # df_ToAppendFinal.insert(15, 'Max', df_ToAppendFinal["Value"])
+        df_ToAppendFinal["Max"] = np.where(isCategorical, -999, df_ToAppendFinal["Value"])
+
+        # Convert Value field to text
+        df_ToAppendFinal['Value'] = df_ToAppendFinal['Value'].apply(str)
+
+        # Convert 'YearSampled' to Integer
+        df_ToAppendFinal["YearSampled"] = pd.to_numeric(df_ToAppendFinal["YearSampled"], downcast="integer")
+
+        # Assigned noDataValue to 'ND' - no value for EDDs without a no data value (e.g. 'pre2022')
+        if config.noDataValue is not None:
+            df_ToAppendFinal["Value"] = df_ToAppendFinal["Value"].apply(lambda x: x.replace(config.noDataValue, "ND"))
+
+        df_ToAppendFinal["Value"] = df_ToAppendFinal["Value"].str.replace(" ", "")
+        # Remove fields with the No Data Value
+        df_ToAppendFinal2 = df_ToAppendFinal.loc[(df_ToAppendFinal['Value'] != 'ND')]
+
+        # Set Index field to the 'SiteName' field - will not be able to append to Soils dataset if Index column is present - SiteName is not unique but not relevant in this context
+        df_ToAppendFinal2.set_index("SiteName", inplace=True)
+
+        return "success function", df_ToAppendFinal2
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  transformDataset_Pandas - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Transform an EDD table to the 'tbl_SoilChemistry_Dataset' format as a lazy Polars (Arrow) query plan - same steps and output frame as 'transformDataset_Pandas'.
+#EDD cells mix numbers and text so the plan carries the text of each cell plus its stacked position, the original cell values for Min/Max are gathered by position after collect.
+def transformDataset_Polars(dataset, fieldCrossWalkToStack, df_wVCSS_wWEI, df_wFieldCrossWalk):
+    try:
+        try:
+            import polars as pl
+        except ImportError:
+            messageTime = timeFun()
+            scriptMsg = "WARNING - 'polars' is not installed - transform run with the pandas engine - " + messageTime
+            logMessage(scriptMsg)
+            return transformDataset_Pandas(dataset, fieldCrossWalkToStack, df_wVCSS_wWEI, df_wFieldCrossWalk)
+
+        recordCount = dataset.shape[0]
+        fieldCount = len(fieldCrossWalkToStack)
+
+        # Wide EDD values - stacked position of a cell is 'fieldIndex * recordCount + recordIndex' (i.e. pandas melt order)
+        valuesWide = dataset[fieldCrossWalkToStack].to_numpy(dtype=object)
+        valuesNotNull = pd.notna(valuesWide)
+        valuesText = valuesWide.astype(str)
+
+        wideFrame = {"Sample ID": pl.Series(dataset["Sample ID"].to_numpy(dtype=object).astype(str), dtype=pl.Utf8)}
+        for fieldIndex in range(fieldCount):
+            wideFrame[fieldCrossWalkToStack[fieldIndex]] = pl.Series(np.where(valuesNotNull[:, fieldIndex], valuesText[:, fieldIndex], None).tolist(), dtype=pl.Utf8)
+
+        df_fieldIndex = pl.LazyFrame({"ParameterRaw": fieldCrossWalkToStack, "__field": np.arange(fieldCount, dtype=np.int64)})
+
+        df_metadata = pl.from_pandas(df_wVCSS_wWEI[["Protocol_ROMN", "SampleName_ROMN", "EventName", "SiteName", "StartDate"]].astype(
+            {"Protocol_ROMN": object, "SampleName_ROMN": str, "EventName": object, "SiteName": object})).lazy().with_row_index("__metadataRow")
+
+        df_lookup = pl.from_pandas(df_wFieldCrossWalk[["ParameterRaw", "UnitRaw", "ParameterDataset", "UnitDataset", "Categorical"]].astype(
+            {"Categorical": bool})).lazy().with_row_index("__lookupRow")
+
+        # Query Plan - stack, drop null values, join metadata and lookup fields, define YearSampled and clean the Value text
+        noDataText = config.noDataValue if config.noDataValue is not None else "\x00"
+        df_plan = (pl.LazyFrame(wideFrame)
+                   .with_row_index("__record")
+                   .unpivot(on=fieldCrossWalkToStack, index=["Sample ID", "__record"], variable_name="ParameterRaw", value_name="ValueText")
+                   .filter(pl.col("ValueText").is_not_null())
+                   .join(df_fieldIndex, on="ParameterRaw", how="left")
+                   .with_columns((pl.col("__field") * recordCount + pl.col("__record").cast(pl.Int64)).alias("__position"))
+                   .join(df_metadata, left_on="Sample ID", right_on="SampleName_ROMN", how="left")
+                   .join(df_lookup, on="ParameterRaw", how="left")
+                   .with_columns(pl.col("StartDate").dt.strftime("%Y").alias("YearSampled"),
+                                 pl.col("ValueText").str.replace_all(noDataText, "ND", literal=True).str.replace_all(" ", "", literal=True).alias("Value"))
+                   .filter(pl.col("Value") != "ND")
+                   .sort(["__position", "__metadataRow", "__lookupRow"], nulls_last=True)
+                   .select(["Protocol_ROMN", "SiteName", "EventName", "StartDate", "YearSampled", "ParameterRaw", "UnitRaw",
+                            "ParameterDataset", "UnitDataset", "Value", "Categorical", "__position"]))
+
+        df_collected = df_plan.collect()
+
+        # Original cell values for Min/Max gathered by stacked position
+        position = df_collected["__position"].to_numpy()
+        valuesStacked = valuesWide.ravel(order="F")[position]
+        isCategorical = df_collected["Categorical"].fill_null(False).to_numpy()
+
+        def toObject(fieldName):
+            return np.array(df_collected[fieldName].to_list(), dtype=object)
+
+        df_ToAppendFinal2 = pd.DataFrame({"Protocol_ROMN": toObject("Protocol_ROMN"),
+                                          "SiteName": toObject("SiteName"),
+                                          "EventName": toObject("EventName"),
+                                          "StartDate": pd.to_datetime(df_collected["StartDate"].to_numpy()),
+                                          "YearSampled": pd.to_numeric(pd.Series(toObject("YearSampled")), downcast="integer"),
+                                          "ParameterRaw": toObject("ParameterRaw"),
+                                          "UnitRaw": toObject("UnitRaw"),
+                                          "ParameterDataset": toObject("ParameterDataset"),
+                                          "UnitDataset": toObject("UnitDataset"),
+                                          "QC_Status": 0,
+                                          "QC_Flag": "",
+                                          "QC_Notes": "",
+                                          "DataFlag": "Null",
+                                          "Count": 1,
+                                          "StDev": -999,
+                                          "STErr": -999,
+                                          "Value": toObject("Value"),
+                                          "Min": np.where(isCategorical, -999, valuesStacked),
+                                          "Max": np.where(isCategorical, -999, valuesStacked)})
+
+        # Set Index field to the 'SiteName' field - will not be able to append to Soils dataset if Index column is present
+        df_ToAppendFinal2.set_index("SiteName", inplace=True)
+
+        return "success function", df_ToAppendFinal2
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  transformDataset_Polars - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#Non-detects - lab values with a '<' prefix (e.g. GLORIA samples below the detection limit).  'exclude' drops the non-detect records (append the detected results
+#first), 'only' retains only the non-detect records with the '<' removed, 'DataFlag' set to '<' and no Min/Max.
+def processNonDetects(df_ToAppendFinal2, loopCount):
+    isNonDetect = df_ToAppendFinal2['Value'].str.contains('<', case=False, na=False, regex=False)
+    if config.nonDetectMode == "exclude":
+        df_out = df_ToAppendFinal2[~isNonDetect]
+    else:
+        df_out = df_ToAppendFinal2[isNonDetect].copy()
+        df_out['Value'] = df_out['Value'].str.replace('<', '', regex=False).str.strip()
+        df_out['DataFlag'] = "<"
+        df_out['Min'] = pd.NA
+        df_out['Max'] = pd.NA
+
+    messageTime = timeFun()
+    scriptMsg = ("Non-detects - '" + config.nonDetectMode + "' - " + str(int(isNonDetect.sum())) + " non-detect records of " + str(df_ToAppendFinal2.shape[0]) +
+                 " - records retained: " + str(df_out.shape[0]) + " - " + messageTime)
+    logMessage(scriptMsg, eddTable=loopCount)
+    return df_out
@@ -0,0 +1,156 @@
+# ---------------------------------------------------------------------------
+# validate.py
+# Description:  Preflight validation of the extracted EDD tables - crosswalk coverage, event resolution, EDD consistency, header mismatches and no data counts.
+# ---------------------------------------------------------------------------
+import os
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.runlog import timeFun, logMessage
+from romn_soils_etl.lookups import getNameUnitCrossWalk
+
+#Preflight Validation - runs all checks across all EDD tables in one pass and returns a report dataframe (Check, Severity, EDDTable, Item, Count, Detail)
+#Checks: crosswalk coverage, event resolution, duplicate samples, header mismatches and no data counts.  Rows with Severity 'Error' stop the run.
+def runPreflight(datasetList, crossWalkList, headerList, df_wVCSS_wWEI):
+    try:
+        reportRecords = []
+
+        #Crosswalk lookup table - cached
+        outVal = getNameUnitCrossWalk()
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function getNameUnitCrossWalk - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function", "Null"
+        crossWalkParameters = set(outVal[1]["ParameterNative"].dropna())
+
+        #EDD Consistency - duplicates, orphans, Lab ID/Sample ID mismatches and conflicting values across the EDD tables
+        outVal = checkEDDConsistency(datasetList, crossWalkList)
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Function checkEDDConsistency - " + messageTime + " - Failed - Exiting Script", "WARNING")
+            return "failed function", "Null"
+        reportRecords.extend(outVal[1])
+
+        #Event Resolution - samples without an event in the VCSS, WEI or GLORIA indexes or the metadata override file
+        df_noEvent = df_wVCSS_wWEI[df_wVCSS_wWEI["EventName"] == "TBD"]
+        overrideNote = " - fill the event in: " + os.path.basename(config.metadataOverrideFile) if config.applyMetadataOverrides else ""
+        for index, row in df_noEvent.iterrows():
+            reportRecords.append(["EventResolution", "Error", None, row["SampleName_ROMN"], 1, "Lab ID: " + str(row["SampleName_Lab"]) + " - undefined event" + overrideNote])
+        resolvedSamples = set(df_wVCSS_wWEI["SampleName_ROMN"])
+
+        loopCount = 0
+        for dataset in datasetList:
+
+            fieldCrossWalkToStack = [field for field in crossWalkList[loopCount] if field not in ("Lab ID", "Sample ID")]
+            df_values = dataset[fieldCrossWalkToStack]
+            valuesNotNull = df_values.notna()
+
+            #Crosswalk Coverage - parameters with data not defined in 'tlu_NameUnitCrossWalk'
+            for field in fieldCrossWalkToStack:
+                if field not in crossWalkParameters and valuesNotNull[field].any():
+                    reportRecords.append(["CrosswalkCoverage", "Error", loopCount, field, int(valuesNotNull[field].sum()), "Parameter is not defined in table 'tlu_NameUnitCrossWalk'"])
+
+            #Event Resolution - samples with data not in the metadata dataframe
+            samplesWithData = dataset.loc[valuesNotNull.any(axis=1), "Sample ID"]
+            for sample in samplesWithData[~samplesWithData.isin(resolvedSamples)].unique():
+                reportRecords.append(["EventResolution", "Error", loopCount, sample, 1, "Sample is not in the event metadata - no EventName"])
+
+            #Header Mismatch - EDD header labels which differ from the defined field names (expected where field names are harmonized, e.g. '(ppm)' suffix)
+            for headerLabel, field in zip(headerList[loopCount], crossWalkList[loopCount]):
+                if pd.isna(headerLabel):
+                    continue
+                if " ".join(str(headerLabel).split()).lower() != " ".join(field.split()).lower():
+                    reportRecords.append(["HeaderMismatch", "Warning", loopCount, field, 1, "EDD header label: '" + str(headerLabel) + "'"])
+
+            #No Data Counts - empty cells and cells dropped as the 'noDataValue' (same rule as the transform - value text 'ND' after replacing 'noDataValue')
+            for field in fieldCrossWalkToStack:
+                nullCount = int((~valuesNotNull[field]).sum())
+                noDataCount = 0
+                if config.noDataValue is not None:
+                    valueText = df_values.loc[valuesNotNull[field], field].astype(str)
+                    noDataCount = int((valueText.str.replace(config.noDataValue, "ND", regex=False).str.replace(" ", "", regex=False) == "ND").sum())
+                if nullCount > 0 or noDataCount > 0:
+                    reportRecords.append(["NoDataCount", "Info", loopCount, field, nullCount + noDataCount, "Empty: " + str(nullCount) + " - No Data Value: " + str(noDataCount)])
+
+            loopCount += 1
+
+        df_preflightReport = pd.DataFrame(reportRecords, columns=["Check", "Severity", "EDDTable", "Item", "Count", "Detail"])
+
+        #Write the report to the workspace
+        df_preflightReport.to_csv(config.preflightReportName, index=False)
+
+        messageTime = timeFun()
+        severityCounts = df_preflightReport["Severity"].value_counts()
+        scriptMsg = ("Preflight Report - Errors: " + str(int(severityCounts.get("Error", 0))) + " - Warnings: " + str(int(severityCounts.get("Warning", 0))) +
+                     " - Info: " + str(int(severityCounts.get("Info", 0))) + " - " + config.preflightReportName + " - " + messageTime)
+        logMessage(scriptMsg)
+
+        return "success function", df_preflightReport
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  runPreflight - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
+
+#EDD consistency checks across all extracted tables in one pass - the tables are stacked to one long dataframe (Sample, Parameter, Value) and checked
+#with hashed group keys for:  repeated Lab ID/Sample ID records in a table (Error), Sample IDs with more than one Lab ID or Lab IDs with more than one
+#Sample ID (Error), samples missing from an EDD table (Warning), parameters reported in more than one table (Warning) and a sample/parameter reported
+#with different values (Error).  Returns the preflight report records.
+def checkEDDConsistency(datasetList, crossWalkList):
+    try:
+        reportRecords = []
+
+        #Stack the EDD tables - one record per Lab ID, Sample ID, Parameter with a value
+        stackedList = []
+        for loopCount, dataset in enumerate(datasetList):
+            fieldCrossWalkToStack = [field for field in crossWalkList[loopCount] if field not in ("Lab ID", "Sample ID")]
+            df_table = dataset[["Lab ID", "Sample ID"] + fieldCrossWalkToStack].copy()
+            df_table.insert(0, "EDDTable", loopCount)
+            df_table.insert(1, "TableRow", np.arange(df_table.shape[0]))
+            stackedList.append(df_table.melt(id_vars=["EDDTable", "TableRow", "Lab ID", "Sample ID"], var_name="ParameterRaw", value_name="Value"))
+        df_stacked = pd.concat(stackedList, ignore_index=True)
+        df_stacked = df_stacked[df_stacked["Value"].notna() & df_stacked["Sample ID"].notna()]
+        # Values compared as numbers where numeric (e.g. '6' and 6.0 are the same value), else as the stripped text
+        valueNumeric = pd.to_numeric(df_stacked["Value"], errors="coerce")
+        df_stacked["ValueText"] = valueNumeric.astype(str).where(valueNumeric.notna(), df_stacked["Value"].astype(str).str.strip())
+        df_stacked["SampleKey"] = pd.util.hash_array(df_stacked["Sample ID"].astype(str).to_numpy(dtype=object))
+
+        #Duplicate Samples - repeated Lab ID/Sample ID records in an EDD table
+        df_rows = df_stacked.drop_duplicates(subset=["EDDTable", "TableRow"])
+        df_duplicatesGB = df_rows.groupby(["EDDTable", "Lab ID", "Sample ID"], as_index=False).size()
+        for row in df_duplicatesGB[df_duplicatesGB["size"] > 1].itertuples(index=False):
+            reportRecords.append(["DuplicateSample", "Error", row[0], row[2], int(row[3]), "Lab ID: " + str(row[1]) + " - repeated in the EDD table"])
+
+        #Lab ID/Sample ID Mismatch - a Sample ID with more than one Lab ID (or the reverse) across the EDD tables
+        df_pairs = df_rows[["Lab ID", "Sample ID", "SampleKey"]].drop_duplicates(subset=["Lab ID", "Sample ID"])
+        for keyField, otherField in (("Sample ID", "Lab ID"), ("Lab ID", "Sample ID")):
+            df_pairCount = df_pairs.groupby(keyField)[otherField].agg(["size", lambda x: ", ".join(x.astype(str))])
+            for item, row in df_pairCount[df_pairCount["size"] > 1].iterrows():
+                reportRecords.append(["LabSampleMismatch", "Error", None, item, int(row.iloc[0]), otherField + " values: " + row.iloc[1]])
+
+        #Orphan Samples - samples with data in some EDD tables but not all
+        tableCount = len(datasetList)
+        df_sampleTables = df_rows.groupby("SampleKey").agg(SampleID=("Sample ID", "first"), Tables=("EDDTable", lambda x: sorted(set(x))))
+        for row in df_sampleTables[df_sampleTables["Tables"].map(len) < tableCount].itertuples():
+            missingTables = [str(table) for table in range(tableCount) if table not in row.Tables]
+            reportRecords.append(["OrphanSample", "Warning", None, row.SampleID, len(missingTables), "No data in EDD table(s): " + ", ".join(missingTables)])
+
+        #Parameters reported in more than one EDD table, and conflicting values for the same sample/parameter
+        df_parameterTables = df_stacked.groupby("ParameterRaw")["EDDTable"].nunique()
+        for parameter, count in df_parameterTables[df_parameterTables > 1].items():
+            reportRecords.append(["ParameterInMultipleTables", "Warning", None, parameter, int(count), "Parameter is reported in more than one EDD table"])
+
+        df_values = df_stacked.groupby(["SampleKey", "ParameterRaw"]).agg(SampleID=("Sample ID", "first"), ValueCount=("ValueText", "nunique"),
+                                                                           Values=("ValueText", lambda x: ", ".join(sorted(set(x)))))
+        for (sampleKey, parameter), row in df_values[df_values["ValueCount"] > 1].iterrows():
+            reportRecords.append(["ConflictingValue", "Error", None, row["SampleID"], int(row["ValueCount"]), "Parameter: " + str(parameter) + " - values: " + row["Values"]])
+
+        return "success function", reportRecords
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  checkEDDConsistency - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function", "Null"
@@ -0,0 +1,271 @@
+# ---------------------------------------------------------------------------
+# watch.py
+# Description:  Watch mode - polls the 'watchInbox' folder and processes each new EDD workbook with the 'watchAction' (preflight, dry run or append) as it arrives.
+# Code performs the following routines:
+# Polls the inbox every 'watchPollSeconds' - a workbook is ready once its size and modified time are unchanged for 'watchDebounceSeconds' and it can be read
+# (e.g. not still being copied).  Each ready workbook is fingerprinted (content hash) - a workbook already processed with the same action is moved to the outbox
+# as a duplicate.  Otherwise the workbook (and its '<workbook>.toml'/'.yaml' run file) is moved to a folder per workbook in the 'watchOutbox', run with
+# 'pipeline.main' with the run outputs written to that folder, and the run status recorded in the run journal ('tbl_WatchFiles') and 'Watch_Results.csv'.
+# The lookup caches (crosswalk, event indexes, history statistics) and the Soils DB connections are kept in this process between workbooks, and rebuilt after
+# 'watchCacheRefreshMinutes' or when a workbook run file changes the Soils DB or EDD layout.  Watcher messages are logged to 'Soils_ETL_Watch_logfile.jsonl' in the outbox.
+
+# Usage:  python -m romn_soils_etl --watch C:\ETL\Inbox --soils-db Soils.accdb --workspace C:\ETL [--watch-action preflight|dryRun|append] [--watch-once]
+# ---------------------------------------------------------------------------
+import os
+import time
+import shutil
+import hashlib
+import zipfile
+import pandas as pd
+
+from romn_soils_etl import config, journal
+from romn_soils_etl.runlog import timeFun, logMessage, flushRunLog
+from romn_soils_etl.lookups import lookupCache, getNameUnitCrossWalk
+from romn_soils_etl.db import getSoilsDBEngine, disposeEngines
+
+#EDD workbook and workbook run file extensions
+workbookExtensions = (".xlsx", ".xlsm", ".xls")
+runFileExtensions = (".toml", ".yaml", ".yml")
+#Run parameters per watch action
+watchActionParameters = {"preflight": {"preflightOnly": True}, "dryRun": {"dryRun": True}, "append": {}}
+#Run statuses of a processed workbook - the same workbook dropped again is a duplicate for the action (failed runs are processed again)
+processedStatuses = ("Preflight Only", "Dry Run", "Appended")
+#Run statuses reported as failed by '--watch-once'
+failedStatuses = ("Failed", "Preflight Errors", "Load Interrupted")
+
+#Warm cache state - the parameters the lookup caches were built with and the build time
+warmCacheState = {}
+
+#Watch the inbox and process the new workbooks - 'watchParameters' are the run parameters applied to every workbook (with the 'watch*' parameters).
+#Runs until interrupted (Ctrl+C), or with 'watchOnce' until the workbooks in the inbox are processed.  Returns the list of run records.
+def watchInbox(watchParameters):
+    try:
+        setWatchParameters(watchParameters)
+        if config.watchAction not in watchActionParameters:
+            messageTime = timeFun()
+            logMessage("WARNING - Watch action: '" + str(config.watchAction) + "' is not defined (" + str(list(watchActionParameters)) + ") - Exiting Script - " + messageTime, "WARNING")
+            return "failed function", "Null"
+        inboxFolder = config.watchInbox
+        pollSeconds = config.watchPollSeconds
+        debounceSeconds = config.watchDebounceSeconds
+        watchOnce = config.watchOnce
+
+        warmCaches(watchParameters)
+        messageTime = timeFun()
+        scriptMsg = ("Watching Inbox: " + inboxFolder + " - action: " + config.watchAction + " - outbox: " + config.watchOutbox + " - " + messageTime)
+        logMessage(scriptMsg)
+        flushRunLog()
+
+        # Workbook signatures (size, modified time) and the time the signature was first seen - a workbook is ready when unchanged for the debounce interval
+        pendingFiles = {}
+        resultRecords = []
+        try:
+            while True:
+                pollTime = time.monotonic()
+                readyFiles = []
+                inboxFiles = set()
+                for entry in os.scandir(inboxFolder):
+                    if not entry.is_file() or entry.name.startswith("~$") or not entry.name.lower().endswith(workbookExtensions):
+                        continue
+                    inboxFiles.add(entry.path)
+                    fileStat = entry.stat()
+                    signature = (fileStat.st_size, fileStat.st_mtime_ns)
+                    if entry.path not in pendingFiles or pendingFiles[entry.path][0] != signature:
+                        pendingFiles[entry.path] = (signature, pollTime)
+                    elif pollTime - pendingFiles[entry.path][1] >= debounceSeconds:
+                        if workbookReadable(entry.path):
+                            readyFiles.append(entry.path)
+                        else:
+                            pendingFiles[entry.path] = (signature, pollTime)
+
+                for inputFile in list(pendingFiles):
+                    if inputFile not in inboxFiles:
+                        del pendingFiles[inputFile]
+
+                for inputFile in sorted(readyFiles, key=lambda inputFile: pendingFiles[inputFile][0][1]):
+                    resultRecords.append(processWorkbook(inputFile, watchParameters))
+                    pendingFiles.pop(inputFile, None)
+
+                if watchOnce and not pendingFiles:
+                    break
+
+                # Caches rebuilt while the inbox is idle so the next workbook does not wait on the Soils DB queries
+                if not pendingFiles and time.time() - warmCacheState.get("buildTime", 0) > config.watchCacheRefreshMinutes * 60:
+                    warmCaches(watchParameters)
+                flushRunLog()
+                time.sleep(pollSeconds)
+
+        except KeyboardInterrupt:
+            messageTime = timeFun()
+            logMessage("Watch stopped - " + str(len(resultRecords)) + " workbooks processed - " + messageTime)
+
+        setWatchParameters(watchParameters)
+        disposeEngines()
+        lookupCache.clear()
+        warmCacheState.clear()
+        flushRunLog()
+        return "success function", resultRecords
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  watchInbox - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        flushRunLog()
+        return "failed function", "Null"
+
+#Set the watch parameters in 'config' (between the workbook runs) - the watcher messages are logged to the outbox watch logfile
+def setWatchParameters(watchParameters):
+    from romn_soils_etl import pipeline
+
+    pipeline.resetRunState(clearCaches=False)
+    config.resetParameters()
+    config.setParameters(**watchParameters)
+    config.defineOutputNames()
+    for folder in (config.workspace, config.watchOutbox):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    config.setParameters(logFileName=os.path.join(config.watchOutbox, "Soils_ETL_Watch_logfile.jsonl"))
+
+#Workbook readable - an '.xlsx'/'.xlsm' workbook still being copied is not a complete zip file, and a workbook locked by the copy cannot be opened
+def workbookReadable(inputFile):
+    try:
+        if inputFile.lower().endswith((".xlsx", ".xlsm")):
+            return zipfile.is_zipfile(inputFile)
+        with open(inputFile, "rb") as inFile:
+            inFile.read(1)
+        return True
+    except OSError:
+        return False
+
+#Fingerprint of a workbook - SHA-1 of the file content (a renamed copy has the same fingerprint)
+def fingerprintWorkbook(inputFile):
+    fileHash = hashlib.sha1()
+    with open(inputFile, "rb") as inFile:
+        for block in iter(lambda: inFile.read(1024 * 1024), b""):
+            fileHash.update(block)
+    return fileHash.hexdigest()
+
+#Build the lookup caches (crosswalk, event indexes and history statistics) and open the Soils DB connection for the watch parameters.  The caches are cleared
+#first when built for other parameters or older than 'watchCacheRefreshMinutes'.  A failed build is logged - the caches are then built by the next workbook run.
+def warmCaches(watchParameters):
+    from romn_soils_etl.metadata import getEventIndexes
+    from romn_soils_etl.outliers import getHistoryStats
+
+    try:
+        setWatchParameters(watchParameters)
+        refreshWarmCaches()
+        if config.soilsDB is None:
+            return "success function"
+
+        outVal = getNameUnitCrossWalk()
+        if outVal[0].lower() == "success function":
+            outVal = getEventIndexes()
+        if outVal[0].lower() == "success function" and config.applyOutlierFlags:
+            outVal = getHistoryStats()
+        if outVal[0].lower() != "success function":
+            messageTime = timeFun()
+            logMessage("WARNING - Watch lookup caches not built - built by the next workbook run - " + messageTime, "WARNING")
+            return "failed function"
+        if config.watchAction == "append":
+            with getSoilsDBEngine(config.soilsDB).connect():
+                pass
+
+        messageTime = timeFun()
+        logMessage("Watch lookup caches built - " + ", ".join(sorted(lookupCache)) + " - " + messageTime)
+        return "success function"
+
+    except:
+        messageTime = timeFun()
+        scriptMsg = "Error function:  warmCaches - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return "failed function"
+
+#Clear the lookup caches and Soils DB connections when built for other parameters (e.g. a workbook run file with another EDD layout) or older than 'watchCacheRefreshMinutes'
+def refreshWarmCaches():
+    cacheKey = (config.soilsDB, config.soilsDatasetTable, config.eddLayout, config.gloriaEventsQuery, config.crossWalkTypeField, config.historyStatsName)
+    if warmCacheState.get("cacheKey") != cacheKey or time.time() - warmCacheState["buildTime"] > config.watchCacheRefreshMinutes * 60:
+        lookupCache.clear()
+        disposeEngines()
+        warmCacheState["cacheKey"] = cacheKey
+        warmCacheState["buildTime"] = time.time()
+
+#Process a ready workbook - duplicate check, move to the outbox folder of the workbook and run 'pipeline.main' with the warm caches.  Returns the run record.
+def processWorkbook(inputFile, watchParameters):
+    from romn_soils_etl import pipeline
+    from romn_soils_etl.cli import readRunFile, getRunRecord
+
+    resultRecord = {"inputFile": inputFile, "runStatus": "Failed", "runManifestName": None, "logFileName": None}
+    try:
+        setWatchParameters(watchParameters)
+        watchAction = config.watchAction
+        workbookName = os.path.splitext(os.path.basename(inputFile))[0]
+        runFiles = [os.path.join(config.watchInbox, workbookName + extension) for extension in runFileExtensions
+                    if os.path.exists(os.path.join(config.watchInbox, workbookName + extension))]
+
+        fingerprint = fingerprintWorkbook(inputFile)
+        priorRun = journal.getWatchFile(fingerprint, watchAction, processedStatuses)
+        folderTime = timeFun().replace(":", "").replace("-", "").replace(".", "")
+        outboxFolder = os.path.join(config.watchOutbox, workbookName + "_" + folderTime + ("" if priorRun is None else "_Duplicate"))
+        os.makedirs(outboxFolder)
+        for fileName in [inputFile] + runFiles:
+            shutil.move(fileName, os.path.join(outboxFolder, os.path.basename(fileName)))
+        workbookFile = os.path.join(outboxFolder, os.path.basename(inputFile))
+
+        if priorRun is not None:
+            resultRecord = {"inputFile": workbookFile, "runStatus": "Duplicate", "runManifestName": None, "logFileName": None}
+            messageTime = timeFun()
+            scriptMsg = ("WARNING - Workbook: " + os.path.basename(inputFile) + " was processed (" + watchAction + ") as: " + priorRun[0] + " - " + priorRun[1] +
+                         " - outbox: " + priorRun[2] + " - not processed again - moved to: " + outboxFolder + " - " + messageTime)
+            logMessage(scriptMsg, "WARNING")
+        else:
+            # Run parameters - the watch parameters, the workbook run file and the action, with the run outputs in the outbox folder
+            runParameters = dict(watchParameters)
+            if runFiles:
+                outVal = readRunFile(os.path.join(outboxFolder, os.path.basename(runFiles[0])))
+                if outVal[0].lower() != "success function":
+                    messageTime = timeFun()
+                    logMessage("WARNING - Workbook run file: " + os.path.basename(runFiles[0]) + " not read - workbook not processed - " + messageTime, "WARNING")
+                    runParameters = None
+                else:
+                    runParameters.update(outVal[1][0])
+
+            resultRecord["inputFile"] = workbookFile
+            if runParameters is not None:
+                runParameters.update(watchActionParameters[watchAction])
+                runParameters.update(inputFile=workbookFile, outputFolder=outboxFolder)
+
+                messageTime = timeFun()
+                logMessage("Processing Workbook: " + os.path.basename(inputFile) + " - action: " + watchAction + " - fingerprint: " + fingerprint + " - " + messageTime)
+                flushRunLog()
+
+                pipeline.resetRunState(clearCaches=False)
+                config.resetParameters()
+                config.setParameters(**runParameters)
+                config.defineOutputNames()
+                refreshWarmCaches()
+                pipeline.main()
+                resultRecord = getRunRecord()
+
+        setWatchParameters(watchParameters)
+        journal.recordWatchFile(fingerprint, watchAction, resultRecord["inputFile"], resultRecord["runStatus"], outboxFolder)
+        writeWatchResult(fingerprint, watchAction, resultRecord, outboxFolder)
+
+        messageTime = timeFun()
+        scriptMsg = ("Workbook: " + os.path.basename(inputFile) + " - " + resultRecord["runStatus"] + " - outbox: " + outboxFolder + " - " + messageTime)
+        logMessage(scriptMsg, "WARNING" if resultRecord["runStatus"] in failedStatuses else "INFO")
+        return resultRecord
+
+    except:
+        setWatchParameters(watchParameters)
+        messageTime = timeFun()
+        scriptMsg = "Error function:  processWorkbook - " + inputFile + " - " + messageTime
+        logMessage(scriptMsg, "ERROR", exc_info=True)
+        return resultRecord
+
+#Append the workbook run to the outbox 'Watch_Results.csv'
+def writeWatchResult(fingerprint, watchAction, resultRecord, outboxFolder):
+    resultsName = os.path.join(config.watchOutbox, "Watch_Results.csv")
+    df_result = pd.DataFrame([{"ProcessTime": timeFun(), "Workbook": os.path.basename(resultRecord["inputFile"]), "WatchAction": watchAction,
+                               "RunStatus": resultRecord["runStatus"], "Fingerprint": fingerprint, "OutboxFolder": outboxFolder,
+                               "RunManifest": resultRecord["runManifestName"]}])
+    df_result.to_csv(resultsName, mode="a", header=not os.path.exists(resultsName), index=False)
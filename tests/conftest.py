@@ -0,0 +1,132 @@
+# ---------------------------------------------------------------------------
+# conftest.py
+# Description:  pytest fixtures - the synthetic EDD workbooks and SQLite stand-in Soils DB written by 'benchmarks/ROMN_Soils_Synthetic_EDD.py' (generated once per
+# test session) and 'runEDD', which runs the pipeline on a synthetic EDD with a copy of the stand-in DB in the test workspace.
+# ---------------------------------------------------------------------------
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import pytest
+import pandas as pd
+
+#The synthetic EDD generator is in the benchmarks folder next to the 'romn_soils_etl' package
+repoFolder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoFolder, "benchmarks"))
+import ROMN_Soils_Synthetic_EDD as syntheticEDD
+
+from romn_soils_etl import config, pipeline
+
+#Samples per synthetic EDD
+sampleCount = 50
+
+#Synthetic EDD parameter records per EDD layout ('inputFile', 'rawDataSheet', 'soilsDB' and the 'scriptParameters')
+@pytest.fixture(scope="session")
+def syntheticSet(tmp_path_factory):
+    syntheticEDD.outputFolder = str(tmp_path_factory.mktemp("synthetic"))
+    outVal = syntheticEDD.generateSyntheticSet(sampleCount)
+    assert outVal[0] == "success function"
+
+    parameterRecords = {}
+    for parameterFile in outVal[1]:
+        with open(parameterFile) as inFile:
+            parameterRecord = json.load(inFile)
+        parameterRecords[parameterRecord["layout"]] = parameterRecord
+    return parameterRecords
+
+#Run state and parameters reset before and after each test
+@pytest.fixture(autouse=True)
+def resetRun():
+    pipeline.resetRunState()
+    config.resetParameters()
+    yield
+    pipeline.resetRunState()
+    config.resetParameters()
+
+#Copy of the stand-in Soils DB in the test folder - returns the database path
+@pytest.fixture
+def standInDB(syntheticSet, tmp_path):
+    def copyStandInDB(dbName="Soils_StandIn.db"):
+        soilsDB = str(tmp_path / dbName)
+        if not os.path.exists(soilsDB):
+            shutil.copyfile(syntheticSet["2024"]["soilsDB"], soilsDB)
+        return soilsDB
+    return copyStandInDB
+
+#Set the run parameters for a synthetic EDD - the stand-in DB copy and the test workspace unless set in 'parameters'
+@pytest.fixture
+def setRunParameters(syntheticSet, standInDB, tmp_path):
+    def setParameters(layout, **parameters):
+        parameterRecord = syntheticSet[layout]
+        pipeline.resetRunState()
+        config.resetParameters()
+        runParameters = dict(parameterRecord["scriptParameters"])
+        runParameters.update({"eddLayout": layout,
+                              "inputFile": parameterRecord["inputFile"],
+                              "rawDataSheet": parameterRecord["rawDataSheet"],
+                              "soilsDB": standInDB(),
+                              "workspace": str(tmp_path / "workspace"),
+                              "consoleLogLevel": "WARNING",
+                              "trackStageMemory": False})
+        runParameters.update(parameters)
+        config.setParameters(**runParameters)
+    return setParameters
+
+#Run the pipeline on a synthetic EDD ('pipeline.main') - returns the run status of the run manifest
+@pytest.fixture
+def runEDD(setRunParameters):
+    def runPipeline(layout, **parameters):
+        setRunParameters(layout, **parameters)
+        pipeline.main()
+        with open(config.runManifestName) as inFile:
+            runStatus = json.load(inFile)["runStatus"]
+        pipeline.resetRunState()
+        return runStatus
+    return runPipeline
+
+#Prepare the final dataframes of a synthetic EDD ('pipeline.prepareMain') - returns the prepared run record
+@pytest.fixture
+def prepareEDD(setRunParameters):
+    def prepareFinal(layout, **parameters):
+        setRunParameters(layout, **parameters)
+        preparedRecord = pipeline.prepareMain()
+        pipeline.resetRunState()
+        return preparedRecord
+    return prepareFinal
+
+#'tbl_SoilChemistry_Dataset' records of a Soils DB ordered by the record key
+@pytest.fixture
+def readDataset():
+    def readRecords(soilsDB):
+        cnxn = sqlite3.connect(soilsDB)
+        df_dataset = pd.read_sql("SELECT * FROM " + config.soilsDatasetTable + " ORDER BY EventName, ParameterRaw, Value", cnxn)
+        cnxn.close()
+        return df_dataset
+    return readRecords
+
+#Issued and re-issued '2024' workbooks - the issued workbook has 'newCount' pH values blank (new records of the re-issue), the re-issued workbook has one
+#changed 'EC 1:1' value.  Returns the issued and re-issued workbook paths and the count of new records.
+@pytest.fixture
+def reissuedWorkbooks(syntheticSet, tmp_path):
+    newCount = 3
+    parameterRecord = syntheticSet["2024"]
+    df_sheet = pd.read_excel(parameterRecord["inputFile"], sheet_name=parameterRecord["rawDataSheet"], header=None)
+    headerRow = df_sheet.index[df_sheet.iloc[:, 2] == "Lab ID"][0]
+    phColumn = df_sheet.columns[df_sheet.iloc[headerRow] == "pH 1:1"][0]
+    ecColumn = df_sheet.columns[df_sheet.iloc[headerRow] == "EC 1:1"][0]
+    dataRows = df_sheet.index[headerRow + 1:headerRow + 1 + parameterRecord["scriptParameters"]["tableOneNumberRecords"]]
+    phRows = [row for row in dataRows if pd.notna(pd.to_numeric(df_sheet.at[row, phColumn], errors="coerce"))][:newCount]
+    ecRow = [row for row in dataRows if row not in phRows and pd.notna(pd.to_numeric(df_sheet.at[row, ecColumn], errors="coerce"))][0]
+
+    df_issued = df_sheet.copy()
+    df_issued.loc[phRows, phColumn] = None
+    df_reissued = df_sheet.copy()
+    df_reissued.at[ecRow, ecColumn] = float(df_sheet.at[ecRow, ecColumn]) + 1
+
+    workbookList = []
+    for workbookName, df_workbook in (("Issued.xlsx", df_issued), ("Reissued.xlsx", df_reissued)):
+        workbook = str(tmp_path / workbookName)
+        df_workbook.to_excel(workbook, sheet_name=parameterRecord["rawDataSheet"], header=False, index=False)
+        workbookList.append(workbook)
+    return workbookList[0], workbookList[1], newCount
@@ -0,0 +1,42 @@
+# ---------------------------------------------------------------------------
+# test_incremental.py
+# Description:  Incremental loads - a re-issued EDD appends only its new records, the records with a changed Value are written to the changes report and the
+# fingerprints of the records appended to one Soils DB do not skip the records of another Soils DB.
+# ---------------------------------------------------------------------------
+import pandas as pd
+
+from romn_soils_etl import config
+
+def test_incremental_reload_appends_new_records(reissuedWorkbooks, runEDD, standInDB, readDataset):
+    soilsDB = standInDB()
+    issuedWorkbook, reissuedWorkbook, newCount = reissuedWorkbooks
+    assert runEDD("2024", soilsDB=soilsDB, inputFile=issuedWorkbook) == "Appended"
+    loadedCount = readDataset(soilsDB).shape[0]
+
+    assert runEDD("2024", soilsDB=soilsDB, inputFile=reissuedWorkbook, incrementalLoad=True) == "Appended"
+    df_dataset = readDataset(soilsDB)
+    assert df_dataset.shape[0] == loadedCount + newCount
+    assert not df_dataset.duplicated(subset=config.stagingKeyFields).any()
+
+    df_changes = pd.read_csv(config.incrementalChangesName)
+    assert df_changes.shape[0] == 1
+    assert df_changes.at[0, "ParameterRaw"] == "EC 1:1"
+    assert float(df_changes.at[0, "Value"]) == float(df_changes.at[0, "ValueLoaded"]) + 1
+
+def test_incremental_reload_of_loaded_edd_appends_nothing(runEDD, standInDB, readDataset):
+    soilsDB = standInDB()
+    assert runEDD("2024", soilsDB=soilsDB) == "Appended"
+    df_loaded = readDataset(soilsDB)
+
+    assert runEDD("2024", soilsDB=soilsDB, incrementalLoad=True) == "Appended"
+    pd.testing.assert_frame_equal(readDataset(soilsDB), df_loaded)
+
+def test_incremental_load_to_another_soils_db(runEDD, standInDB, readDataset):
+    # Loaded to Soils DB A - the fingerprints in the shared workspace journal are for Soils DB A (outlier flags off - the history cache is shared by the runs)
+    firstDB = standInDB("SoilsDB_A.db")
+    assert runEDD("2024", soilsDB=firstDB, applyOutlierFlags=False) == "Appended"
+
+    # Incremental load of the same EDD to Soils DB B - the records are not in Soils DB B and are all appended
+    secondDB = standInDB("SoilsDB_B.db")
+    assert runEDD("2024", soilsDB=secondDB, incrementalLoad=True, applyOutlierFlags=False) == "Appended"
+    pd.testing.assert_frame_equal(readDataset(secondDB), readDataset(firstDB))
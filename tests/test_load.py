@@ -0,0 +1,88 @@
+# ---------------------------------------------------------------------------
+# test_load.py
+# Description:  Loads to the stand-in Soils DB - record and staging loads append the same records, a staging reload appends no existing key (changed Values reported) and a load
+# resumed from a rewound checkpoint appends each record once.
+# ---------------------------------------------------------------------------
+import os
+import sqlite3
+import pytest
+import pandas as pd
+
+from romn_soils_etl import config
+
+eddLayouts = ["pre2022", "gte2022", "2024"]
+
+@pytest.mark.parametrize("layout", eddLayouts)
+def test_record_and_staging_loads_match(layout, runEDD, standInDB, readDataset, tmp_path):
+    recordDB = standInDB("Record.db")
+    stagingDB = standInDB("Staging.db")
+    assert runEDD(layout, soilsDB=recordDB, loadMethod="record", workspace=str(tmp_path / "record")) == "Appended"
+    assert runEDD(layout, soilsDB=stagingDB, loadMethod="staging", workspace=str(tmp_path / "staging")) == "Appended"
+
+    df_record = readDataset(recordDB)
+    assert df_record.shape[0] > readDataset(standInDB("Original.db")).shape[0]
+    pd.testing.assert_frame_equal(df_record, readDataset(stagingDB))
+
+def test_staging_reload_appends_no_existing_key(runEDD, standInDB, readDataset):
+    soilsDB = standInDB()
+    assert runEDD("2024", soilsDB=soilsDB, loadMethod="staging") == "Appended"
+    df_loaded = readDataset(soilsDB)
+    assert runEDD("2024", soilsDB=soilsDB, loadMethod="staging") == "Appended"
+
+    df_reloaded = readDataset(soilsDB)
+    pd.testing.assert_frame_equal(df_reloaded, df_loaded)
+    assert not df_reloaded.duplicated(subset=config.stagingKeyFields).any()
+    assert not os.path.exists(config.stagingChangesName)
+
+    # Staging table of the load dropped
+    cnxn = sqlite3.connect(soilsDB)
+    stagingTables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '" + config.stagingTableName + "%'", cnxn)
+    cnxn.close()
+    assert stagingTables.shape[0] == 0
+
+def test_staging_reload_reports_changed_value(reissuedWorkbooks, runEDD, standInDB, readDataset):
+    soilsDB = standInDB()
+    issuedWorkbook, reissuedWorkbook, newCount = reissuedWorkbooks
+    assert runEDD("2024", soilsDB=soilsDB, inputFile=issuedWorkbook, loadMethod="staging") == "Appended"
+    loadedCount = readDataset(soilsDB).shape[0]
+
+    # The new records are appended - the record with a changed Value is not appended and is written to the changes report
+    assert runEDD("2024", soilsDB=soilsDB, inputFile=reissuedWorkbook, loadMethod="staging") == "Appended"
+    assert readDataset(soilsDB).shape[0] == loadedCount + newCount
+    df_changes = pd.read_csv(config.stagingChangesName)
+    assert df_changes.shape[0] == 1
+    assert df_changes.at[0, "ParameterRaw"] == "EC 1:1"
+    assert float(df_changes.at[0, "Value"]) == float(df_changes.at[0, "ValueLoaded"]) + 1
+
+def test_resume_from_rewound_checkpoint(runEDD, standInDB, readDataset, monkeypatch, tmp_path):
+    soilsDB = standInDB()
+    appendCount = 200
+
+    # Soils DB lost after 'appendCount' records - the load is interrupted after 'journalMaxConsecutiveRejects' rejects
+    toSql = pd.DataFrame.to_sql
+    sqlCalls = []
+    def failingToSql(self, *args, **kwargs):
+        sqlCalls.append(1)
+        if len(sqlCalls) > appendCount:
+            raise RuntimeError("database is locked")
+        return toSql(self, *args, **kwargs)
+    monkeypatch.setattr(pd.DataFrame, "to_sql", failingToSql)
+    assert runEDD("2024", soilsDB=soilsDB) == "Load Interrupted"
+    monkeypatch.undo()
+    assert readDataset(soilsDB).shape[0] == readDataset(standInDB("Original.db")).shape[0] + appendCount
+
+    # Checkpoint rewound one row - the last record appended before the interruption was not checkpointed
+    journalDB = os.path.join(str(tmp_path / "workspace"), "Soils_ETL_Journal.db")
+    cnxn = sqlite3.connect(journalDB)
+    assert cnxn.execute("SELECT NextRow FROM tbl_Checkpoints WHERE EDDTable = 0").fetchone()[0] == appendCount
+    cnxn.execute("UPDATE tbl_Checkpoints SET NextRow = NextRow - 1 WHERE EDDTable = 0")
+    cnxn.commit()
+    cnxn.close()
+
+    assert runEDD("2024", soilsDB=soilsDB, resumeLoad=True) == "Resumed"
+
+    expectedDB = standInDB("Expected.db")
+    assert runEDD("2024", soilsDB=expectedDB, workspace=str(tmp_path / "expected")) == "Appended"
+    df_resumed = readDataset(soilsDB)
+    assert not df_resumed.duplicated(subset=config.stagingKeyFields).any()
+    pd.testing.assert_frame_equal(df_resumed, readDataset(expectedDB))
@@ -0,0 +1,56 @@
+# ---------------------------------------------------------------------------
+# test_metadata.py
+# Description:  Metadata overrides - filled override events are applied and concurrent runs adding samples to the override file keep every run's samples.
+# ---------------------------------------------------------------------------
+import multiprocessing
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.metadata import applyMetadataOverrides
+
+#Event metadata of samples without an event ('TBD')
+def defineUnresolvedSamples(sampleNames):
+    return pd.DataFrame({"SampleName_ROMN": sampleNames, "SampleName_Lab": ["L" + str(index) for index in range(len(sampleNames))], "Protocol_ROMN": "VCSS",
+                         "EventName": "TBD", "SiteName": "ROMO_001", "StartDate": pd.NaT, "MatchIndex": None})
+
+#Worker process - one run adding its samples to the shared override file
+def addPendingSamples(overrideFile, runNumber, sampleCount):
+    config.setParameters(metadataOverrideFile=overrideFile, inputFile="Run_" + str(runNumber) + ".xlsx", consoleLogLevel="WARNING")
+    outVal = applyMetadataOverrides(defineUnresolvedSamples(["R" + str(runNumber) + "_S" + str(index) for index in range(sampleCount)]))
+    if outVal[0] != "success function":
+        raise RuntimeError("applyMetadataOverrides failed")
+
+def test_filled_override_is_applied(tmp_path):
+    overrideFile = str(tmp_path / "Overrides.csv")
+    config.setParameters(metadataOverrideFile=overrideFile, inputFile="Run.xlsx", consoleLogLevel="WARNING")
+    outVal = applyMetadataOverrides(defineUnresolvedSamples(["S1", "S2"]))
+    assert outVal[0] == "success function"
+    assert outVal[1]["EventName"].tolist() == ["TBD", "TBD"]
+
+    df_overrides = pd.read_csv(overrideFile, dtype=str)
+    assert df_overrides["SampleName_ROMN"].tolist() == ["S1", "S2"]
+    df_overrides.loc[0, ["Protocol_ROMN", "EventName", "StartDate"]] = ["GLORIA", "GLORIA_S1_20240701", "7/1/2024"]
+    df_overrides.to_csv(overrideFile, index=False)
+
+    outVal = applyMetadataOverrides(defineUnresolvedSamples(["S1", "S2"]))
+    df_events = outVal[1]
+    assert df_events["EventName"].tolist() == ["GLORIA_S1_20240701", "TBD"]
+    assert df_events.at[0, "Protocol_ROMN"] == "GLORIA"
+    assert df_events.at[0, "StartDate"] == pd.Timestamp("2024-07-01")
+    assert df_events.at[0, "MatchIndex"] == "Override"
+    assert pd.read_csv(overrideFile).shape[0] == 2
+
+def test_concurrent_runs_keep_pending_samples(tmp_path):
+    overrideFile = str(tmp_path / "Overrides.csv")
+    runCount = 4
+    sampleCount = 5
+    processList = [multiprocessing.Process(target=addPendingSamples, args=(overrideFile, runNumber, sampleCount)) for runNumber in range(runCount)]
+    for process in processList:
+        process.start()
+    for process in processList:
+        process.join()
+    assert [process.exitcode for process in processList] == [0] * runCount
+
+    df_overrides = pd.read_csv(overrideFile)
+    assert sorted(df_overrides["SampleName_ROMN"]) == sorted("R" + str(runNumber) + "_S" + str(index) for runNumber in range(runCount) for index in range(sampleCount))
+    assert not (tmp_path / "Overrides.csv.lock").exists()
@@ -0,0 +1,58 @@
+# ---------------------------------------------------------------------------
+# test_qc.py
+# Description:  QC rules - the Range and Sum rule masks of the default rules ('qc.getQCRules') on a stacked dataframe.
+# ---------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from romn_soils_etl.qc import getQCRules, evaluateQCRules
+
+#Stacked records (EventName, ParameterRaw, UnitDataset, Value) with the expected QC_Flag
+qcRecords = [
+    # Range rules - pH 0 - 14, percentages 0 - 100 and ppm values not negative
+    ["E1", "pH 1:1", "NA", "15", "QC Range"],
+    ["E2", "pH 1:1", "NA", "6.5", ""],
+    ["E1", "OM (%)", "%", "120", "QC Range"],
+    ["E2", "OM (%)", "%", "40", ""],
+    ["E1", "P (ppm)", "ppm", "-1", "QC Range"],
+    ["E2", "P (ppm)", "ppm", "5", ""],
+    ["E2", "Lime_Categorical", "NA", "High", ""],
+    # Texture sum - Sand, Silt and Clay (%) of an event sum to 100 +/- 5
+    ["E1", "Sand (%)", "%", "50", "QC Texture Sum"],
+    ["E1", "Silt (%)", "%", "20", "QC Texture Sum"],
+    ["E1", "Clay (%)", "%", "10", "QC Texture Sum"],
+    ["E2", "Sand (%)", "%", "40", ""],
+    ["E2", "Silt (%)", "%", "40", ""],
+    ["E2", "Clay (%)", "%", "22", ""],
+    # Event with a repeated member parameter (more than one sample) - not evaluated
+    ["E3", "Sand (%)", "%", "10", ""],
+    ["E3", "Sand (%)", "%", "10", ""],
+    ["E3", "Silt (%)", "%", "10", ""],
+    # Base saturation - K, Ca, Mg and Na (%) within 5 of the Total Base Saturation
+    ["E1", "K (%)", "%", "5", "QC Base Saturation"],
+    ["E1", "Ca (%)", "%", "60", "QC Base Saturation"],
+    ["E1", "Mg (%)", "%", "10", "QC Base Saturation"],
+    ["E1", "Na (%)", "%", "1", "QC Base Saturation"],
+    ["E1", "Total Base Saturation", "NA", "90", "QC Base Saturation"],
+    ["E2", "K (%)", "%", "5", ""],
+    ["E2", "Ca (%)", "%", "60", ""],
+    ["E2", "Mg (%)", "%", "10", ""],
+    ["E2", "Na (%)", "%", "1", ""],
+    ["E2", "Total Base Saturation", "NA", "77", ""]]
+
+def test_qc_rule_masks():
+    df_long = pd.DataFrame([record[:4] for record in qcRecords], columns=["EventName", "ParameterRaw", "UnitDataset", "Value"])
+    df_long["ParameterDataset"] = df_long["ParameterRaw"]
+    qcFlag, qcNotes = evaluateQCRules(df_long, getQCRules())
+
+    expectedFlag = np.array([record[4] for record in qcRecords], dtype=object)
+    assert qcFlag.tolist() == expectedFlag.tolist()
+    assert ((qcNotes != "") == (expectedFlag != "")).all()
+
+def test_qc_flags_appended_for_several_rules():
+    # A percentage above 100 in a texture sum outside 100 +/- 5 - both flags, separated with '; '
+    df_long = pd.DataFrame({"EventName": ["E1", "E1", "E1"], "ParameterRaw": ["Sand (%)", "Silt (%)", "Clay (%)"], "UnitDataset": ["%", "%", "%"],
+                            "Value": ["110", "20", "10"]})
+    df_long["ParameterDataset"] = df_long["ParameterRaw"]
+    qcFlag, qcNotes = evaluateQCRules(df_long, getQCRules())
+    assert qcFlag.tolist() == ["QC Range; QC Texture Sum", "QC Texture Sum", "QC Texture Sum"]
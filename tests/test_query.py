@@ -0,0 +1,32 @@
+# ---------------------------------------------------------------------------
+# test_query.py
+# Description:  Values cache - each Soils DB has its own cache and reading the cache does not change the run parameters.
+# ---------------------------------------------------------------------------
+from romn_soils_etl import config
+from romn_soils_etl.query import get_values, getValuesCacheName
+
+def test_values_cache_per_soils_db(runEDD, standInDB, readDataset, tmp_path):
+    workspace = str(tmp_path / "workspace")
+    firstDB = standInDB("SoilsDB_A.db")
+    secondDB = standInDB("SoilsDB_B.db")
+
+    # Cache of Soils DB A built before the load to Soils DB B
+    config.setParameters(soilsDB=firstDB, workspace=workspace, consoleLogLevel="WARNING")
+    assert get_values().shape[0] == readDataset(firstDB).shape[0]
+    firstCacheName = getValuesCacheName()
+
+    assert runEDD("2024", soilsDB=secondDB, workspace=workspace) == "Appended"
+    config.resetParameters()
+    config.setParameters(soilsDB=secondDB, workspace=workspace, consoleLogLevel="WARNING")
+    assert getValuesCacheName() != firstCacheName
+    assert get_values().shape[0] == readDataset(secondDB).shape[0]
+    assert readDataset(secondDB).shape[0] > readDataset(firstDB).shape[0]
+
+def test_values_cache_keeps_run_parameters(standInDB, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config.setParameters(soilsDB=standInDB(), consoleLogLevel="WARNING")
+    assert get_values() is not None
+    assert config.workspace is None
+    assert config.outName is None
+    assert config.valuesCacheName is None
+    assert getValuesCacheName().startswith(str(tmp_path / "Soils_Chemistry_Values_Soils_StandIn_"))
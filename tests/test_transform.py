@@ -0,0 +1,39 @@
+# ---------------------------------------------------------------------------
+# test_transform.py
+# Description:  Transform engines - the pandas, polars and chunked transforms return the same final dataframes for each EDD layout.
+# ---------------------------------------------------------------------------
+import pytest
+import pandas as pd
+
+eddLayouts = ["pre2022", "gte2022", "2024"]
+
+#Final dataframes of the pandas transform per EDD layout (one pass)
+@pytest.fixture
+def pandasFinal(prepareEDD):
+    def prepareLayout(layout):
+        preparedRecord = prepareEDD(layout, transformEngine="pandas", applyOutlierFlags=False)
+        assert preparedRecord["runStatus"] == "Prepared"
+        return preparedRecord["dfs_final"]
+    return prepareLayout
+
+def assertSameFinal(dfs_final, dfs_expected):
+    assert len(dfs_final) == len(dfs_expected)
+    for dataset, expected in zip(dfs_final, dfs_expected):
+        pd.testing.assert_frame_equal(dataset, expected)
+
+@pytest.mark.parametrize("layout", eddLayouts)
+def test_polars_matches_pandas(layout, prepareEDD, pandasFinal):
+    pytest.importorskip("polars")
+    preparedRecord = prepareEDD(layout, transformEngine="polars", applyOutlierFlags=False)
+    assert preparedRecord["runStatus"] == "Prepared"
+    assertSameFinal(preparedRecord["dfs_final"], pandasFinal(layout))
+
+@pytest.mark.parametrize("layout", eddLayouts)
+@pytest.mark.parametrize("transformEngine", ["pandas", "polars"])
+def test_chunked_matches_one_pass(layout, transformEngine, prepareEDD, pandasFinal):
+    if transformEngine == "polars":
+        pytest.importorskip("polars")
+    # 50 samples per EDD table in slices of 7 samples - the last slice is partial
+    preparedRecord = prepareEDD(layout, transformEngine=transformEngine, transformChunkSamples=7, applyOutlierFlags=False)
+    assert preparedRecord["runStatus"] == "Prepared"
+    assertSameFinal(preparedRecord["dfs_final"], pandasFinal(layout))
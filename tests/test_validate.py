@@ -0,0 +1,54 @@
+# ---------------------------------------------------------------------------
+# test_validate.py
+# Description:  Preflight validation - the EDD consistency checks across the EDD tables and the preflight report of a synthetic EDD.
+# ---------------------------------------------------------------------------
+import os
+import sqlite3
+import pandas as pd
+
+from romn_soils_etl import config
+from romn_soils_etl.validate import checkEDDConsistency
+
+def test_edd_consistency_checks():
+    crossWalkList = [["Lab ID", "Sample ID", "pH 1:1", "EC 1:1"], ["Lab ID", "Sample ID", "EC 1:1", "SAR"]]
+    datasetList = [pd.DataFrame([["L1", "S1", 6.5, 0.2], ["L1", "S1", 6.5, 0.2], ["L2", "S2", 7.0, 0.3], ["L3", "S3", 7.1, 0.4]], columns=crossWalkList[0]),
+                   # 'S1' EC as text - the same value as 0.2
+                   pd.DataFrame([["L1", "S1", "0.2", 1.5], ["L9", "S2", 0.35, 1.1]], columns=crossWalkList[1])]
+    outVal = checkEDDConsistency(datasetList, crossWalkList)
+    assert outVal[0] == "success function"
+
+    df_report = pd.DataFrame(outVal[1], columns=["Check", "Severity", "EDDTable", "Item", "Count", "Detail"])
+    assert sorted(zip(df_report["Check"], df_report["Severity"], df_report["Item"])) == sorted([
+        ("DuplicateSample", "Error", "S1"),
+        ("LabSampleMismatch", "Error", "S2"),
+        ("OrphanSample", "Warning", "S3"),
+        ("ParameterInMultipleTables", "Warning", "EC 1:1"),
+        ("ConflictingValue", "Error", "S2")])
+    assert df_report.loc[df_report["Check"] == "LabSampleMismatch", "Detail"].iloc[0] == "Lab ID values: L2, L9"
+
+def test_preflight_of_synthetic_edd(runEDD):
+    assert runEDD("2024", preflightOnly=True) == "Preflight Only"
+    df_report = pd.read_csv(config.preflightReportName)
+    assert not (df_report["Severity"] == "Error").any()
+
+def test_preflight_reports_sample_without_event(runEDD, standInDB):
+    # First VCSS event removed from the event tables - the sample has no event
+    soilsDB = standInDB()
+    cnxn = sqlite3.connect(soilsDB)
+    eventName = cnxn.execute("SELECT EventName FROM tbl_Events ORDER BY rowid LIMIT 1").fetchone()[0]
+    cnxn.execute("DELETE FROM tbl_Events WHERE EventName = ?", (eventName,))
+    cnxn.execute("DELETE FROM tbl_Events1 WHERE EventName = ?", (eventName,))
+    cnxn.commit()
+    cnxn.close()
+
+    assert runEDD("2024", soilsDB=soilsDB, preflightOnly=True) == "Preflight Errors"
+    df_report = pd.read_csv(config.preflightReportName)
+    df_errors = df_report[df_report["Severity"] == "Error"]
+    assert df_errors["Check"].unique().tolist() == ["EventResolution"]
+    assert df_errors["Item"].unique().tolist() == [eventName + "_CM"]
+
+    # The sample is added to the metadata override file with the event fields to be filled
+    df_overrides = pd.read_csv(config.metadataOverrideFile)
+    assert os.path.basename(config.metadataOverrideFile) in df_errors["Detail"].iloc[0]
+    assert df_overrides["SampleName_ROMN"].tolist() == [eventName + "_CM"]
+    assert df_overrides["EventName"].isna().all()